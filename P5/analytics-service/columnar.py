@@ -0,0 +1,250 @@
+import threading
+from datetime import date
+from typing import Callable, Dict, Hashable, Iterable, List, Mapping, Optional, Sequence
+import numpy as np
+
+EPOCH = date(1970, 1, 1)
+
+
+def to_day(value: str) -> int:
+    """Day number (days since 1970-01-01) of an ISO date or datetime string"""
+    return (date.fromisoformat(value[:10]) - EPOCH).days
+
+
+def from_day(day: int) -> str:
+    """ISO date string of a day number"""
+    return date.fromordinal(EPOCH.toordinal() + int(day)).isoformat()
+
+
+class Dictionary:
+    """Dense integer codes for the distinct values of a column.
+
+    Repeated strings (categories, user ids, product ids) are stored once and
+    the fact table only holds their codes, so grouping by them is a bincount
+    over small integers.
+    """
+
+    def __init__(self, values: Iterable[Hashable] = ()):
+        self.values: List[Hashable] = []
+        self._codes: Dict[Hashable, int] = {}
+        for value in values:
+            self.encode(value)
+
+    def __len__(self):
+        return len(self.values)
+
+    def __contains__(self, value):
+        return value in self._codes
+
+    def encode(self, value: Hashable) -> int:
+        """Code of a value, assigning the next free one to unseen values"""
+        code = self._codes.get(value)
+        if code is None:
+            code = len(self.values)
+            self._codes[value] = code
+            self.values.append(value)
+        return code
+
+    def encode_many(self, values: Iterable[Hashable]) -> np.ndarray:
+        return np.fromiter((self.encode(value) for value in values), dtype=np.int32)
+
+    def code(self, value: Hashable) -> Optional[int]:
+        """Code of a known value, or None"""
+        return self._codes.get(value)
+
+    def decode(self, code: int) -> Hashable:
+        return self.values[code]
+
+
+class LazyDictionary(Dictionary):
+    """A Dictionary whose values are only loaded when first used.
+
+    Its size is known up front, so counting never loads it; a restored
+    snapshot's order ids, which only ingestion looks up, stay on disk until
+    the first order event arrives.
+    """
+
+    def __init__(self, size: int, load: Callable[[], List[Hashable]]):
+        self._size = size
+        self._load = load
+        self._load_lock = threading.Lock()
+
+    def __getattr__(self, name):
+        # Only reached while values and _codes are not loaded yet
+        if name not in ("values", "_codes"):
+            raise AttributeError(name)
+        with self._load_lock:
+            if "values" not in self.__dict__:
+                values = list(self._load())
+                self._codes = {value: code for code, value in enumerate(values)}
+                self.values = values
+        return self.__dict__[name]
+
+    def __len__(self):
+        return len(self.values) if "values" in self.__dict__ else self._size
+
+    @property
+    def loaded(self) -> bool:
+        return "values" in self.__dict__
+
+
+class FactTable:
+    """Append-only table stored as one NumPy array per column.
+
+    Arrays grow geometrically, so appends are amortized O(1) and `column`
+    returns a view of the filled part without copying.
+    """
+
+    def __init__(self, schema: Mapping[str, object], capacity: int = 1024):
+        self.schema = {name: np.dtype(dtype) for name, dtype in schema.items()}
+        self._size = 0
+        self._columns = {name: np.zeros(capacity, dtype=dtype) for name, dtype in self.schema.items()}
+
+    @classmethod
+    def from_columns(cls, columns: Mapping[str, np.ndarray]) -> "FactTable":
+        """A table over existing, equally long column arrays, used without copying.
+
+        The arrays are only replaced once an append outgrows them, so they may
+        be memory-mapped (copy-on-write, for in-place updates).
+        """
+        lengths = {len(array) for array in columns.values()}
+        if len(lengths) != 1:
+            raise ValueError("from_columns needs equally long columns")
+        table = cls({name: array.dtype for name, array in columns.items()}, capacity=0)
+        table._columns = dict(columns)
+        table._size = lengths.pop()
+        return table
+
+    def __len__(self):
+        return self._size
+
+    @property
+    def capacity(self) -> int:
+        return len(next(iter(self._columns.values())))
+
+    def _reserve(self, extra: int):
+        needed = self._size + extra
+        if needed <= self.capacity:
+            return
+        capacity = max(needed, self.capacity * 2)
+        for name, array in self._columns.items():
+            grown = np.zeros(capacity, dtype=array.dtype)
+            grown[:self._size] = array[:self._size]
+            self._columns[name] = grown
+
+    def append(self, row: Mapping[str, object]) -> int:
+        """Add one row; returns its position"""
+        self._reserve(1)
+        position = self._size
+        for name, array in self._columns.items():
+            array[position] = row[name]
+        self._size += 1
+        return position
+
+    def extend(self, columns: Mapping[str, Sequence]):
+        """Add many rows given as one sequence per column"""
+        lengths = {len(values) for values in columns.values()}
+        if len(lengths) != 1 or set(columns) != set(self._columns):
+            raise ValueError("extend needs equally long values for every column")
+        count = lengths.pop()
+        self._reserve(count)
+        for name, array in self._columns.items():
+            array[self._size:self._size + count] = columns[name]
+        self._size += count
+
+    def column(self, name: str) -> np.ndarray:
+        return self._columns[name][:self._size]
+
+    def columns(self, *names: str) -> List[np.ndarray]:
+        """Views of several columns cut at the same row count.
+
+        Appends fill every column before publishing the new size, so readers
+        on other threads always get a consistent set of rows.
+        """
+        size = self._size
+        return [self._columns[name][:size] for name in names]
+
+    def set(self, name: str, position: int, value):
+        if not 0 <= position < self._size:
+            raise IndexError(position)
+        self._columns[name][position] = value
+
+
+# Vectorized group-by primitives. `keys` are dictionary codes in
+# [0, groups); `where` is an optional boolean mask over the rows.
+
+def group_sum(
+    keys: np.ndarray,
+    values: Optional[np.ndarray],
+    groups: int,
+    where: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Per-group sum of values (row counts when values is None)"""
+    if where is not None:
+        keys = keys[where]
+        values = None if values is None else values[where]
+    return np.bincount(keys, weights=values, minlength=groups)[:groups]
+
+
+def group_mean(
+    keys: np.ndarray,
+    values: np.ndarray,
+    groups: int,
+    where: Optional[np.ndarray] = None
+) -> np.ndarray:
+    """Per-group mean of values (0 for empty groups)"""
+    sums = group_sum(keys, values, groups, where)
+    counts = group_sum(keys, None, groups, where)
+    return np.divide(sums, counts, out=np.zeros(groups), where=counts > 0)
+
+
+def group_min(keys: np.ndarray, values: np.ndarray, groups: int, empty) -> np.ndarray:
+    result = np.full(groups, empty, dtype=values.dtype)
+    np.minimum.at(result, keys, values)
+    return result
+
+
+def group_max(keys: np.ndarray, values: np.ndarray, groups: int, empty) -> np.ndarray:
+    result = np.full(groups, empty, dtype=values.dtype)
+    np.maximum.at(result, keys, values)
+    return result
+
+
+def group_count_distinct(keys: np.ndarray, values: np.ndarray, groups: int) -> np.ndarray:
+    """Number of distinct values per group (e.g. orders per user)"""
+    pairs = np.unique(keys.astype(np.int64) << 32 | values.astype(np.int64))
+    return np.bincount((pairs >> 32).astype(np.intp), minlength=groups)[:groups]
+
+
+def group_argmax(keys: np.ndarray, labels: np.ndarray, values: np.ndarray, groups: int) -> np.ndarray:
+    """Per group, the label with the largest summed value (-1 for empty groups).
+
+    Sums are taken over the distinct (key, label) pairs actually present, so
+    no dense groups x labels matrix is ever allocated.
+    """
+    pairs, inverse = np.unique(keys.astype(np.int64) << 32 | labels.astype(np.int64), return_inverse=True)
+    sums = np.bincount(inverse.ravel(), weights=values)
+    pair_keys = pairs >> 32
+    # Sort by key, best sum first within a key, and keep each key's first pair
+    order = np.lexsort((-sums, pair_keys))
+    first = np.ones(len(order), dtype=bool)
+    first[1:] = pair_keys[order][1:] != pair_keys[order][:-1]
+    best = order[first]
+    result = np.full(groups, -1, dtype=np.int64)
+    result[pair_keys[best]] = pairs[best] & 0xFFFFFFFF
+    return result
+
+
+def top_k(values: np.ndarray, k: int) -> np.ndarray:
+    """Indices of the k largest values, largest first.
+
+    argpartition finds the k largest in O(n); only those k are then sorted.
+    """
+    k = min(k, len(values))
+    if k <= 0:
+        return np.empty(0, dtype=np.intp)
+    if k < len(values):
+        candidates = np.argpartition(values, len(values) - k)[len(values) - k:]
+    else:
+        candidates = np.arange(len(values))
+    return candidates[np.argsort(-values[candidates], kind="stable")]
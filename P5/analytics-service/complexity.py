@@ -0,0 +1,184 @@
+import math
+import time
+from collections import OrderedDict
+from typing import Any, Callable, Dict, NamedTuple, Optional
+from graphql import (
+    DocumentNode, FieldNode, FragmentDefinitionNode, FragmentSpreadNode, GraphQLError, GraphQLSchema,
+    InlineFragmentNode, SelectionSetNode, get_named_type, get_nullable_type, get_operation_ast,
+    is_composite_type, is_list_type
+)
+from graphql.execution.values import get_argument_values, get_variable_values
+
+# Estimated item count of a list field, from its (coerced) arguments
+ListSize = Callable[[Dict[str, Any]], int]
+
+
+class QueryTooComplex(ValueError):
+    """A query over the depth, alias or cost budget"""
+
+
+class QueryCost(NamedTuple):
+    depth: int
+    aliases: int
+    cost: int
+
+
+class CostAnalyzer:
+    """Static cost analysis of GraphQL operations, run before execution.
+
+    Every field returning an object costs its weight (1 unless configured,
+    scalars are free) times the number of times it will be resolved: inside
+    a list field, children are multiplied by the list's estimated size.
+    Sizes come from `list_sizes`, keyed "Type.field" (e.g. topProducts uses
+    its `limit`); other lists are assumed to hold `default_list_size`
+    items. Introspection fields are not counted.
+
+    `check` raises QueryTooComplex when the depth, the number of aliased
+    fields or the cost is over its budget. The walk stops as soon as the
+    cost budget is exceeded, so fragment fan-out cannot make the analysis
+    itself expensive.
+    """
+
+    def __init__(
+        self,
+        schema: GraphQLSchema,
+        max_depth: int = 10,
+        max_aliases: int = 50,
+        max_cost: int = 1000,
+        list_sizes: Optional[Dict[str, ListSize]] = None,
+        weights: Optional[Dict[str, int]] = None,
+        default_list_size: int = 10
+    ):
+        self.schema = schema
+        self.max_depth = max_depth
+        self.max_aliases = max_aliases
+        self.max_cost = max_cost
+        self.list_sizes = list_sizes or {}
+        self.weights = weights or {}
+        self.default_list_size = default_list_size
+        self.stats = {"checked": 0, "rejected": 0}
+
+    def analyze(self, document: DocumentNode, operation_name: Optional[str] = None,
+                variables: Optional[dict] = None) -> Optional[QueryCost]:
+        """Depth, aliases and cost of the operation, or None if it cannot run anyway"""
+        operation = get_operation_ast(document, operation_name)
+        if operation is None:
+            return None
+        root_type = self.schema.get_root_type(operation.operation)
+        coerced = get_variable_values(self.schema, operation.variable_definitions or [], variables or {})
+        if root_type is None or isinstance(coerced, list):
+            return None
+        fragments = {
+            definition.name.value: definition
+            for definition in document.definitions
+            if isinstance(definition, FragmentDefinitionNode)
+        }
+        totals = {"depth": 0, "aliases": 0, "cost": 0}
+        self._visit(root_type, operation.selection_set, fragments, coerced, 1, 1, totals)
+        return QueryCost(totals["depth"], totals["aliases"], totals["cost"])
+
+    def _visit(self, parent_type, selection_set: SelectionSetNode, fragments: dict, variables: dict,
+               multiplier: int, depth: int, totals: dict):
+        for selection in selection_set.selections:
+            if isinstance(selection, FieldNode):
+                name = selection.name.value
+                field = parent_type.fields.get(name) if not name.startswith("__") else None
+                if field is None:
+                    continue
+                totals["depth"] = max(totals["depth"], depth)
+                if selection.alias is not None:
+                    totals["aliases"] += 1
+                key = f"{parent_type.name}.{name}"
+                field_type = get_named_type(field.type)
+                composite = is_composite_type(field_type)
+                totals["cost"] += self.weights.get(key, 1 if composite else 0) * multiplier
+                if totals["cost"] > self.max_cost:
+                    return
+                if composite and selection.selection_set is not None:
+                    size = 1
+                    if is_list_type(get_nullable_type(field.type)):
+                        size = self._list_size(key, field, selection, variables)
+                    self._visit(field_type, selection.selection_set, fragments, variables,
+                                multiplier * size, depth + 1, totals)
+            elif isinstance(selection, InlineFragmentNode):
+                fragment_type = (
+                    self.schema.get_type(selection.type_condition.name.value)
+                    if selection.type_condition is not None else parent_type
+                )
+                self._visit(fragment_type, selection.selection_set, fragments, variables, multiplier, depth, totals)
+            elif isinstance(selection, FragmentSpreadNode):
+                fragment = fragments.get(selection.name.value)
+                if fragment is not None:
+                    fragment_type = self.schema.get_type(fragment.type_condition.name.value)
+                    self._visit(fragment_type, fragment.selection_set, fragments, variables, multiplier, depth, totals)
+            if totals["cost"] > self.max_cost:
+                return
+
+    def _list_size(self, key: str, field, node: FieldNode, variables: dict) -> int:
+        estimate = self.list_sizes.get(key)
+        if estimate is None:
+            return self.default_list_size
+        try:
+            return max(int(estimate(get_argument_values(field, node, variables))), 0)
+        except (GraphQLError, TypeError, ValueError):
+            return self.default_list_size
+
+    def check(self, document: DocumentNode, operation_name: Optional[str] = None,
+              variables: Optional[dict] = None) -> Optional[QueryCost]:
+        """The operation's cost, or QueryTooComplex if it is over budget"""
+        self.stats["checked"] += 1
+        cost = self.analyze(document, operation_name, variables)
+        if cost is None:
+            return None
+        problem = None
+        if cost.depth > self.max_depth:
+            problem = f"Query depth {cost.depth} exceeds the limit of {self.max_depth}"
+        elif cost.aliases > self.max_aliases:
+            problem = f"Query uses {cost.aliases} aliases, over the limit of {self.max_aliases}"
+        elif cost.cost > self.max_cost:
+            problem = f"Query cost exceeds the limit of {self.max_cost}"
+        if problem is not None:
+            self.stats["rejected"] += 1
+            raise QueryTooComplex(problem)
+        return cost
+
+
+class CostLimiter:
+    """Per-client token buckets holding query cost.
+
+    Each client may spend `burst` cost at once and regains `rate` per
+    second, so cheap queries flow freely while a client sending heavy ones
+    is slowed down without affecting the others. At most `max_clients`
+    buckets are kept, least recently used dropped first. Call it from the
+    event loop only.
+    """
+
+    def __init__(self, rate: float = 500.0, burst: float = 2000.0, max_clients: int = 10000):
+        self.rate = rate
+        self.burst = burst
+        self.max_clients = max_clients
+        self._buckets: "OrderedDict[str, list]" = OrderedDict()
+        self.stats = {"allowed": 0, "throttled": 0}
+
+    def __len__(self):
+        return len(self._buckets)
+
+    def acquire(self, client: str, cost: float) -> float:
+        """Spend `cost` from the client's bucket; returns 0, or seconds to wait before retrying"""
+        now = time.monotonic()
+        bucket = self._buckets.get(client)
+        if bucket is None:
+            bucket = self._buckets[client] = [self.burst, now]
+            while len(self._buckets) > self.max_clients:
+                self._buckets.popitem(last=False)
+        else:
+            self._buckets.move_to_end(client)
+            bucket[0] = min(self.burst, bucket[0] + (now - bucket[1]) * self.rate)
+            bucket[1] = now
+        cost = min(cost, self.burst)
+        if bucket[0] >= cost:
+            bucket[0] -= cost
+            self.stats["allowed"] += 1
+            return 0.0
+        self.stats["throttled"] += 1
+        return (cost - bucket[0]) / self.rate if self.rate > 0 else math.inf
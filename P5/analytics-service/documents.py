@@ -0,0 +1,97 @@
+import hashlib
+import threading
+from collections import OrderedDict
+from typing import List, Optional, Tuple
+from graphql import DocumentNode, GraphQLError, GraphQLSchema, parse, validate
+
+
+class PersistedQueryNotFound(Exception):
+    """An Automatic Persisted Query hash the server has not seen yet"""
+
+
+class PersistedQueryMismatch(ValueError):
+    """The query text sent with a persisted query hash does not match it"""
+
+
+def query_hash(query: str) -> str:
+    return hashlib.sha256(query.encode()).hexdigest()
+
+
+class DocumentCache:
+    """LRU of parsed and validated GraphQL documents, keyed by query text.
+
+    Dashboards send the same few queries over and over, so parsing and
+    validating them once and executing the cached AST removes both steps
+    from the hot path. Documents that fail to parse or validate are not
+    cached.
+
+    It also backs Automatic Persisted Queries: clients send the sha256 of a
+    query instead of its text, and only send the text along with the hash
+    the first time (or after the server answers PersistedQueryNotFound).
+    """
+
+    def __init__(self, schema: GraphQLSchema, max_entries: int = 512, max_persisted: int = 4096):
+        self.schema = schema
+        self.max_entries = max_entries
+        self.max_persisted = max_persisted
+        self._documents: "OrderedDict[str, DocumentNode]" = OrderedDict()
+        self._persisted: "OrderedDict[str, str]" = OrderedDict()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._documents)
+
+    @staticmethod
+    def _remember(entries: OrderedDict, key, value, limit: int):
+        entries[key] = value
+        entries.move_to_end(key)
+        while len(entries) > limit:
+            entries.popitem(last=False)
+
+    def resolve_query(self, query: Optional[str], persisted_hash: Optional[str]) -> str:
+        """Query text for a request, registering or looking up its APQ hash"""
+        if persisted_hash is None:
+            return query
+        persisted_hash = persisted_hash.lower()
+        if query is None:
+            with self._lock:
+                query = self._persisted.get(persisted_hash)
+                if query is not None:
+                    self._persisted.move_to_end(persisted_hash)
+            if query is None:
+                raise PersistedQueryNotFound(persisted_hash)
+            return query
+        if query_hash(query) != persisted_hash:
+            raise PersistedQueryMismatch("provided sha does not match query")
+        with self._lock:
+            self._remember(self._persisted, persisted_hash, query, self.max_persisted)
+        return query
+
+    def get(self, query: str) -> Tuple[Optional[DocumentNode], List[GraphQLError]]:
+        """The validated document for a query, or None and the errors"""
+        with self._lock:
+            document = self._documents.get(query)
+            if document is not None:
+                self._documents.move_to_end(query)
+                self.hits += 1
+                return document, []
+            self.misses += 1
+
+        try:
+            document = parse(query)
+        except GraphQLError as error:
+            return None, [error]
+        errors = validate(self.schema, document)
+        if errors:
+            return None, errors
+
+        with self._lock:
+            if self.max_entries > 0:
+                self._remember(self._documents, query, document, self.max_entries)
+        return document, []
+
+    def clear(self):
+        with self._lock:
+            self._documents.clear()
@@ -0,0 +1,369 @@
+from typing import Dict, Iterable, List, Optional, Tuple, Union
+import numpy as np
+from columnar import (
+    Dictionary, FactTable, from_day, group_argmax, group_count_distinct, group_max, group_min,
+    group_sum, top_k
+)
+from rollups import SalesRollup
+
+NO_DAY = np.iinfo(np.int32).max
+
+
+class SalesFacts:
+    """Order lines in a columnar fact table, with product and user dimensions.
+
+    Order, product, user and category ids are dictionary-encoded. Row i of a
+    dimension table describes code i, and every order line carries the codes
+    it is grouped by.
+
+    Per-product, per-user and per-category running totals sit next to the
+    dimensions and are folded forward by every `record_many` batch, so the
+    product, user and category views cost O(groups) no matter how many lines
+    have been recorded. Daily revenue and order counts go to a SalesRollup,
+    which answers date-range totals in O(log days). An order counts on the
+    day it was placed, the earliest day among its lines. Writes are
+    expected from one thread at a time (the ingestion consumer); readers on
+    other threads may run concurrently.
+    """
+
+    LINE_SCHEMA = {
+        "order": np.int64,
+        "product": np.int32,
+        "user": np.int32,
+        "category": np.int32,
+        "quantity": np.int32,
+        "revenue": np.float64,
+        "day": np.int32,
+    }
+
+    def __init__(self):
+        self.orders = Dictionary()
+        self.products = Dictionary()
+        self.users = Dictionary()
+        self.categories = Dictionary()
+        self.lines = FactTable(self.LINE_SCHEMA)
+        self.product_info = FactTable({
+            "name": object,
+            "category": np.int32,
+            "average_rating": np.float64,
+            "views": np.int64,
+            # Running totals
+            "sold": np.int64,
+            "revenue": np.float64,
+        })
+        self.user_info = FactTable({
+            "username": object,
+            "status": object,
+            # Running totals
+            "orders": np.int64,
+            "spent": np.float64,
+            "first_day": np.int32,
+            "last_day": np.int32,
+            "favorite": np.int32,
+        })
+        self.category_info = FactTable({"revenue": np.float64})
+        # Revenue per (user, category), dense: categories are few, and the
+        # favorite category of a user is the argmax of its row
+        self._user_category_revenue = np.zeros((1024, 8))
+        self.rollup = SalesRollup()
+        # Bumped by every write, so caches of derived views can tell they are stale
+        self.version = 0
+
+    DICTIONARIES = ("orders", "products", "users", "categories")
+    TABLES = ("lines", "product_info", "user_info", "category_info")
+
+    def __len__(self):
+        return len(self.lines)
+
+    def state(self) -> dict:
+        """Everything the facts hold, as value lists and arrays (for snapshots).
+
+        Call it from the writing thread. Line columns are views, since lines
+        are only ever appended; everything updated in place is copied. The
+        result can then be written out on another thread while writes go on.
+        """
+        def table_state(table: FactTable, copy: bool) -> Dict[str, object]:
+            columns = table.columns(*table.schema)
+            return {
+                name: array.tolist() if array.dtype == object else (array.copy() if copy else array)
+                for name, array in zip(table.schema, columns)
+            }
+
+        users, categories = len(self.user_info), len(self.category_info)
+        return {
+            "dictionaries": {name: list(getattr(self, name).values) for name in self.DICTIONARIES},
+            "tables": {
+                name: table_state(getattr(self, name), copy=name != "lines") for name in self.TABLES
+            },
+            "user_category_revenue": self._user_category_revenue[:users, :categories].copy(),
+            "rollup": self.rollup.state(),
+            "version": self.version,
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "SalesFacts":
+        """Facts over a `state()`, taking its arrays as they are (memory-mapped ones included).
+
+        A dictionary may be given as a Dictionary (e.g. a LazyDictionary)
+        instead of a value list.
+        """
+        facts = cls()
+        for name in cls.DICTIONARIES:
+            values: Union[Dictionary, List] = state["dictionaries"][name]
+            setattr(facts, name, values if isinstance(values, Dictionary) else Dictionary(values))
+        for name in cls.TABLES:
+            schema = getattr(facts, name).schema
+            setattr(facts, name, FactTable.from_columns({
+                column: np.array(values, dtype=object) if schema[column] == object else values
+                for column, values in state["tables"][name].items()
+            }))
+        revenue = state["user_category_revenue"]
+        facts._user_category_revenue = np.zeros((max(revenue.shape[0], 1024), max(revenue.shape[1], 8)))
+        facts._user_category_revenue[:revenue.shape[0], :revenue.shape[1]] = revenue
+        facts.rollup = SalesRollup.from_state(state["rollup"])
+        facts.version = state["version"]
+        return facts
+
+    def add_product(
+        self,
+        product_id: str,
+        name: Optional[str] = None,
+        category: Optional[str] = None,
+        average_rating: float = 0.0,
+        views: int = 0
+    ) -> int:
+        """Add or replace a product's dimension row; returns its code"""
+        row = {
+            "name": name,
+            "category": self._category_code(category),
+            "average_rating": average_rating,
+            "views": views,
+        }
+        code = self.products.code(product_id)
+        if code is None:
+            code = self.products.encode(product_id)
+            self.product_info.append({**row, "sold": 0, "revenue": 0.0})
+        else:
+            for field, value in row.items():
+                self.product_info.set(field, code, value)
+        self.version += 1
+        return code
+
+    def add_user(self, user_id: str, username: Optional[str] = None, status: str = "regular") -> int:
+        """Add or replace a user's dimension row; returns its code"""
+        code = self.users.code(user_id)
+        if code is None:
+            code = self.users.encode(user_id)
+            self.user_info.append({
+                "username": username,
+                "status": status,
+                "orders": 0,
+                "spent": 0.0,
+                "first_day": NO_DAY,
+                "last_day": -1,
+                "favorite": -1,
+            })
+        else:
+            self.user_info.set("username", code, username)
+            self.user_info.set("status", code, status)
+        self.version += 1
+        return code
+
+    def _category_code(self, category: Optional[str]) -> int:
+        code = self.categories.encode(category)
+        while len(self.category_info) < len(self.categories):
+            self.category_info.append({"revenue": 0.0})
+        return code
+
+    def _user_code(self, user_id: str) -> int:
+        code = self.users.code(user_id)
+        return self.add_user(user_id) if code is None else code
+
+    def record_many(self, lines: Iterable[dict]):
+        """Append order lines (order_id, user_id, product_id, quantity, revenue, day).
+
+        Lines of an unknown product may carry `product_name` for its new
+        dimension row. Orders count once per user, the first time they are
+        seen, so the lines of one order belong in one call.
+        """
+        columns: Dict[str, list] = {name: [] for name in self.LINE_SCHEMA}
+        product_categories = self.product_info.column("category")
+        known_orders = len(self.orders)
+        for line in lines:
+            product = self.products.code(line["product_id"])
+            if product is None:
+                product = self.add_product(line["product_id"], line.get("product_name"), "Uncategorized")
+            if product >= len(product_categories):
+                product_categories = self.product_info.column("category")
+            columns["order"].append(self.orders.encode(line["order_id"]))
+            columns["product"].append(product)
+            columns["user"].append(self._user_code(line["user_id"]))
+            columns["category"].append(product_categories[product])
+            columns["quantity"].append(line["quantity"])
+            columns["revenue"].append(line["revenue"])
+            columns["day"].append(line["day"])
+        if columns["order"]:
+            self.lines.extend(columns)
+            self._accumulate({name: np.asarray(values) for name, values in columns.items()}, known_orders)
+            self.version += 1
+
+    def _reserve_user_categories(self, users: int, categories: int):
+        rows, cols = self._user_category_revenue.shape
+        if users <= rows and categories <= cols:
+            return
+        if users > rows:
+            rows = max(users, rows * 2)
+        if categories > cols:
+            cols = max(categories, cols * 2)
+        grown = np.zeros((rows, cols))
+        old_rows, old_cols = self._user_category_revenue.shape
+        grown[:old_rows, :old_cols] = self._user_category_revenue
+        self._user_category_revenue = grown
+
+    def _accumulate(self, batch: Dict[str, np.ndarray], known_orders: int):
+        """Fold a batch of new lines into the running totals"""
+        products, users, categories = batch["product"], batch["user"], batch["category"]
+        revenues, days = batch["revenue"], batch["day"]
+
+        np.add.at(self.product_info.column("sold"), products, batch["quantity"])
+        np.add.at(self.product_info.column("revenue"), products, revenues)
+        np.add.at(self.category_info.column("revenue"), categories, revenues)
+
+        # Orders first seen in this batch got the codes from known_orders on:
+        # credit each to its user, and to the earliest day of its lines
+        new_orders = batch["order"] >= known_orders
+        new_codes = batch["order"][new_orders] - known_orders
+        order_users = np.zeros(len(self.orders) - known_orders, dtype=np.intp)
+        order_users[new_codes] = users[new_orders]
+        order_days = np.full(len(order_users), NO_DAY, dtype=np.int32)
+        np.minimum.at(order_days, new_codes, days[new_orders])
+        np.add.at(self.user_info.column("orders"), order_users, 1)
+        self.rollup.add(days, revenues, order_days)
+        np.add.at(self.user_info.column("spent"), users, revenues)
+        np.minimum.at(self.user_info.column("first_day"), users, days)
+        np.maximum.at(self.user_info.column("last_day"), users, days)
+
+        self._reserve_user_categories(len(self.users), len(self.categories))
+        np.add.at(self._user_category_revenue, (users, categories), revenues)
+        touched = np.unique(users)
+        favorites = self.user_info.column("favorite")
+        favorites[touched] = self._user_category_revenue[touched].argmax(axis=1)
+
+    def rebuild_totals(self):
+        """Recompute every running total from the lines.
+
+        For bulk loads that write `lines` directly instead of going through
+        `record_many`.
+        """
+        products, users, categories, orders, quantities, revenues, days = self.lines.columns(
+            "product", "user", "category", "order", "quantity", "revenue", "day"
+        )
+        product_count, user_count = len(self.product_info), len(self.user_info)
+        category_count = len(self.category_info)
+
+        self.product_info.column("sold")[:] = group_sum(products, quantities, product_count)
+        self.product_info.column("revenue")[:] = group_sum(products, revenues, product_count)
+        self.category_info.column("revenue")[:] = group_sum(categories, revenues, category_count)
+        self.user_info.column("orders")[:] = group_count_distinct(users, orders, user_count)
+        self.user_info.column("spent")[:] = group_sum(users, revenues, user_count)
+        self.user_info.column("first_day")[:] = group_min(users, days, user_count, NO_DAY)
+        self.user_info.column("last_day")[:] = group_max(users, days, user_count, -1)
+        self.user_info.column("favorite")[:] = group_argmax(users, categories, revenues, user_count)
+
+        order_days = group_min(orders, days, len(self.orders), NO_DAY)
+        self.rollup.reset()
+        self.rollup.add(days, revenues, order_days[order_days != NO_DAY])
+
+        self._user_category_revenue = np.zeros((max(user_count, 1024), max(category_count, 8)))
+        self._user_category_revenue[:user_count, :category_count] = group_sum(
+            users.astype(np.int64) * category_count + categories, revenues, user_count * category_count
+        ).reshape(user_count, category_count)
+        self.version += 1
+
+    def day_range(self) -> Tuple[Optional[int], Optional[int]]:
+        """First and last day with sales, or (None, None) when there are none"""
+        return self.rollup.first_day, self.rollup.last_day
+
+    # Aggregated views
+
+    def product_stats(self, limit: Optional[int] = None) -> List[dict]:
+        """Per-product sales, best revenue first"""
+        names, categories, ratings, views, sold, revenue = self.product_info.columns(
+            "name", "category", "average_rating", "views", "sold", "revenue"
+        )
+        stats = []
+        for code in top_k(revenue, len(names) if limit is None else limit):
+            stats.append({
+                "product_id": self.products.decode(code),
+                "product_name": names[code],
+                "category": self.categories.decode(categories[code]),
+                "total_sold": int(sold[code]),
+                "total_revenue": round(float(revenue[code]), 2),
+                "average_rating": float(ratings[code]),
+                "views": int(views[code]),
+                "conversion_rate": round(float(sold[code] / views[code] * 100), 1) if views[code] else 0.0,
+            })
+        return stats
+
+    def user_statistics(self, user_ids: Optional[Iterable[str]] = None) -> List[dict]:
+        """Per-user order statistics, for the given users or all of them"""
+        usernames, statuses, order_counts, spent, first, last, favorite = self.user_info.columns(
+            "username", "status", "orders", "spent", "first_day", "last_day", "favorite"
+        )
+        groups = len(usernames)
+        if user_ids is None:
+            codes = range(groups)
+        else:
+            codes = [self.users.code(user_id) for user_id in user_ids]
+            codes = [code for code in codes if code is not None and code < groups]
+
+        stats = []
+        for code in codes:
+            total_orders = int(order_counts[code])
+            stats.append({
+                "user_id": self.users.decode(code),
+                "username": usernames[code],
+                "total_orders": total_orders,
+                "total_spent": round(float(spent[code]), 2),
+                "average_order_value": round(float(spent[code]) / total_orders, 2) if total_orders else 0.0,
+                "first_order_date": from_day(first[code]) if total_orders else None,
+                "last_order_date": from_day(last[code]) if total_orders else None,
+                "favorite_category": self.categories.decode(favorite[code]) if favorite[code] >= 0 else None,
+                "status": statuses[code],
+            })
+        return stats
+
+    def revenue_by_category(self) -> List[dict]:
+        """Revenue and share of the total per category, largest first"""
+        revenue = self.category_info.column("revenue")
+        total = revenue.sum()
+        return [
+            {
+                "category": self.categories.decode(code),
+                "revenue": round(float(revenue[code]), 2),
+                "percentage": round(float(revenue[code] / total * 100), 1),
+            }
+            for code in top_k(revenue, int(np.count_nonzero(revenue)))
+        ]
+
+    def totals(self, start_day: Optional[int] = None, end_day: Optional[int] = None) -> dict:
+        """Revenue, order count and average order value over an inclusive day range"""
+        revenue, orders = self.rollup.totals(start_day, end_day)
+        return {
+            "total_revenue": round(revenue, 2),
+            "total_orders": orders,
+            "average_order_value": round(revenue / orders, 2) if orders else 0.0,
+        }
+
+    def trend(self, granularity: str, start_day: int, end_day: int) -> List[dict]:
+        """Totals per day, week (Monday to Sunday) or month of an inclusive day range"""
+        return [
+            {
+                "start_date": from_day(first),
+                "end_date": from_day(last),
+                "total_revenue": round(revenue, 2),
+                "total_orders": orders,
+                "average_order_value": round(revenue / orders, 2) if orders else 0.0,
+            }
+            for first, last, revenue, orders in self.rollup.buckets(granularity, start_day, end_day)
+        ]
@@ -0,0 +1,164 @@
+import asyncio
+import random
+import uuid
+from datetime import datetime
+from typing import Callable, List, Optional, Sequence
+from columnar import to_day
+from facts import SalesFacts
+
+# Orders in these states never turn into sales
+IGNORED_STATUSES = {"CANCELLED"}
+
+
+def order_lines(order: dict) -> List[dict]:
+    """Fact table lines of an order-service Order (id, userId, status, items, createdAt)"""
+    if order.get("status") in IGNORED_STATUSES:
+        return []
+    day = to_day(order.get("createdAt") or datetime.now().isoformat())
+    return [
+        {
+            "order_id": order["id"],
+            "user_id": order["userId"],
+            "product_id": item["productId"],
+            "product_name": item.get("productName"),
+            "quantity": item["quantity"],
+            "revenue": item["quantity"] * item["price"],
+            "day": day,
+        }
+        for item in order["items"]
+    ]
+
+
+class OrderIngestor:
+    """Async consumer that folds order events into the sales facts.
+
+    Producers put events on a bounded queue; one consumer task takes up to
+    `batch_size` of them at a time and records them with a single
+    `record_many` call, which also updates the running totals. A burst of
+    events therefore costs one vectorized update per batch, and the
+    consumer is the only writer of the facts.
+
+    Delivery is assumed to be at least once: orders the facts already hold
+    are skipped, as are cancelled ones. Only the first event of an order
+    counts, so a later status change (say to CANCELLED) does not reverse
+    its revenue. A batch that fails is logged and counted as failed, and
+    the consumer carries on with the next one.
+    """
+
+    def __init__(self, facts: Callable[[], SalesFacts], queue_size: int = 10000, batch_size: int = 500):
+        self.facts = facts
+        self.batch_size = batch_size
+        self.queue: asyncio.Queue = asyncio.Queue(maxsize=queue_size)
+        self.stats = {
+            "received": 0,
+            "ingested": 0,
+            "skipped": 0,
+            "failed": 0,
+            "lines": 0,
+            "batches": 0,
+            "last_batch_at": None,
+        }
+
+    async def publish(self, order: dict):
+        """Queue an event, waiting while the queue is full"""
+        await self.queue.put(order)
+        self.stats["received"] += 1
+
+    def offer(self, order: dict) -> bool:
+        """Queue an event without waiting; False when the queue is full"""
+        try:
+            self.queue.put_nowait(order)
+        except asyncio.QueueFull:
+            return False
+        self.stats["received"] += 1
+        return True
+
+    async def run(self):
+        """Consume events until cancelled"""
+        while True:
+            events = [await self.queue.get()]
+            while len(events) < self.batch_size and not self.queue.empty():
+                events.append(self.queue.get_nowait())
+            try:
+                self.apply(events)
+            except Exception as e:
+                print(f"❌ Failed to ingest a batch of {len(events)} order events: {str(e)}")
+                self.stats["failed"] += len(events)
+            finally:
+                for _ in events:
+                    self.queue.task_done()
+
+    async def drain(self):
+        """Wait until every queued event has been applied"""
+        await self.queue.join()
+
+    def apply(self, events: Sequence[dict]):
+        """Record a batch of order events.
+
+        Only the first event of an order id counts: a repeat is skipped
+        whatever its status, so an order cancelled after it was ingested
+        keeps its revenue.
+        """
+        facts = self.facts()
+        seen = set()
+        lines = []
+        ingested = 0
+        for order in events:
+            try:
+                if order["id"] in facts.orders or order["id"] in seen:
+                    self.stats["skipped"] += 1
+                    continue
+                new_lines = order_lines(order)
+            except (KeyError, TypeError, ValueError) as e:
+                print(f"❌ Dropping malformed order event: {str(e)}")
+                self.stats["failed"] += 1
+                continue
+            if not new_lines:
+                self.stats["skipped"] += 1
+                continue
+            seen.add(order["id"])
+            lines.extend(new_lines)
+            ingested += 1
+
+        facts.record_many(lines)
+        self.stats["ingested"] += ingested
+        self.stats["lines"] += len(lines)
+        self.stats["batches"] += 1
+        self.stats["last_batch_at"] = datetime.now().isoformat()
+
+
+def random_order(facts: SalesFacts, rng: random.Random, max_items: int = 3) -> dict:
+    """An order-service shaped order over the products and users the facts know"""
+    products = facts.products.values
+    names = facts.product_info.column("name")
+    items = []
+    for _ in range(rng.randint(1, max_items)):
+        code = rng.randrange(len(products))
+        items.append({
+            "id": uuid.uuid4().hex,
+            "productId": products[code],
+            "productName": names[code],
+            "quantity": rng.randint(1, 3),
+            "price": round(rng.uniform(5, 300), 2),
+        })
+    return {
+        "id": uuid.uuid4().hex,
+        "userId": rng.choice(facts.users.values),
+        "status": rng.choice(("PENDING", "COMPLETED", "COMPLETED", "CANCELLED")),
+        "total": round(sum(item["quantity"] * item["price"] for item in items), 2),
+        "items": items,
+        "createdAt": datetime.now().isoformat(),
+    }
+
+
+async def simulate_orders(ingestor: OrderIngestor, rate: float, seed: Optional[int] = None, tick: float = 0.1):
+    """Local stand-in for the order service: publish about `rate` random orders per second"""
+    rng = random.Random(seed)
+    owed = 0.0
+    while True:
+        owed += rate * tick
+        facts = ingestor.facts()
+        while owed >= 1:
+            await ingestor.publish(random_order(facts, rng))
+            owed -= 1
+        await asyncio.sleep(tick)
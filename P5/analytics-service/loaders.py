@@ -0,0 +1,49 @@
+import asyncio
+from typing import Any, Awaitable, Callable, Dict, Hashable, List
+
+# Loads the values of many keys at once; keys missing from the result load as None
+BatchLoad = Callable[[List[Hashable]], Awaitable[Dict[Hashable, Any]]]
+
+
+class DataLoader:
+    """Batches and deduplicates key loads made during the same event loop tick.
+
+    Every `load` in a tick is queued, and the queue is dispatched as one
+    `batch_load` call (split into chunks of `max_batch_size`) right after
+    the tick. Futures are kept per key, so a key loaded twice is fetched
+    once. Create one loader per request: the memo never expires.
+    """
+
+    def __init__(self, batch_load: BatchLoad, max_batch_size: int = 100):
+        self.batch_load = batch_load
+        self.max_batch_size = max_batch_size
+        self._futures: Dict[Hashable, asyncio.Future] = {}
+        self._queue: List[Hashable] = []
+
+    def load(self, key: Hashable) -> "asyncio.Future":
+        future = self._futures.get(key)
+        if future is None:
+            loop = asyncio.get_running_loop()
+            future = self._futures[key] = loop.create_future()
+            self._queue.append(key)
+            if len(self._queue) == 1:
+                loop.call_soon(self._dispatch)
+        return future
+
+    async def load_many(self, keys: List[Hashable]) -> List[Any]:
+        return list(await asyncio.gather(*(self.load(key) for key in keys)))
+
+    def _dispatch(self):
+        keys, self._queue = self._queue, []
+        for start in range(0, len(keys), self.max_batch_size):
+            asyncio.ensure_future(self._load_batch(keys[start:start + self.max_batch_size]))
+
+    async def _load_batch(self, keys: List[Hashable]):
+        try:
+            values = await self.batch_load(keys)
+        except Exception as e:
+            for key in keys:
+                self._futures[key].set_exception(e)
+            return
+        for key in keys:
+            self._futures[key].set_result(values.get(key))
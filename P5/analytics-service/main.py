@@ -1,117 +1,282 @@
 from fastapi import FastAPI, HTTPException, status, Request
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
+from fastapi.responses import JSONResponse, Response
 from pydantic import BaseModel
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, Union
 import uvicorn
 import os
 from datetime import datetime, timedelta
 import asyncio
+import threading
 from collections import defaultdict
 import graphene
 from graphene import ObjectType, String, Int, Float, List as GrapheneList, Field, Schema, Mutation
-from graphql import graphql_sync
+from graphql import ExecutionResult, execute
+from inspect import isawaitable
 import json
+import math
+import random
+import time
+from concurrent.futures import ThreadPoolExecutor
+from columnar import from_day, to_day
+from complexity import CostAnalyzer, CostLimiter, QueryTooComplex
+from metrics import CONTENT_TYPE, MetricsMiddleware, Registry, hit_ratio, instrument_resolvers
+from documents import DocumentCache, PersistedQueryMismatch, PersistedQueryNotFound
+from facts import SalesFacts
+from ingestion import OrderIngestor, simulate_orders
+from loaders import DataLoader
+from memo import ResolverCache
+from reports import ReportIndex, ReportJobs
+from snapshots import load_snapshot, write_snapshot
+from upstream import UpstreamClients
 
 # Environment variables
 PORT = int(os.getenv("PORT", 3004))
 HOST = os.getenv("HOST", "0.0.0.0")
+REPORT_WORKERS = int(os.getenv("REPORT_WORKERS", 2))
+GRAPHQL_WORKERS = int(os.getenv("GRAPHQL_WORKERS", 4))
+DOCUMENT_CACHE_SIZE = int(os.getenv("DOCUMENT_CACHE_SIZE", 512))
+RESOLVER_CACHE_TTL = float(os.getenv("RESOLVER_CACHE_TTL", 30))
+RESOLVER_CACHE_SIZE = int(os.getenv("RESOLVER_CACHE_SIZE", 1024))
+INGEST_QUEUE_SIZE = int(os.getenv("INGEST_QUEUE_SIZE", 10000))
+INGEST_BATCH_SIZE = int(os.getenv("INGEST_BATCH_SIZE", 500))
+# Orders per second from the built-in stand-in producer (0 disables it)
+INGEST_SIMULATE_RATE = float(os.getenv("INGEST_SIMULATE_RATE", 0))
+# Snapshot directory restored at startup instead of seeding ("" disables snapshots)
+ANALYTICS_SNAPSHOT_PATH = os.getenv("ANALYTICS_SNAPSHOT_PATH", "")
+SNAPSHOT_ON_SHUTDOWN = os.getenv("SNAPSHOT_ON_SHUTDOWN", "true").lower() == "true"
 
 # Service URLs
 USER_SERVICE_URL = os.getenv("USER_SERVICE_URL", "http://localhost:3001")
 ORDER_SERVICE_URL = os.getenv("ORDER_SERVICE_URL", "http://localhost:3003")
 PRODUCT_SERVICE_URL = os.getenv("PRODUCT_SERVICE_URL", "http://localhost:8001")
+# Query budgets, checked before execution
+GRAPHQL_MAX_DEPTH = int(os.getenv("GRAPHQL_MAX_DEPTH", 10))
+GRAPHQL_MAX_ALIASES = int(os.getenv("GRAPHQL_MAX_ALIASES", 50))
+GRAPHQL_MAX_COST = int(os.getenv("GRAPHQL_MAX_COST", 1000))
+# Query cost each client regains per second, and may spend at once (rate 0 disables throttling)
+GRAPHQL_COST_RATE = float(os.getenv("GRAPHQL_COST_RATE", 500))
+GRAPHQL_COST_BURST = float(os.getenv("GRAPHQL_COST_BURST", 2000))
+UPSTREAM_TIMEOUT = float(os.getenv("UPSTREAM_TIMEOUT", 5))
+UPSTREAM_MAX_CONNECTIONS = int(os.getenv("UPSTREAM_MAX_CONNECTIONS", 100))
+# Concurrent requests allowed to each upstream service
+UPSTREAM_CONCURRENCY = int(os.getenv("UPSTREAM_CONCURRENCY", 20))
+UPSTREAM_BATCH_SIZE = int(os.getenv("UPSTREAM_BATCH_SIZE", 100))
 
 # In-memory analytics data
 sample_analytics_data = {
-    "sales_reports": [
-        {
-            "id": "report1",
-            "period": "2023-Q4",
-            "start_date": "2023-10-01",
-            "end_date": "2023-12-31",
-            "total_revenue": 145000.50,
-            "total_orders": 1250,
-            "average_order_value": 116.00,
-            "generated_at": datetime.now().isoformat()
-        },
-        {
-            "id": "report2",
-            "period": "2023-Q3",
-            "start_date": "2023-07-01",
-            "end_date": "2023-09-30",
-            "total_revenue": 132000.25,
-            "total_orders": 1180,
-            "average_order_value": 111.86,
-            "generated_at": datetime.now().isoformat()
-        }
-    ],
-    "product_stats": [
+    # Generated reports, newest first
+    "sales_reports": [],
+    # Catalog and customer dimensions; sales are recorded as order lines in
+    # the columnar fact table below, which every aggregate is computed from
+    "products": [
         {
             "product_id": "prod1",
             "product_name": "Laptop Pro",
             "category": "Electronics",
-            "total_sold": 450,
-            "total_revenue": 67500.00,
+            "unit_price": 150.00,
+            "units_sold": 450,
             "average_rating": 4.5,
-            "views": 12500,
-            "conversion_rate": 3.6
+            "views": 12500
         },
         {
             "product_id": "prod2",
             "product_name": "Wireless Headphones",
             "category": "Audio",
-            "total_sold": 890,
-            "total_revenue": 44500.00,
+            "unit_price": 50.00,
+            "units_sold": 890,
             "average_rating": 4.2,
-            "views": 8900,
-            "conversion_rate": 10.0
+            "views": 8900
         },
         {
             "product_id": "prod3",
             "product_name": "Gaming Mouse",
             "category": "Gaming",
-            "total_sold": 320,
-            "total_revenue": 8000.00,
+            "unit_price": 25.00,
+            "units_sold": 320,
             "average_rating": 4.7,
-            "views": 5600,
-            "conversion_rate": 5.7
+            "views": 5600
         }
     ],
-    "user_statistics": [
-        {
-            "user_id": "user1",
-            "username": "john_doe",
-            "total_orders": 15,
-            "total_spent": 2340.50,
-            "average_order_value": 156.03,
-            "first_order_date": "2023-01-15",
-            "last_order_date": "2023-12-20",
-            "favorite_category": "Electronics",
-            "status": "premium"
-        },
-        {
-            "user_id": "user2",
-            "username": "jane_smith",
-            "total_orders": 8,
-            "total_spent": 890.25,
-            "average_order_value": 111.28,
-            "first_order_date": "2023-03-10",
-            "last_order_date": "2023-11-30",
-            "favorite_category": "Fashion",
-            "status": "regular"
-        }
-    ],
-    "revenue_by_category": [
-        {"category": "Electronics", "revenue": 95000.00, "percentage": 65.5},
-        {"category": "Fashion", "revenue": 25000.50, "percentage": 17.2},
-        {"category": "Home & Garden", "revenue": 15000.75, "percentage": 10.3},
-        {"category": "Sports", "revenue": 7500.25, "percentage": 5.2},
-        {"category": "Books", "revenue": 2499.00, "percentage": 1.8}
+    "users": [
+        {"user_id": "user1", "username": "john_doe", "status": "premium"},
+        {"user_id": "user2", "username": "jane_smith", "status": "regular"}
     ]
 }
 
+# Columnar order-line store behind every aggregate query
+sales_facts = SalesFacts()
+
+def data_version():
+    """Changes whenever anything a resolver reads changes (reports are only ever added)"""
+    return id(sales_facts), sales_facts.version, len(sample_analytics_data["sales_reports"])
+
+# Resolver results, reused until the data changes or RESOLVER_CACHE_TTL passes
+resolver_cache = ResolverCache(
+    version=data_version,
+    ttl=RESOLVER_CACHE_TTL,
+    max_entries=RESOLVER_CACHE_SIZE
+)
+
+def seed_sales_facts(seed: int = 2023):
+    """Deterministically split the sample products' sales into 2023 order lines"""
+    rng = random.Random(seed)
+    first_day = to_day("2023-01-01")
+    lines = []
+    for user in sample_analytics_data["users"]:
+        sales_facts.add_user(user["user_id"], user["username"], user["status"])
+    for product in sample_analytics_data["products"]:
+        sales_facts.add_product(
+            product["product_id"],
+            product["product_name"],
+            product["category"],
+            product["average_rating"],
+            product["views"]
+        )
+        remaining = product["units_sold"]
+        while remaining > 0:
+            quantity = min(remaining, rng.randint(1, 3))
+            remaining -= quantity
+            lines.append({
+                "order_id": f"order{len(lines) + 1}",
+                "user_id": rng.choice(sample_analytics_data["users"])["user_id"],
+                "product_id": product["product_id"],
+                "quantity": quantity,
+                "revenue": quantity * product["unit_price"],
+                "day": first_day + rng.randrange(365)
+            })
+    sales_facts.record_many(lines)
+    print(f"✅ Seeded {len(lines)} order lines")
+
+def build_sales_report(report_id: str, period: str, start_date: str, end_date: str) -> dict:
+    """Sales report for an inclusive date range, computed from the order lines"""
+    return {
+        "id": report_id,
+        "period": period,
+        "start_date": start_date,
+        "end_date": end_date,
+        **sales_facts.totals(to_day(start_date), to_day(end_date)),
+        "generated_at": datetime.now().isoformat()
+    }
+
+# Sales reports by id and by the days they cover
+sales_report_index = ReportIndex()
+
+def publish_report(report: dict):
+    """Make a sales report the newest one"""
+    sales_report_index.add(report, to_day(report["start_date"]), to_day(report["end_date"]))
+    # Listed last: the list length is part of the data version
+    sample_analytics_data["sales_reports"].insert(0, report)
+
+# Seconds spent in each startup phase, exported by /metrics
+startup_timings = {}
+
+def load_sales_data():
+    """Restore the last snapshot if there is one, else seed the sample data"""
+    global sales_facts
+    started = time.perf_counter()
+    if ANALYTICS_SNAPSHOT_PATH and os.path.exists(ANALYTICS_SNAPSHOT_PATH):
+        sales_facts, reports = load_snapshot(ANALYTICS_SNAPSHOT_PATH)
+        # Oldest first, so the newest ends up first again
+        for report in reversed(reports):
+            publish_report(report)
+        startup_timings["restore"] = time.perf_counter() - started
+        print(f"⚡ Restored {len(sales_facts)} order lines and {len(reports)} reports from "
+              f"{ANALYTICS_SNAPSHOT_PATH} in {startup_timings['restore'] * 1e3:.0f} ms")
+        return
+    seed_sales_facts()
+    publish_report(build_sales_report("report2", "2023-Q3", "2023-07-01", "2023-09-30"))
+    publish_report(build_sales_report("report1", "2023-Q4", "2023-10-01", "2023-12-31"))
+    startup_timings["seed"] = time.perf_counter() - started
+    print(f"🌱 Seeded sample data in {startup_timings['seed'] * 1e3:.0f} ms")
+
+def capture_snapshot() -> tuple:
+    """The facts' state and the reports, for write_snapshot.
+
+    Call it on the event loop, between ingestion batches; the capture can
+    then be written out on another thread while events keep coming in.
+    """
+    return sales_facts.state(), list(sample_analytics_data["sales_reports"])
+
+load_sales_data()
+
+# Report builders, run on the report worker pool
+def generate_sales_report(report_id, start_date, end_date, params):
+    first_day, last_day = sales_facts.day_range()
+    today = datetime.now().date().isoformat()
+    start_date = start_date or (from_day(first_day) if first_day is not None else today)
+    end_date = end_date or (from_day(last_day) if last_day is not None else today)
+    report = build_sales_report(report_id, params.get("period", f"{start_date} to {end_date}"), start_date, end_date)
+    publish_report(report)
+    return report, f"Sales report generated for period {start_date} to {end_date}"
+
+def generate_products_report(report_id, start_date, end_date, params):
+    return sales_facts.product_stats(params.get("limit")), "Product performance report generated"
+
+def generate_users_report(report_id, start_date, end_date, params):
+    return sales_facts.user_statistics(params.get("user_ids")), "User analytics report generated"
+
+def generate_revenue_report(report_id, start_date, end_date, params):
+    return sales_facts.revenue_by_category(), "Revenue breakdown report generated"
+
+# Order events are folded into sales_facts by a single consumer task
+order_ingestor = OrderIngestor(lambda: sales_facts, queue_size=INGEST_QUEUE_SIZE, batch_size=INGEST_BATCH_SIZE)
+ingestion_tasks = []
+
+# Pooled client for the user and product services
+upstream_clients = UpstreamClients(
+    USER_SERVICE_URL,
+    PRODUCT_SERVICE_URL,
+    max_connections=UPSTREAM_MAX_CONNECTIONS,
+    max_concurrency=UPSTREAM_CONCURRENCY,
+    timeout=UPSTREAM_TIMEOUT,
+    max_batch_size=UPSTREAM_BATCH_SIZE
+)
+
+async def load_user_statistics(user_ids):
+    return {stats["user_id"]: stats for stats in sales_facts.user_statistics(user_ids)}
+
+def request_loaders(upstream: bool = True) -> dict:
+    """Fresh DataLoaders for one GraphQL request"""
+    loaders = {"user_statistics": DataLoader(load_user_statistics, max_batch_size=1000)}
+    if upstream and upstream_clients.client is not None:
+        loaders.update(upstream_clients.loaders())
+    return loaders
+
+def request_loader(info, name: str) -> DataLoader:
+    """The request's DataLoader for `name`"""
+    loaders = (info.context or {}).get("loaders") or {}
+    if name not in loaders:
+        raise RuntimeError(f"No {name} loader for this request")
+    return loaders[name]
+
+report_jobs = ReportJobs({
+    "sales": generate_sales_report,
+    "products": generate_products_report,
+    "users": generate_users_report,
+    "revenue": generate_revenue_report
+}, workers=REPORT_WORKERS)
+
 # GraphQL Types
+class UserProfile(ObjectType):
+    """A user's account, from user-service"""
+    id = String()
+    email = String()
+    name = String()
+    role = String()
+    created_at = String()
+
+class CatalogProduct(ObjectType):
+    """A product's current catalog entry, from product-service"""
+    id = String()
+    name = String()
+    description = String()
+    price = Float()
+    category = String()
+    stock = Int()
+    updated_at = String()
+
 class SalesReport(ObjectType):
     id = String()
     period = String()
@@ -122,6 +287,13 @@ class SalesReport(ObjectType):
     average_order_value = Float()
     generated_at = String()
 
+class SalesPeriod(ObjectType):
+    start_date = String()
+    end_date = String()
+    total_revenue = Float()
+    total_orders = Int()
+    average_order_value = Float()
+
 class ProductStats(ObjectType):
     product_id = String()
     product_name = String()
@@ -131,6 +303,11 @@ class ProductStats(ObjectType):
     average_rating = Float()
     views = Int()
     conversion_rate = Float()
+    catalog = Field(CatalogProduct)
+
+    async def resolve_catalog(root, info):
+        """Batched with every other catalog lookup of the request"""
+        return await request_loader(info, "products").load(root.product_id)
 
 class UserStatistics(ObjectType):
     user_id = String()
@@ -142,6 +319,14 @@ class UserStatistics(ObjectType):
     last_order_date = String()
     favorite_category = String()
     status = String()
+    profile = Field(UserProfile)
+
+    async def resolve_profile(root, info):
+        """Batched with every other profile lookup of the request"""
+        user = await request_loader(info, "users").load(root.user_id)
+        if user is None:
+            return None
+        return {**user, "created_at": user.get("createdAt")}
 
 class CategoryRevenue(ObjectType):
     category = String()
@@ -151,29 +336,57 @@ class CategoryRevenue(ObjectType):
 class ReportGenerationResult(ObjectType):
     success = graphene.Boolean()
     report_id = String()
+    status = String()
     message = String()
     generated_at = String()
 
+class ReportStatus(ObjectType):
+    report_id = String()
+    report_type = String()
+    status = String()  # pending, running, completed or failed
+    message = String()
+    created_at = String()
+    completed_at = String()
+    result = String()  # JSON document, once completed
+
 # GraphQL Queries
 class Query(ObjectType):
     sales_report = Field(SalesReport, start_date=String(), end_date=String())
     sales_reports = GrapheneList(SalesReport)
+    sales_trend = GrapheneList(
+        SalesPeriod,
+        granularity=String(default_value="month"),
+        start_date=String(),
+        end_date=String()
+    )
     top_products = GrapheneList(ProductStats, limit=Int(default_value=10))
     user_statistics = Field(UserStatistics, user_id=String())
     all_user_statistics = GrapheneList(UserStatistics)
     revenue_by_category = GrapheneList(CategoryRevenue)
+    report = Field(ReportStatus, report_id=String(required=True))
 
+    @resolver_cache.memoize("sales_report")
     def resolve_sales_report(self, info, start_date=None, end_date=None):
         """Get a specific sales report by date range"""
         try:
             reports = sample_analytics_data["sales_reports"]
 
             if start_date and end_date:
-                # Filter by date range
-                for report in reports:
-                    if report["start_date"] <= start_date <= report["end_date"]:
-                        return SalesReport(**report)
-                return None
+                start_day, end_day = to_day(start_date), to_day(end_date)
+                if end_day < start_day:
+                    raise ValueError("endDate is before startDate")
+                # A generated report for exactly this range, else computed
+                # on the fly from the daily rollups
+                report = sales_report_index.covering(start_day)
+                if report is not None and (to_day(report["start_date"]), to_day(report["end_date"])) == (start_day, end_day):
+                    return SalesReport(**report)
+                start_date, end_date = from_day(start_day), from_day(end_day)
+                return SalesReport(**build_sales_report(
+                    f"range_{start_date}_{end_date}",
+                    f"{start_date} to {end_date}",
+                    start_date,
+                    end_date
+                ))
 
             # Return the most recent report
             if reports:
@@ -182,6 +395,7 @@ class Query(ObjectType):
         except Exception as e:
             raise Exception(f"Failed to get sales report: {str(e)}")
 
+    @resolver_cache.memoize("sales_reports")
     def resolve_sales_reports(self, info):
         """Get all sales reports"""
         try:
@@ -190,50 +404,68 @@ class Query(ObjectType):
         except Exception as e:
             raise Exception(f"Failed to get sales reports: {str(e)}")
 
+    @resolver_cache.memoize("sales_trend")
+    def resolve_sales_trend(self, info, granularity="month", start_date=None, end_date=None):
+        """Get revenue, orders and average order value per day, week or month"""
+        try:
+            first_day, last_day = sales_facts.day_range()
+            start_day = to_day(start_date) if start_date else first_day
+            end_day = to_day(end_date) if end_date else last_day
+            if start_day is None or end_day is None:
+                return []
+            return [SalesPeriod(**period) for period in sales_facts.trend(granularity, start_day, end_day)]
+        except Exception as e:
+            raise Exception(f"Failed to get sales trend: {str(e)}")
+
+    @resolver_cache.memoize("top_products")
     def resolve_top_products(self, info, limit=10):
         """Get top performing products"""
         try:
-            products = sample_analytics_data["product_stats"]
-            # Sort by total revenue
-            sorted_products = sorted(products, key=lambda x: x["total_revenue"], reverse=True)
-            return [ProductStats(**product) for product in sorted_products[:limit]]
+            return [ProductStats(**product) for product in sales_facts.product_stats(limit)]
         except Exception as e:
             raise Exception(f"Failed to get top products: {str(e)}")
 
-    def resolve_user_statistics(self, info, user_id=None):
-        """Get statistics for a specific user"""
+    async def resolve_user_statistics(self, info, user_id=None):
+        """Get statistics for a specific user (every userStatistics of a request shares one lookup)"""
         try:
-            users = sample_analytics_data["user_statistics"]
-
-            if user_id:
-                for user in users:
-                    if user["user_id"] == user_id:
-                        return UserStatistics(**user)
-                return None
-
-            # Return first user if no specific ID provided
-            if users:
-                return UserStatistics(**users[0])
+            if not user_id:
+                # Return first user if no specific ID provided
+                if not sales_facts.users.values:
+                    return None
+                user_id = sales_facts.users.values[0]
+
+            stats = await request_loader(info, "user_statistics").load(user_id)
+            if stats:
+                return UserStatistics(**stats)
             return None
         except Exception as e:
             raise Exception(f"Failed to get user statistics: {str(e)}")
 
+    @resolver_cache.memoize("all_user_statistics")
     def resolve_all_user_statistics(self, info):
         """Get statistics for all users"""
         try:
-            users = sample_analytics_data["user_statistics"]
-            return [UserStatistics(**user) for user in users]
+            return [UserStatistics(**user) for user in sales_facts.user_statistics()]
         except Exception as e:
             raise Exception(f"Failed to get all user statistics: {str(e)}")
 
+    @resolver_cache.memoize("revenue_by_category")
     def resolve_revenue_by_category(self, info):
         """Get revenue breakdown by category"""
         try:
-            categories = sample_analytics_data["revenue_by_category"]
-            return [CategoryRevenue(**category) for category in categories]
+            return [CategoryRevenue(**category) for category in sales_facts.revenue_by_category()]
         except Exception as e:
             raise Exception(f"Failed to get revenue by category: {str(e)}")
 
+    def resolve_report(self, info, report_id):
+        """Get the status, and once finished the result, of a generated report"""
+        job = report_jobs.get(report_id)
+        if job is None:
+            return None
+        if job["result"] is not None:
+            job["result"] = json.dumps(job["result"])
+        return ReportStatus(**job)
+
 # GraphQL Mutations
 class GenerateReport(Mutation):
     class Arguments:
@@ -245,7 +477,7 @@ class GenerateReport(Mutation):
     Output = ReportGenerationResult
 
     def mutate(self, info, report_type, start_date=None, end_date=None, params=None):
-        """Generate a new analytics report"""
+        """Queue a new analytics report; poll it with the `report` query"""
         try:
             # Parse additional parameters if provided
             additional_params = {}
@@ -260,37 +492,30 @@ class GenerateReport(Mutation):
                         generated_at=datetime.now().isoformat()
                     )
 
-            # Generate report based on type
-            report_id = f"report_{report_type}_{int(datetime.now().timestamp())}"
-
-            if report_type == "sales":
-                # Generate sales report
-                message = f"Sales report generated for period {start_date} to {end_date}"
-            elif report_type == "products":
-                # Generate product performance report
-                message = f"Product performance report generated"
-            elif report_type == "users":
-                # Generate user analytics report
-                message = f"User analytics report generated"
-            elif report_type == "revenue":
-                # Generate revenue breakdown report
-                message = f"Revenue breakdown report generated"
-            else:
-                return ReportGenerationResult(
-                    success=False,
-                    report_id=None,
-                    message=f"Unknown report type: {report_type}",
-                    generated_at=datetime.now().isoformat()
-                )
-
-            # Simulate report generation (in real implementation, this would create actual reports)
+            # Reject bad dates now rather than in the background job
+            for value in (start_date, end_date):
+                if value:
+                    try:
+                        to_day(value)
+                    except ValueError:
+                        raise ValueError(f"Invalid date: {value} (expected YYYY-MM-DD)")
+
+            job = report_jobs.submit(report_type, start_date, end_date, additional_params)
             return ReportGenerationResult(
                 success=True,
-                report_id=report_id,
-                message=message,
-                generated_at=datetime.now().isoformat()
+                report_id=job["report_id"],
+                status=job["status"],
+                message=job["message"],
+                generated_at=job["created_at"]
             )
 
+        except ValueError as e:
+            return ReportGenerationResult(
+                success=False,
+                report_id=None,
+                message=str(e),
+                generated_at=datetime.now().isoformat()
+            )
         except Exception as e:
             return ReportGenerationResult(
                 success=False,
@@ -305,6 +530,174 @@ class Mutations(ObjectType):
 # Create GraphQL schema
 schema = Schema(query=Query, mutation=Mutations)
 
+# Parsed and validated documents, plus Automatic Persisted Queries
+document_cache = DocumentCache(schema.graphql_schema, max_entries=DOCUMENT_CACHE_SIZE)
+
+def sales_trend_size(args: dict) -> int:
+    """Number of periods salesTrend will return"""
+    first_day, last_day = sales_facts.day_range()
+    start_day = to_day(args["start_date"]) if args.get("start_date") else first_day
+    end_day = to_day(args["end_date"]) if args.get("end_date") else last_day
+    if start_day is None or end_day is None or end_day < start_day:
+        return 0
+    days = end_day - start_day + 1
+    return {"day": days, "week": days // 7 + 2, "month": days // 28 + 2}.get(args.get("granularity"), 1)
+
+def top_products_size(args: dict) -> int:
+    limit = args.get("limit")
+    return len(sales_facts.products) if limit is None else min(limit, len(sales_facts.products))
+
+# Static cost analysis: list fields multiply the cost of what they contain
+cost_analyzer = CostAnalyzer(
+    schema.graphql_schema,
+    max_depth=GRAPHQL_MAX_DEPTH,
+    max_aliases=GRAPHQL_MAX_ALIASES,
+    max_cost=GRAPHQL_MAX_COST,
+    list_sizes={
+        "Query.topProducts": top_products_size,
+        "Query.allUserStatistics": lambda args: len(sales_facts.users),
+        "Query.salesReports": lambda args: len(sample_analytics_data["sales_reports"]),
+        "Query.revenueByCategory": lambda args: len(sales_facts.categories),
+        "Query.salesTrend": sales_trend_size,
+    },
+    weights={
+        # Fetched from other services
+        "UserStatistics.profile": 5,
+        "ProductStats.catalog": 5,
+        "Mutations.generateReport": 20,
+    }
+)
+cost_limiter = CostLimiter(GRAPHQL_COST_RATE, GRAPHQL_COST_BURST) if GRAPHQL_COST_RATE > 0 else None
+
+def client_id(request: Request) -> str:
+    """Who a request's query cost is charged to: X-Client-Id, else the caller's address"""
+    return request.headers.get("x-client-id") or (request.client.host if request.client else "unknown")
+
+# Metrics, served by /metrics
+metrics = Registry()
+instrument_resolvers(
+    schema.graphql_schema,
+    metrics.histogram("graphql_resolver_duration_seconds", "GraphQL resolver execution time", ("field",))
+)
+
+def cache_counters() -> dict:
+    return {
+        (name, result): count
+        for name, cache in (("document", document_cache), ("resolver", resolver_cache))
+        for result, count in (("hit", cache.hits), ("miss", cache.misses))
+    }
+
+metrics.callback(
+    "analytics_store_size", "Items held in memory", labelnames=("store",),
+    callback=lambda: {
+        ("order_lines",): len(sales_facts),
+        ("products",): len(sales_facts.products),
+        ("users",): len(sales_facts.users),
+        ("categories",): len(sales_facts.categories),
+        ("sales_reports",): len(sample_analytics_data["sales_reports"]),
+        ("report_jobs",): len(report_jobs),
+    }
+)
+metrics.callback(
+    "cache_entries", "Entries held per cache", labelnames=("cache",),
+    callback=lambda: {("document",): len(document_cache), ("resolver",): len(resolver_cache)}
+)
+metrics.callback("cache_requests_total", "Cache lookups", cache_counters, "counter", ("cache", "result"))
+metrics.callback(
+    "cache_hit_ratio", "Share of cache lookups that hit", labelnames=("cache",),
+    callback=lambda: {
+        ("document",): hit_ratio(document_cache.hits, document_cache.misses),
+        ("resolver",): hit_ratio(resolver_cache.hits, resolver_cache.misses),
+    }
+)
+metrics.callback(
+    "ingestion_events_total", "Order events by outcome", kind="counter", labelnames=("result",),
+    callback=lambda: {(key,): order_ingestor.stats[key] for key in ("received", "ingested", "skipped", "failed")}
+)
+metrics.callback(
+    "startup_duration_seconds", "Time spent loading data at startup", labelnames=("phase",),
+    callback=lambda: {(phase,): seconds for phase, seconds in startup_timings.items()}
+)
+metrics.callback("ingestion_queue_depth", "Order events waiting", lambda: order_ingestor.queue.qsize())
+metrics.callback(
+    "upstream_requests_total", "Requests to other services by outcome", kind="counter",
+    labelnames=("upstream", "result"),
+    callback=lambda: {
+        (upstream.name, result): count
+        for upstream in upstream_clients.upstreams.values()
+        for result, count in (("sent", upstream.stats["requests"]), ("error", upstream.stats["errors"]))
+    }
+)
+metrics.callback(
+    "graphql_query_limits_total", "Queries checked against the cost budgets and throttling", kind="counter",
+    labelnames=("result",),
+    callback=lambda: {
+        ("checked",): cost_analyzer.stats["checked"],
+        ("rejected",): cost_analyzer.stats["rejected"],
+        **({(key,): count for key, count in cost_limiter.stats.items()} if cost_limiter is not None else {}),
+    }
+)
+
+def start_graphql(query: str, variables: Optional[dict], operation_name: Optional[str], context: Optional[dict]):
+    """Execute a query from the document cache, parsing and validating it only on a miss.
+
+    Returns the result, or an awaitable of it when the query selects
+    upstream-backed fields: those resolve asynchronously, and their loads
+    only batch once the awaitable runs on the event loop.
+    """
+    document, errors = document_cache.get(query)
+    if errors:
+        return ExecutionResult(None, errors)
+    return execute(
+        schema.graphql_schema,
+        document,
+        variable_values=variables,
+        operation_name=operation_name,
+        context_value=context
+    )
+
+async def finish_graphql(result):
+    return await result
+
+thread_loops = threading.local()
+
+def private_loop() -> asyncio.AbstractEventLoop:
+    """An event loop owned by the calling thread, kept for reuse"""
+    loop = getattr(thread_loops, "loop", None)
+    if loop is None:
+        loop = thread_loops.loop = asyncio.new_event_loop()
+    return loop
+
+def execute_graphql(
+    query: str,
+    variables: Optional[dict],
+    operation_name: Optional[str] = None,
+    context: Optional[dict] = None,
+    loop: Optional[asyncio.AbstractEventLoop] = None
+):
+    """Execute a query off the event loop.
+
+    Fields resolved through DataLoaders are finished on `loop`, the event
+    loop the upstream connections live on. Without one they finish on a
+    private loop, with local loaders only.
+    """
+    if context is None:
+        context = {"loaders": request_loaders(upstream=loop is not None)}
+    result = start_graphql(query, variables, operation_name, context)
+    if isawaitable(result):
+        if loop is None:
+            result = private_loop().run_until_complete(finish_graphql(result))
+        else:
+            result = asyncio.run_coroutine_threadsafe(finish_graphql(result), loop).result()
+    return result.data, result.errors
+
+# Resolvers are synchronous, so queries run on a bounded pool of threads and
+# a slow one never stalls the event loop; GRAPHQL_WORKERS=0 runs them inline
+graphql_executor = (
+    ThreadPoolExecutor(max_workers=GRAPHQL_WORKERS, thread_name_prefix="graphql")
+    if GRAPHQL_WORKERS > 0 else None
+)
+
 # FastAPI app initialization
 app = FastAPI(
     title="Analytics Service",
@@ -329,6 +722,9 @@ app.add_middleware(
     allowed_hosts=["*"]  # Configure appropriately for production
 )
 
+# Request metrics
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
 # Health check model
 class HealthResponse(BaseModel):
     service: str
@@ -336,21 +732,84 @@ class HealthResponse(BaseModel):
     timestamp: datetime
     version: str
 
+# Order event models (the order service's Order type)
+class OrderEventItem(BaseModel):
+    productId: str
+    productName: Optional[str] = None
+    quantity: int
+    price: float
+
+class OrderEvent(BaseModel):
+    id: str
+    userId: str
+    status: str = "PENDING"
+    total: Optional[float] = None
+    items: List[OrderEventItem]
+    createdAt: Optional[str] = None
+
 # GraphQL endpoint
 @app.post("/graphql")
 async def graphql_endpoint(request: Request):
     """GraphQL endpoint"""
     try:
         body = await request.json()
-        query = body.get("query")
-        variables = body.get("variables", {})
+        variables = body.get("variables") or {}
+        persisted = (body.get("extensions") or {}).get("persistedQuery") or {}
+        try:
+            query = document_cache.resolve_query(body.get("query"), persisted.get("sha256Hash"))
+        except PersistedQueryNotFound:
+            # Apollo clients look for this exact error and resend the full query
+            return {"errors": [{
+                "message": "PersistedQueryNotFound",
+                "extensions": {"code": "PERSISTED_QUERY_NOT_FOUND"}
+            }]}
+        except PersistedQueryMismatch as e:
+            return {"errors": [str(e)]}
+        if not query:
+            return {"errors": ["Must provide query string."]}
+
+        operation_name = body.get("operationName")
+        document, _ = document_cache.get(query)
+        if document is not None:
+            # Invalid documents are left to execution, which reports why
+            try:
+                cost = cost_analyzer.check(document, operation_name, variables)
+            except QueryTooComplex as e:
+                return {"errors": [{"message": str(e), "extensions": {"code": "QUERY_TOO_COMPLEX"}}]}
+            if cost_limiter is not None:
+                retry_after = cost_limiter.acquire(client_id(request), max(cost.cost if cost else 0, 1))
+                if retry_after:
+                    return JSONResponse(
+                        status_code=status.HTTP_429_TOO_MANY_REQUESTS,
+                        headers={"Retry-After": str(math.ceil(retry_after))},
+                        content={"errors": [{
+                            "message": "Query cost rate limit exceeded, retry later",
+                            "extensions": {"code": "RATE_LIMITED", "retryAfter": round(retry_after, 2)}
+                        }]}
+                    )
 
-        result = schema.execute(query, variable_values=variables)
+        context = {"loaders": request_loaders()}
+        if graphql_executor is None:
+            result = start_graphql(query, variables, operation_name, context)
+            if isawaitable(result):
+                result = await result
+            data, errors = result.data, result.errors
+        else:
+            loop = asyncio.get_running_loop()
+            data, errors = await loop.run_in_executor(
+                graphql_executor,
+                execute_graphql,
+                query,
+                variables,
+                operation_name,
+                context,
+                loop
+            )
 
-        if result.errors:
-            return {"errors": [str(error) for error in result.errors]}
+        if errors:
+            return {"errors": [str(error) for error in errors]}
 
-        return {"data": result.data}
+        return {"data": data}
     except Exception as e:
         return {"errors": [str(e)]}
 
@@ -365,7 +824,9 @@ async def graphql_playground():
             "top_products": "query { topProducts(limit: 5) { productId productName totalRevenue } }",
             "user_statistics": "query { userStatistics(userId: \"user1\") { username totalOrders totalSpent } }",
             "revenue_by_category": "query { revenueByCategory { category revenue percentage } }",
-            "generate_report": "mutation { generateReport(reportType: \"sales\", startDate: \"2023-01-01\", endDate: \"2023-12-31\") { success reportId message } }"
+            "sales_trend": "query { salesTrend(granularity: \"month\", startDate: \"2023-01-01\", endDate: \"2023-12-31\") { startDate totalRevenue totalOrders } }",
+            "generate_report": "mutation { generateReport(reportType: \"sales\", startDate: \"2023-01-01\", endDate: \"2023-12-31\") { success reportId status message } }",
+            "report": "query { report(reportId: \"<reportId>\") { status message result } }"
         }
     }
 
@@ -379,19 +840,86 @@ async def health_check():
         version="1.0.0"
     )
 
+# Prometheus metrics
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
 # Legacy REST endpoint for backward compatibility
 @app.get("/api/analytics/summary")
 async def get_analytics_summary():
     """Get a summary of all analytics data (REST endpoint for backward compatibility)"""
     return {
         "total_reports": len(sample_analytics_data["sales_reports"]),
-        "total_products_tracked": len(sample_analytics_data["product_stats"]),
-        "total_users_analyzed": len(sample_analytics_data["user_statistics"]),
-        "categories_tracked": len(sample_analytics_data["revenue_by_category"]),
+        "total_products_tracked": len(sales_facts.products),
+        "total_users_analyzed": len(sales_facts.users),
+        "categories_tracked": len(sales_facts.revenue_by_category()),
+        "order_lines": len(sales_facts),
+        "ingestion": {**order_ingestor.stats, "queued": order_ingestor.queue.qsize()},
+        "query_limits": {**cost_analyzer.stats, **(cost_limiter.stats if cost_limiter is not None else {})},
         "last_updated": datetime.now().isoformat(),
         "graphql_endpoint": "/graphql"
     }
 
+# Order event ingestion
+@app.post("/api/analytics/events/orders", status_code=status.HTTP_202_ACCEPTED)
+async def ingest_order_events(events: Union[OrderEvent, List[OrderEvent]]):
+    """Queue one order event or a batch of them for ingestion"""
+    if isinstance(events, OrderEvent):
+        events = [events]
+    queue = order_ingestor.queue
+    if queue.maxsize and queue.qsize() + len(events) > queue.maxsize:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Ingestion queue is full, retry later"
+        )
+    for event in events:
+        order_ingestor.offer(event.model_dump())
+    return {"accepted": len(events), "queued": queue.qsize()}
+
+# Snapshots
+snapshot_lock = asyncio.Lock()
+
+@app.post("/api/analytics/snapshot")
+async def create_snapshot():
+    """Write a snapshot of the facts and reports for the next startup to restore"""
+    if not ANALYTICS_SNAPSHOT_PATH:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Snapshots are disabled, set ANALYTICS_SNAPSHOT_PATH"
+        )
+    async with snapshot_lock:
+        started = time.perf_counter()
+        state, reports = capture_snapshot()
+        manifest = await asyncio.to_thread(write_snapshot, state, reports, ANALYTICS_SNAPSHOT_PATH)
+    return {
+        "path": ANALYTICS_SNAPSHOT_PATH,
+        "created_at": manifest["created_at"],
+        "order_lines": manifest["order_lines"],
+        "reports": len(reports),
+        "seconds": round(time.perf_counter() - started, 3)
+    }
+
+@app.on_event("startup")
+async def startup_event():
+    upstream_clients.start()
+    ingestion_tasks.append(asyncio.create_task(order_ingestor.run()))
+    if INGEST_SIMULATE_RATE > 0:
+        ingestion_tasks.append(asyncio.create_task(simulate_orders(order_ingestor, INGEST_SIMULATE_RATE)))
+        print(f"🧪 Simulating {INGEST_SIMULATE_RATE:g} order events/s")
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    for task in ingestion_tasks:
+        task.cancel()
+    if ANALYTICS_SNAPSHOT_PATH and SNAPSHOT_ON_SHUTDOWN:
+        manifest = write_snapshot(*capture_snapshot(), ANALYTICS_SNAPSHOT_PATH)
+        print(f"💾 Snapshot of {manifest['order_lines']} order lines written to {ANALYTICS_SNAPSHOT_PATH}")
+    await upstream_clients.close()
+    report_jobs.shutdown()
+    if graphql_executor is not None:
+        graphql_executor.shutdown(wait=False)
+
 # Exception handlers
 @app.exception_handler(ValueError)
 async def value_error_handler(request, exc):
@@ -0,0 +1,97 @@
+import functools
+import threading
+import time
+from collections import OrderedDict
+from concurrent.futures import Future
+from typing import Any, Callable, Dict, Hashable, Optional, Tuple
+
+
+def freeze(value) -> Hashable:
+    """Hashable form of a resolver argument (lists and dicts included)"""
+    if isinstance(value, dict):
+        return tuple(sorted((key, freeze(item)) for key, item in value.items()))
+    if isinstance(value, (list, tuple, set)):
+        return tuple(freeze(item) for item in value)
+    return value
+
+
+class ResolverCache:
+    """Memoizes resolver results by resolver name and arguments.
+
+    Keys embed the current data version, so every write makes the old
+    results unreachable and they age out of the LRU. Entries also expire
+    after `ttl` seconds, and concurrent misses on the same key wait for a
+    single computation instead of stampeding. Memory is bounded by the entry
+    count, and lists longer than `max_result_items` are never stored.
+    """
+
+    def __init__(
+        self,
+        version: Callable[[], Hashable] = lambda: 0,
+        ttl: float = 30.0,
+        max_entries: int = 1024,
+        max_result_items: int = 10000
+    ):
+        self.version = version
+        self.ttl = ttl
+        self.max_entries = max_entries
+        self.max_result_items = max_result_items
+        self._entries: "OrderedDict[Hashable, Tuple[float, Any]]" = OrderedDict()
+        self._inflight: Dict[Hashable, Future] = {}
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    def get_or_compute(self, key: Hashable, compute: Callable[[], Any]) -> Any:
+        key = (self.version(), key)
+        now = time.monotonic()
+        with self._lock:
+            entry = self._entries.get(key)
+            if entry is not None and entry[0] > now:
+                self._entries.move_to_end(key)
+                self.hits += 1
+                return entry[1]
+            self.misses += 1
+            waiting = self._inflight.get(key)
+            if waiting is None:
+                future = self._inflight[key] = Future()
+        if waiting is not None:
+            return waiting.result()
+
+        try:
+            value = compute()
+        except BaseException as exc:
+            with self._lock:
+                del self._inflight[key]
+            future.set_exception(exc)
+            raise
+
+        with self._lock:
+            del self._inflight[key]
+            if self.max_entries > 0 and self.ttl > 0 and not (
+                isinstance(value, list) and len(value) > self.max_result_items
+            ):
+                self._entries[key] = (now + self.ttl, value)
+                self._entries.move_to_end(key)
+                while len(self._entries) > self.max_entries:
+                    self._entries.popitem(last=False)
+        future.set_result(value)
+        return value
+
+    def memoize(self, name: Optional[str] = None):
+        """Decorator for graphene resolvers `resolve_x(root, info, **args)`"""
+        def decorator(resolver):
+            label = name or resolver.__name__
+
+            @functools.wraps(resolver)
+            def wrapper(root, info, **kwargs):
+                return self.get_or_compute((label, freeze(kwargs)), lambda: resolver(root, info, **kwargs))
+            return wrapper
+        return decorator
+
+    def clear(self):
+        with self._lock:
+            self._entries.clear()
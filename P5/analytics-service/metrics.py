@@ -0,0 +1,287 @@
+import threading
+import time
+from bisect import bisect_left
+from functools import partial
+from inspect import isawaitable
+from typing import Any, Callable, Dict, Iterable, Tuple
+from graphql import GraphQLObjectType, GraphQLSchema
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Seconds: fine below a millisecond, where cached responses land
+DEFAULT_BUCKETS = (0.0005, 0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+Labels = Tuple[str, ...]
+
+
+def _escape(value: str) -> str:
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _format_value(value: float) -> str:
+    if value == float("inf"):
+        return "+Inf"
+    if value != value:
+        return "NaN"
+    return repr(int(value)) if float(value).is_integer() else repr(float(value))
+
+
+def _sample(name: str, labelnames: Iterable[str], labels: Iterable[Any], value: float) -> str:
+    pairs = ",".join(f'{key}="{_escape(label)}"' for key, label in zip(labelnames, labels))
+    return f"{name}{{{pairs}}} {_format_value(value)}" if pairs else f"{name} {_format_value(value)}"
+
+
+class Metric:
+    """A metric family whose values are written to per-thread shards.
+
+    Each thread updates its own dict of label values -> value, so recording
+    takes no lock and no two threads ever write the same object; a scrape
+    sums the shards. Only a thread's first write to the family takes the
+    lock, to register its shard.
+    """
+
+    kind = "untyped"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = ()):
+        self.name = name
+        self.documentation = documentation
+        self.labelnames = tuple(labelnames)
+        self._local = threading.local()
+        self._shards = []
+        self._lock = threading.Lock()
+
+    def _shard(self) -> dict:
+        try:
+            return self._local.shard
+        except AttributeError:
+            shard = self._local.shard = {}
+            with self._lock:
+                self._shards.append(shard)
+            return shard
+
+    def collect(self) -> Dict[Labels, Any]:
+        with self._lock:
+            shards = list(self._shards)
+        totals: Dict[Labels, Any] = {}
+        for shard in shards:
+            for labels, value in list(shard.items()):
+                totals[labels] = totals.get(labels, 0) + value
+        return totals
+
+    def render(self) -> Iterable[str]:
+        for labels, value in sorted(self.collect().items()):
+            yield _sample(self.name, self.labelnames, labels, value)
+
+
+class Counter(Metric):
+    kind = "counter"
+
+    def inc(self, labels: Labels = (), amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) + amount
+
+
+class Gauge(Counter):
+    kind = "gauge"
+
+    def dec(self, labels: Labels = (), amount: float = 1):
+        shard = self._shard()
+        shard[labels] = shard.get(labels, 0) - amount
+
+
+class Histogram(Metric):
+    """Observations counted into cumulative `le` buckets, plus their sum and count"""
+
+    kind = "histogram"
+
+    def __init__(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                 buckets: Tuple[float, ...] = DEFAULT_BUCKETS):
+        super().__init__(name, documentation, labelnames)
+        self.buckets = tuple(sorted(buckets))
+
+    def observe(self, value: float, labels: Labels = ()):
+        shard = self._shard()
+        counts = shard.get(labels)
+        if counts is None:
+            # One slot per bucket, one for +Inf, then the sum
+            counts = shard[labels] = [0] * (len(self.buckets) + 2)
+        counts[bisect_left(self.buckets, value)] += 1
+        counts[-1] += value
+
+    def collect(self) -> Dict[Labels, list]:
+        with self._lock:
+            shards = list(self._shards)
+        totals: Dict[Labels, list] = {}
+        for shard in shards:
+            for labels, counts in list(shard.items()):
+                total = totals.setdefault(labels, [0] * len(counts))
+                for i, count in enumerate(list(counts)):
+                    total[i] += count
+        return totals
+
+    def render(self) -> Iterable[str]:
+        labelnames = self.labelnames + ("le",)
+        for labels, counts in sorted(self.collect().items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                yield _sample(f"{self.name}_bucket", labelnames, labels + (_format_value(bound),), cumulative)
+            yield _sample(f"{self.name}_sum", self.labelnames, labels, counts[-1])
+            yield _sample(f"{self.name}_count", self.labelnames, labels, cumulative)
+
+
+class CallbackMetric(Metric):
+    """Values read at scrape time, for numbers the service already keeps (sizes, cache counters).
+
+    The callback returns a single value, or a dict of label values -> value.
+    """
+
+    def __init__(self, name: str, documentation: str, callback: Callable[[], Any], kind: str = "gauge",
+                 labelnames: Iterable[str] = ()):
+        super().__init__(name, documentation, labelnames)
+        self.kind = kind
+        self.callback = callback
+
+    def collect(self) -> Dict[Labels, Any]:
+        values = self.callback()
+        return values if isinstance(values, dict) else {(): values}
+
+
+class Registry:
+    """The metrics a service exposes, rendered in the Prometheus text format.
+
+    Families are created on first use and returned as-is afterwards, so the
+    same name always refers to the same metric.
+    """
+
+    def __init__(self):
+        self._metrics: Dict[str, Metric] = {}
+        self._lock = threading.Lock()
+
+    def _register(self, name: str, create: Callable[[], Metric]) -> Any:
+        with self._lock:
+            metric = self._metrics.get(name)
+            if metric is None:
+                metric = self._metrics[name] = create()
+            return metric
+
+    def counter(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Counter:
+        return self._register(name, lambda: Counter(name, documentation, labelnames))
+
+    def gauge(self, name: str, documentation: str, labelnames: Iterable[str] = ()) -> Gauge:
+        return self._register(name, lambda: Gauge(name, documentation, labelnames))
+
+    def histogram(self, name: str, documentation: str, labelnames: Iterable[str] = (),
+                  buckets: Tuple[float, ...] = DEFAULT_BUCKETS) -> Histogram:
+        return self._register(name, lambda: Histogram(name, documentation, labelnames, buckets))
+
+    def callback(self, name: str, documentation: str, callback: Callable[[], Any], kind: str = "gauge",
+                 labelnames: Iterable[str] = ()) -> CallbackMetric:
+        return self._register(name, lambda: CallbackMetric(name, documentation, callback, kind, labelnames))
+
+    def render(self) -> str:
+        with self._lock:
+            metrics = list(self._metrics.values())
+        lines = []
+        for metric in metrics:
+            lines.append(f"# HELP {metric.name} {metric.documentation}")
+            lines.append(f"# TYPE {metric.name} {metric.kind}")
+            lines.extend(metric.render())
+        return "\n".join(lines) + "\n"
+
+
+def hit_ratio(hits: int, misses: int) -> float:
+    return hits / (hits + misses) if hits + misses else 0.0
+
+
+class MetricsMiddleware:
+    """ASGI middleware timing every HTTP request by method, route and status.
+
+    Routes are labelled by their path template (/api/products/{product_id}),
+    not the raw path, so the number of series stays bounded; requests no
+    route matched share the route "unmatched".
+    """
+
+    def __init__(self, app, registry: Registry):
+        self.app = app
+        self.duration = registry.histogram(
+            "http_request_duration_seconds", "HTTP request latency", ("method", "route", "status")
+        )
+        self.in_flight = registry.gauge("http_requests_in_flight", "HTTP requests being served", ("method",))
+        self._routes: Dict[Any, str] = {}
+
+    def _route(self, scope) -> str:
+        endpoint = scope.get("endpoint")
+        if endpoint is None:
+            return "unmatched"
+        route = self._routes.get(endpoint)
+        if route is None:
+            self._routes = {
+                getattr(candidate, "endpoint", None): getattr(candidate, "path", "unmatched")
+                for candidate in scope["app"].routes
+            }
+            route = self._routes.get(endpoint, "unmatched")
+        return route
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = (scope["method"],)
+        response_status = [500]
+
+        async def send_with_status(message):
+            if message["type"] == "http.response.start":
+                response_status[0] = message["status"]
+            await send(message)
+
+        self.in_flight.inc(method)
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_with_status)
+        finally:
+            self.duration.observe(
+                time.perf_counter() - started, (scope["method"], self._route(scope), str(response_status[0]))
+            )
+            self.in_flight.dec(method)
+
+
+def instrument_resolvers(schema: GraphQLSchema, histogram: Histogram):
+    """Time every GraphQL field that has a resolver of its own, labelled "Type.field".
+
+    Fields read straight off their parent (graphene's default resolver, a
+    functools.partial) are left alone, so scalars cost nothing extra.
+    Asynchronous resolvers are timed until their result is ready.
+    """
+    for type_name, graphql_type in schema.type_map.items():
+        if type_name.startswith("__") or not isinstance(graphql_type, GraphQLObjectType):
+            continue
+        for field_name, field in graphql_type.fields.items():
+            if field.resolve is None or isinstance(field.resolve, partial):
+                continue
+            field.resolve = _timed(field.resolve, histogram, (f"{type_name}.{field_name}",))
+
+
+def _timed(resolve: Callable, histogram: Histogram, labels: Labels) -> Callable:
+    clock = time.perf_counter
+
+    async def finish(started: float, result):
+        try:
+            return await result
+        finally:
+            histogram.observe(clock() - started, labels)
+
+    def timed(root, info, **args):
+        started = clock()
+        try:
+            result = resolve(root, info, **args)
+        except Exception:
+            histogram.observe(clock() - started, labels)
+            raise
+        if isawaitable(result):
+            return finish(started, result)
+        histogram.observe(clock() - started, labels)
+        return result
+
+    return timed
@@ -0,0 +1,130 @@
+import heapq
+import threading
+import uuid
+from bisect import bisect_right
+from collections import OrderedDict
+from concurrent.futures import Executor, ThreadPoolExecutor
+from datetime import datetime
+from typing import Any, Callable, Dict, List, Optional, Tuple
+
+# A builder turns (report_id, start_date, end_date, params) into (result, message)
+ReportBuilder = Callable[[str, Optional[str], Optional[str], dict], Tuple[Any, str]]
+
+
+class ReportJobs:
+    """Runs report builders on a worker pool and tracks their progress.
+
+    `submit` only records the job and hands it to the pool, so the caller
+    gets a report id back immediately; the status and the result are polled
+    with `get`. Finished jobs are kept up to `history` entries, oldest dropped
+    first.
+    """
+
+    def __init__(self, builders: Dict[str, ReportBuilder], executor: Optional[Executor] = None,
+                 workers: int = 2, history: int = 1000):
+        self.builders = builders
+        self.history = history
+        self._executor = executor or ThreadPoolExecutor(max_workers=workers, thread_name_prefix="report")
+        self._jobs: "OrderedDict[str, dict]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._jobs)
+
+    def submit(self, report_type: str, start_date: Optional[str] = None, end_date: Optional[str] = None,
+               params: Optional[dict] = None) -> dict:
+        """Queue a report; raises ValueError for an unknown report type"""
+        builder = self.builders.get(report_type)
+        if builder is None:
+            raise ValueError(f"Unknown report type: {report_type}")
+
+        job = {
+            "report_id": f"report_{report_type}_{uuid.uuid4().hex[:12]}",
+            "report_type": report_type,
+            "status": "pending",
+            "message": "Report queued",
+            "created_at": datetime.now().isoformat(),
+            "completed_at": None,
+            "result": None,
+        }
+        with self._lock:
+            self._jobs[job["report_id"]] = job
+            while len(self._jobs) > self.history:
+                self._jobs.popitem(last=False)
+        self._executor.submit(self._run, job, builder, start_date, end_date, params or {})
+        return dict(job)
+
+    def _run(self, job: dict, builder: ReportBuilder, start_date, end_date, params):
+        job["status"] = "running"
+        try:
+            job["result"], job["message"] = builder(job["report_id"], start_date, end_date, params)
+            job["status"] = "completed"
+        except Exception as e:
+            job["message"] = f"Failed to generate report: {str(e)}"
+            job["status"] = "failed"
+        job["completed_at"] = datetime.now().isoformat()
+
+    def get(self, report_id: str) -> Optional[dict]:
+        """A snapshot of the job, or None if it is unknown or was evicted"""
+        job = self._jobs.get(report_id)
+        return dict(job) if job is not None else None
+
+    def shutdown(self):
+        self._executor.shutdown(wait=False, cancel_futures=True)
+
+
+class ReportIndex:
+    """Sales reports by id and by the days they cover.
+
+    `covering(day)` finds the newest report whose range contains a day in
+    O(log n). Report ranges are cut into elementary segments at every
+    boundary, and each segment remembers the newest report over it. Reports
+    are added rarely and looked up often, so the segments are rebuilt with a
+    sweep on every add (O(n log n)) and swapped in whole, which keeps
+    readers lock-free.
+    """
+
+    def __init__(self):
+        self._reports: List[dict] = []  # oldest first; position is the age order
+        self._ranges: List[Tuple[int, int]] = []
+        self._by_id: Dict[str, dict] = {}
+        self._segments: Tuple[List[int], List[int]] = ([], [])
+        self._lock = threading.Lock()
+
+    def __len__(self):
+        return len(self._reports)
+
+    def add(self, report: dict, start_day: int, end_day: int):
+        """Index a report covering the inclusive day range, as the newest one"""
+        with self._lock:
+            self._reports.append(report)
+            self._ranges.append((start_day, end_day + 1))
+            self._by_id[report["id"]] = report
+            self._segments = self._build()
+
+    def _build(self) -> Tuple[List[int], List[int]]:
+        bounds = sorted({day for day_range in self._ranges for day in day_range})
+        by_start = sorted(range(len(self._ranges)), key=lambda position: self._ranges[position][0])
+        newest = []
+        active = []  # (-position, end) of reports started so far
+        next_start = 0
+        for bound in bounds:
+            while next_start < len(by_start) and self._ranges[by_start[next_start]][0] <= bound:
+                position = by_start[next_start]
+                heapq.heappush(active, (-position, self._ranges[position][1]))
+                next_start += 1
+            while active and active[0][1] <= bound:
+                heapq.heappop(active)
+            newest.append(-active[0][0] if active else -1)
+        return bounds, newest
+
+    def get(self, report_id: str) -> Optional[dict]:
+        return self._by_id.get(report_id)
+
+    def covering(self, day: int) -> Optional[dict]:
+        """The newest report whose range contains the day, or None"""
+        bounds, newest = self._segments
+        segment = bisect_right(bounds, day) - 1
+        if segment < 0 or newest[segment] < 0:
+            return None
+        return self._reports[newest[segment]]
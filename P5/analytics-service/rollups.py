@@ -0,0 +1,198 @@
+from datetime import date
+from typing import List, Optional, Tuple
+import numpy as np
+from columnar import EPOCH
+
+GRANULARITIES = ("day", "week", "month")
+
+
+class FenwickTree:
+    """Prefix sums over a fixed-size array with O(log n) updates and queries"""
+
+    def __init__(self, values: np.ndarray):
+        # O(n) build: every node passes its partial sum on to its parent
+        tree = np.zeros(len(values) + 1)
+        tree[1:] = values
+        size = len(tree)
+        for node in range(1, size):
+            parent = node + (node & -node)
+            if parent < size:
+                tree[parent] += tree[node]
+        self._tree = tree
+
+    def __len__(self):
+        return len(self._tree) - 1
+
+    def add(self, index: int, delta: float):
+        tree = self._tree
+        node = index + 1
+        while node < len(tree):
+            tree[node] += delta
+            node += node & -node
+
+    def prefix(self, stop: int) -> float:
+        """Sum of values[:stop]"""
+        tree = self._tree
+        total = 0.0
+        node = min(stop, len(tree) - 1)
+        while node > 0:
+            total += tree[node]
+            node -= node & -node
+        return float(total)
+
+    def range_sum(self, start: int, stop: int) -> float:
+        """Sum of values[start:stop]"""
+        return self.prefix(stop) - self.prefix(start) if stop > start else 0.0
+
+
+class _Span:
+    """The days a rollup covers, with their daily series and trees"""
+
+    def __init__(self, first_day: int, revenue: np.ndarray, orders: np.ndarray):
+        self.first_day = first_day
+        self.revenue = revenue
+        self.orders = orders
+        self.revenue_tree = FenwickTree(revenue)
+        self.order_tree = FenwickTree(orders)
+
+
+class SalesRollup:
+    """Daily revenue and order counts with O(log n) totals for any day range.
+
+    Each day's revenue and new orders are kept in a daily series, mirrored
+    by Fenwick trees, so the totals of an arbitrary range are two prefix
+    queries per measure however many orders it spans. Weekly and monthly
+    rollups are sums of consecutive days of the series. The covered span
+    grows (doubling, then rebuilding the trees in O(days)) when a day
+    outside it arrives; the new span is swapped in whole so readers never
+    see it half built.
+    """
+
+    def __init__(self):
+        self._span: Optional[_Span] = None
+        self.first_day: Optional[int] = None
+        self.last_day: Optional[int] = None
+
+    def _cover(self, low: int, high: int) -> _Span:
+        span = self._span
+        if span is not None and span.first_day <= low and high < span.first_day + len(span.revenue):
+            return span
+        if span is None:
+            first_day, end = low, low + max(high - low + 1, 366)
+        else:
+            size = len(span.revenue)
+            first_day, end = span.first_day, span.first_day + size
+            if low < first_day:
+                first_day = min(low, first_day - size)
+            if high >= end:
+                end = max(high + 1, end + size)
+        revenue = np.zeros(end - first_day)
+        orders = np.zeros(end - first_day)
+        if span is not None:
+            offset = span.first_day - first_day
+            revenue[offset:offset + len(span.revenue)] = span.revenue
+            orders[offset:offset + len(span.orders)] = span.orders
+        self._span = _Span(first_day, revenue, orders)
+        return self._span
+
+    def add(self, days: np.ndarray, revenues: np.ndarray, order_days: np.ndarray):
+        """Fold in lines (their days and revenue) and new orders (the day each was placed)"""
+        touched = np.concatenate((days, order_days))
+        if not len(touched):
+            return
+        low, high = int(touched.min()), int(touched.max())
+        span = self._cover(low, high)
+
+        for series, tree, keys, weights in (
+            (span.revenue, span.revenue_tree, days, revenues),
+            (span.orders, span.order_tree, order_days, None),
+        ):
+            if not len(keys):
+                continue
+            positions, inverse = np.unique(keys - span.first_day, return_inverse=True)
+            sums = np.bincount(inverse.ravel(), weights=weights)
+            series[positions] += sums
+            for position, delta in zip(positions.tolist(), sums.tolist()):
+                tree.add(position, delta)
+
+        self.first_day = low if self.first_day is None else min(self.first_day, low)
+        self.last_day = high if self.last_day is None else max(self.last_day, high)
+
+    def reset(self):
+        self._span = None
+        self.first_day = self.last_day = None
+
+    def state(self) -> dict:
+        """Copies of the covered days and their daily series"""
+        span = self._span
+        return {
+            "first_day": self.first_day,
+            "last_day": self.last_day,
+            "span_first_day": span.first_day if span is not None else None,
+            "revenue": span.revenue.copy() if span is not None else np.zeros(0),
+            "orders": span.orders.copy() if span is not None else np.zeros(0),
+        }
+
+    @classmethod
+    def from_state(cls, state: dict) -> "SalesRollup":
+        """Rebuild from `state()`; the trees are rebuilt in O(days)"""
+        rollup = cls()
+        if state["span_first_day"] is not None:
+            rollup._span = _Span(state["span_first_day"], np.array(state["revenue"]), np.array(state["orders"]))
+        rollup.first_day, rollup.last_day = state["first_day"], state["last_day"]
+        return rollup
+
+    def totals(self, start_day: Optional[int] = None, end_day: Optional[int] = None) -> Tuple[float, int]:
+        """Revenue and orders placed over an inclusive day range"""
+        span = self._span
+        if span is None:
+            return 0.0, 0
+        start = 0 if start_day is None else max(start_day - span.first_day, 0)
+        stop = len(span.revenue) if end_day is None else min(end_day - span.first_day + 1, len(span.revenue))
+        if stop <= start:
+            return 0.0, 0
+        return span.revenue_tree.range_sum(start, stop), int(round(span.order_tree.range_sum(start, stop)))
+
+    def buckets(self, granularity: str, start_day: int, end_day: int) -> List[Tuple[int, int, float, int]]:
+        """(first day, last day, revenue, orders) per day, week (from Monday) or month in the range"""
+        if granularity not in GRANULARITIES:
+            raise ValueError(f"Unknown granularity: {granularity} (expected one of {', '.join(GRANULARITIES)})")
+        if end_day < start_day:
+            return []
+        starts = bucket_starts(granularity, start_day, end_day)
+        days = np.arange(start_day, end_day + 1)
+        revenue = np.zeros(len(days))
+        orders = np.zeros(len(days))
+        span = self._span
+        if span is not None:
+            low = max(start_day, span.first_day)
+            high = min(end_day + 1, span.first_day + len(span.revenue))
+            if high > low:
+                revenue[low - start_day:high - start_day] = span.revenue[low - span.first_day:high - span.first_day]
+                orders[low - start_day:high - start_day] = span.orders[low - span.first_day:high - span.first_day]
+        offsets = np.array(starts) - start_day
+        revenue_sums = np.add.reduceat(revenue, offsets)
+        order_sums = np.add.reduceat(orders, offsets)
+        ends = starts[1:] + [end_day + 1]
+        return [
+            (first, last - 1, float(revenue_sum), int(round(order_sum)))
+            for first, last, revenue_sum, order_sum in zip(starts, ends, revenue_sums, order_sums)
+        ]
+
+
+def bucket_starts(granularity: str, start_day: int, end_day: int) -> List[int]:
+    """First day of every bucket overlapping the range, the first one clipped to start_day"""
+    if granularity == "day":
+        return list(range(start_day, end_day + 1))
+    if granularity == "week":
+        # Day 0 (1970-01-01) was a Thursday; weeks start on Monday
+        next_monday = start_day - (start_day + 3) % 7 + 7
+        return [start_day] + list(range(next_monday, end_day + 1, 7))
+    starts = [start_day]
+    month = date.fromordinal(EPOCH.toordinal() + start_day).replace(day=1)
+    while True:
+        month = date(month.year + (month.month == 12), month.month % 12 + 1, 1)
+        day = (month - EPOCH).days
+        if day > end_day:
+            return starts
+        starts.append(day)
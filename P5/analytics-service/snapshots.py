@@ -0,0 +1,116 @@
+import json
+import os
+import shutil
+from datetime import datetime
+from typing import List, Tuple
+import numpy as np
+from columnar import LazyDictionary
+from facts import SalesFacts
+
+# Layout of a snapshot directory:
+#   manifest.json              format, creation time, counts and the sales reports
+#   {table}.{column}.npy       numeric fact columns, memory-mapped when loaded
+#   {table}.{column}.json      text columns (names, statuses)
+#   {dictionary}.json          dictionary values, in code order
+#   rollup.{series}.npy        daily revenue and order series
+#   user_category_revenue.npy
+SNAPSHOT_FORMAT = 1
+MANIFEST = "manifest.json"
+
+
+def _write_json(path: str, value):
+    with open(path, "w") as handle:
+        json.dump(value, handle, separators=(",", ":"))
+
+
+def _read_json(path: str):
+    with open(path) as handle:
+        return json.load(handle)
+
+
+def write_snapshot(state: dict, reports: List[dict], path: str) -> dict:
+    """Write a `SalesFacts.state()` and the sales reports to the directory `path`.
+
+    The snapshot is written next to it and swapped in once complete, so a
+    crash never leaves a half-written one behind. Returns the manifest.
+    """
+    staging = f"{path}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+
+    for name, values in state["dictionaries"].items():
+        _write_json(os.path.join(staging, f"{name}.json"), values)
+    for table, columns in state["tables"].items():
+        for column, values in columns.items():
+            file = os.path.join(staging, f"{table}.{column}")
+            if isinstance(values, list):
+                _write_json(f"{file}.json", values)
+            else:
+                np.save(f"{file}.npy", values)
+    rollup = state["rollup"]
+    for series in ("revenue", "orders"):
+        np.save(os.path.join(staging, f"rollup.{series}.npy"), rollup[series])
+    np.save(os.path.join(staging, "user_category_revenue.npy"), state["user_category_revenue"])
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "created_at": datetime.now().isoformat(),
+        "version": state["version"],
+        "counts": {name: len(values) for name, values in state["dictionaries"].items()},
+        "order_lines": len(state["tables"]["lines"]["order"]),
+        "columns": {table: list(columns) for table, columns in state["tables"].items()},
+        "rollup": {key: rollup[key] for key in ("first_day", "last_day", "span_first_day")},
+        "reports": reports,
+    }
+    _write_json(os.path.join(staging, MANIFEST), manifest)
+
+    # Swap it in; the previous snapshot may still be memory-mapped, which
+    # removing its files does not disturb
+    previous = f"{path}.old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, previous)
+    os.rename(staging, path)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+def load_snapshot(path: str) -> Tuple[SalesFacts, List[dict]]:
+    """The facts and sales reports of a snapshot directory.
+
+    Numeric columns are memory-mapped copy-on-write rather than read, so the
+    cost of a load hardly grows with the number of order lines: pages are
+    read as queries first touch them, and writes never reach the file. Order
+    ids are only needed to skip repeated order events, so they are loaded on
+    the first one.
+    """
+    manifest = _read_json(os.path.join(path, MANIFEST))
+    if manifest.get("format") != SNAPSHOT_FORMAT:
+        raise ValueError(f"Unsupported snapshot format: {manifest.get('format')!r}")
+
+    def dictionary(name: str):
+        file = os.path.join(path, f"{name}.json")
+        if name == "orders":
+            return LazyDictionary(manifest["counts"][name], lambda: _read_json(file))
+        return _read_json(file)
+
+    def column(table: str, name: str):
+        file = os.path.join(path, f"{table}.{name}")
+        if os.path.exists(f"{file}.npy"):
+            return np.load(f"{file}.npy", mmap_mode="c")
+        return _read_json(f"{file}.json")
+
+    rollup = dict(manifest["rollup"])
+    for series in ("revenue", "orders"):
+        rollup[series] = np.load(os.path.join(path, f"rollup.{series}.npy"))
+    state = {
+        "dictionaries": {name: dictionary(name) for name in SalesFacts.DICTIONARIES},
+        "tables": {
+            table: {name: column(table, name) for name in columns}
+            for table, columns in manifest["columns"].items()
+        },
+        "user_category_revenue": np.load(os.path.join(path, "user_category_revenue.npy")),
+        "rollup": rollup,
+        "version": manifest["version"],
+    }
+    return SalesFacts.from_state(state), manifest["reports"]
@@ -0,0 +1,88 @@
+import asyncio
+from typing import Any, Dict, List, Optional
+import httpx
+from loaders import DataLoader
+
+
+class UpstreamError(Exception):
+    """An upstream service failed, timed out or sent an unusable response"""
+
+
+class Upstream:
+    """One upstream service: a base URL, a concurrency limit and a timeout"""
+
+    def __init__(self, name: str, base_url: str, client: httpx.AsyncClient, max_concurrency: int = 20,
+                 timeout: float = 5.0):
+        self.name = name
+        self.base_url = base_url.rstrip("/")
+        self.client = client
+        self.timeout = timeout
+        self._semaphore = asyncio.Semaphore(max_concurrency)
+        self.stats = {"requests": 0, "errors": 0}
+
+    async def get_json(self, path: str, params: Optional[dict] = None) -> Any:
+        async with self._semaphore:
+            self.stats["requests"] += 1
+            try:
+                response = await self.client.get(f"{self.base_url}{path}", params=params, timeout=self.timeout)
+                response.raise_for_status()
+                return response.json()
+            except (httpx.HTTPError, ValueError) as e:
+                self.stats["errors"] += 1
+                raise UpstreamError(f"{self.name} request failed: {str(e) or type(e).__name__}") from e
+
+
+class UpstreamClients:
+    """Shared HTTP client for the user and product services.
+
+    A single httpx.AsyncClient keeps connections alive and pooled across
+    requests; each upstream gets its own concurrency limit so one slow
+    service cannot take every connection. `loaders()` returns fresh
+    per-request DataLoaders, so a GraphQL query touching N users or
+    products makes one batched call per upstream instead of N.
+    """
+
+    def __init__(self, user_service_url: str, product_service_url: str, max_connections: int = 100,
+                 max_concurrency: int = 20, timeout: float = 5.0, max_batch_size: int = 100):
+        self.user_service_url = user_service_url
+        self.product_service_url = product_service_url
+        self.max_connections = max_connections
+        self.max_concurrency = max_concurrency
+        self.timeout = timeout
+        self.max_batch_size = max_batch_size
+        self.client: Optional[httpx.AsyncClient] = None
+        self.upstreams: Dict[str, Upstream] = {}
+
+    def start(self):
+        """Open the connection pool; call from the event loop that will use it"""
+        limits = httpx.Limits(max_connections=self.max_connections, max_keepalive_connections=self.max_connections)
+        self.client = httpx.AsyncClient(limits=limits, timeout=self.timeout)
+        self.upstreams = {
+            "users": Upstream("user-service", self.user_service_url, self.client, self.max_concurrency, self.timeout),
+            "products": Upstream(
+                "product-service", self.product_service_url, self.client, self.max_concurrency, self.timeout
+            ),
+        }
+
+    async def close(self):
+        if self.client is not None:
+            await self.client.aclose()
+            self.client = None
+
+    async def fetch_users(self, user_ids: List[str]) -> Dict[str, dict]:
+        """User-service users by id, one call for the whole batch"""
+        payload = await self.upstreams["users"].get_json("/api/users", {"ids": ",".join(user_ids)})
+        return {user["id"]: user for user in payload["data"]}
+
+    async def fetch_products(self, product_ids: List[str]) -> Dict[str, dict]:
+        """Product-service products by id, one call for the whole batch"""
+        products = await self.upstreams["products"].get_json("/api/products/batch", {"ids": ",".join(product_ids)})
+        return {product["id"]: product for product in products}
+
+    def loaders(self) -> Dict[str, DataLoader]:
+        if self.client is None:
+            raise UpstreamError("Upstream clients are not started")
+        return {
+            "users": DataLoader(self.fetch_users, self.max_batch_size),
+            "products": DataLoader(self.fetch_products, self.max_batch_size),
+        }
@@ -0,0 +1,127 @@
+"""Benchmark analytics-service aggregations on the columnar order-line table.
+
+Each view is timed on SalesFacts and on the equivalent Python loops over a
+list of row dicts (how the resolvers used to aggregate), for growing numbers
+of order lines.
+
+Usage:
+    python benchmarks/bench_analytics.py [--sizes 100000 1000000 5000000] [--repeat 20]
+"""
+import argparse
+import time
+from collections import defaultdict
+
+import numpy as np
+
+from harness import CATEGORIES, measure, print_table, use_service, write_results
+
+use_service("analytics-service")
+
+from facts import SalesFacts  # noqa: E402
+
+PRODUCTS = 10000
+USERS = 100000
+# The row-dict baseline is only built up to this many lines
+ROW_BASELINE_MAX = 1000000
+
+
+def build_facts(lines: int, seed: int = 42, product_count: int = PRODUCTS) -> SalesFacts:
+    rng = np.random.default_rng(seed)
+    facts = SalesFacts()
+    for product in range(product_count):
+        facts.add_product(f"prod{product}", f"Product {product}", CATEGORIES[product % len(CATEGORIES)],
+                          4.0, int(rng.integers(100, 100000)))
+    for user in range(USERS):
+        facts.add_user(f"user{user}", f"user_{user}")
+
+    orders = lines // 2
+    facts.orders.encode_many(range(orders))
+    products = rng.integers(0, product_count, lines, dtype=np.int32)
+    quantities = rng.integers(1, 4, lines, dtype=np.int32)
+    facts.lines.extend({
+        "order": rng.integers(0, orders, lines),
+        "product": products,
+        "user": rng.integers(0, USERS, lines, dtype=np.int32),
+        "category": facts.product_info.column("category")[products],
+        "quantity": quantities,
+        "revenue": quantities * rng.uniform(1, 500, lines).round(2),
+        "day": rng.integers(19358, 19358 + 365, lines, dtype=np.int32),
+    })
+    facts.rebuild_totals()
+    return facts
+
+
+def row_dicts(facts: SalesFacts) -> list:
+    columns = {name: facts.lines.column(name).tolist() for name in facts.LINE_SCHEMA}
+    return [dict(zip(columns, values)) for values in zip(*columns.values())]
+
+
+def rows_top_products(rows, limit=10):
+    revenue = defaultdict(float)
+    for row in rows:
+        revenue[row["product"]] += row["revenue"]
+    return sorted(revenue.items(), key=lambda item: item[1], reverse=True)[:limit]
+
+
+def rows_revenue_by_category(rows):
+    revenue = defaultdict(float)
+    for row in rows:
+        revenue[row["category"]] += row["revenue"]
+    return sorted(revenue.items(), key=lambda item: item[1], reverse=True)
+
+
+def scan_totals(facts: SalesFacts, start_day: int, end_day: int):
+    """Range totals by masking the line columns (before the daily rollups)"""
+    days, revenues, orders = facts.lines.columns("day", "revenue", "order")
+    where = (days >= start_day) & (days <= end_day)
+    return float(revenues[where].sum()), int(np.count_nonzero(np.bincount(orders[where], minlength=len(facts.orders))))
+
+
+def rows_user_statistics(rows, user):
+    orders = set()
+    spent = 0.0
+    for row in rows:
+        if row["user"] == user:
+            orders.add(row["order"])
+            spent += row["revenue"]
+    return len(orders), spent
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000, 5000000])
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        start = time.perf_counter()
+        facts = build_facts(size)
+        build_seconds = time.perf_counter() - start
+
+        rows = {
+            "columnar top_products(10)": measure(lambda i: facts.product_stats(10), args.repeat, warmup=1),
+            "columnar revenue_by_category": measure(lambda i: facts.revenue_by_category(), args.repeat, warmup=1),
+            "columnar user_statistics(1)": measure(
+                lambda i: facts.user_statistics([f"user{i}"]), args.repeat, warmup=1),
+            "rollup totals(quarter)": measure(lambda i: facts.totals(19358 + i % 90, 19358 + i % 90 + 90), args.repeat),
+            "rollup trend(week, year)": measure(lambda i: facts.trend("week", 19358, 19358 + 364), args.repeat),
+            "columnar scan totals(quarter)": measure(
+                lambda i: scan_totals(facts, 19358 + i % 90, 19358 + i % 90 + 90), args.repeat, warmup=1),
+        }
+        if size <= ROW_BASELINE_MAX:
+            dicts = row_dicts(facts)
+            repeat = max(args.repeat // 4, 1)
+            rows["rows top_products(10)"] = measure(lambda i: rows_top_products(dicts), repeat, warmup=0)
+            rows["rows revenue_by_category"] = measure(lambda i: rows_revenue_by_category(dicts), repeat, warmup=0)
+            rows["rows user_statistics(1)"] = measure(lambda i: rows_user_statistics(dicts, i), repeat, warmup=0)
+            del dicts
+
+        print_table(f"analytics, {size} order lines (built in {build_seconds:.2f}s)", rows)
+        results[str(size)] = {"build_seconds": round(build_seconds, 3), "operations": rows}
+
+    print(f"\nResults written to {write_results('analytics', results)}")
+
+
+if __name__ == "__main__":
+    main()
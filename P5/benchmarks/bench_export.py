@@ -0,0 +1,121 @@
+"""Benchmark the streaming NDJSON catalog export of product-service.
+
+GET /api/products/export is streamed through the ASGI app from a memory
+store filled with synthetic products: the whole catalog, the whole catalog
+gzipped, and a delta export of the products updated after a point in time.
+Each export is timed on its own (products/s and MB/s of response body) and
+then repeated under tracemalloc, whose peak shows how much memory the export
+allocated on top of the loaded store; it stays flat as the catalog grows.
+
+Usage:
+    python benchmarks/bench_export.py [--sizes 100000 1000000] [--changed 0.01]
+"""
+import argparse
+import asyncio
+import gc
+import time
+import tracemalloc
+import zlib
+from datetime import datetime, timedelta
+from urllib.parse import urlencode
+
+from harness import synthetic_products, use_service, write_results
+
+use_service("product-service")
+
+import main  # noqa: E402
+from storage import MemoryProductStore  # noqa: E402
+
+
+async def export(params: dict) -> tuple:
+    """Stream one export straight through the ASGI app; returns (lines, body bytes, seconds).
+
+    httpx's ASGI transport collects the whole body before returning it, so the
+    app is called directly and every chunk is counted and dropped as it is sent.
+    """
+    scope = {
+        "type": "http", "asgi": {"version": "3.0"}, "http_version": "1.1", "method": "GET",
+        "scheme": "http", "path": "/api/products/export", "raw_path": b"/api/products/export",
+        "query_string": urlencode(params).encode(), "root_path": "",
+        "headers": [(b"host", b"bench")], "client": ("127.0.0.1", 1), "server": ("bench", 80),
+    }
+    disconnected = asyncio.Event()
+    counts = {"lines": 0, "bytes": 0, "status": None}
+    requested = []
+    # Gzipped exports are measured as sent, and their lines counted once decompressed
+    decompressor = zlib.decompressobj(16 + zlib.MAX_WBITS) if params.get("gzip") else None
+
+    async def receive():
+        if not requested:
+            requested.append(True)
+            return {"type": "http.request", "body": b"", "more_body": False}
+        await disconnected.wait()
+        return {"type": "http.disconnect"}
+
+    async def send(message):
+        if message["type"] == "http.response.start":
+            counts["status"] = message["status"]
+        elif message["type"] == "http.response.body":
+            chunk = message.get("body", b"")
+            counts["bytes"] += len(chunk)
+            counts["lines"] += (decompressor.decompress(chunk) if decompressor else chunk).count(b"\n")
+            if not message.get("more_body"):
+                disconnected.set()
+
+    start = time.perf_counter()
+    await main.app(scope, receive, send)
+    seconds = time.perf_counter() - start
+    if counts["status"] != 200:
+        raise RuntimeError(f"export failed with {counts['status']}")
+    return counts["lines"], counts["bytes"], seconds
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000])
+    parser.add_argument("--changed", type=float, default=0.01, help="share of products in the delta export")
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        store = MemoryProductStore()
+        store.insert_many(synthetic_products(size))
+        main.products_db = store
+        # synthetic_products are created one second apart from 2024-01-01
+        since = datetime(2024, 1, 1) + timedelta(seconds=int(size * (1 - args.changed)))
+        exports = {
+            "full": {},
+            "full gzip": {"gzip": "true"},
+            f"delta ({args.changed:.0%})": {"updated_since": since.isoformat()},
+        }
+
+        rows = {}
+        print(f"\n{size} products")
+        print(f"  {'export':<20}{'products':>10}{'MB':>10}{'seconds':>10}{'products/s':>14}{'MB/s':>10}"
+              f"{'peak MB':>10}")
+        for label, params in exports.items():
+            lines, body, seconds = asyncio.run(export(params))
+            gc.collect()
+            tracemalloc.start()
+            asyncio.run(export(params))
+            peak = tracemalloc.get_traced_memory()[1]
+            tracemalloc.stop()
+            rows[label] = {
+                "products": lines,
+                "body_mb": round(body / 2 ** 20, 2),
+                "seconds": round(seconds, 3),
+                "products_per_sec": round(lines / seconds, 1),
+                "mb_per_sec": round(body / 2 ** 20 / seconds, 2),
+                "peak_mb": round(peak / 2 ** 20, 2),
+            }
+            row = rows[label]
+            print(f"  {label:<20}{lines:>10}{row['body_mb']:>10.1f}{seconds:>10.2f}"
+                  f"{row['products_per_sec']:>14.0f}{row['mb_per_sec']:>10.1f}{row['peak_mb']:>10.2f}")
+        results[str(size)] = rows
+        del store
+
+    print(f"\nResults written to {write_results('export', results)}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,67 @@
+"""Benchmark analytics-service GraphQL execution of typical dashboard queries.
+
+Compares a full execution (parse, validate and execute on every call, with
+the document cache off) with execution from the parsed-document cache, and with the resolver
+result cache on top, per query. With --lines the sample data is replaced by
+a synthetic fact table of that many order lines.
+
+Usage:
+    python benchmarks/bench_graphql.py [--repeat 2000] [--lines 1000000]
+"""
+import argparse
+
+from bench_analytics import build_facts
+from harness import measure, print_table, use_service, write_results
+
+use_service("analytics-service")
+
+import main  # noqa: E402
+
+QUERIES = {
+    "sales_reports": "query { salesReports { id period totalRevenue totalOrders averageOrderValue } }",
+    "top_products": "query { topProducts(limit: 5) { productId productName totalRevenue totalSold } }",
+    "user_statistics": 'query { userStatistics(userId: "user1") { username totalOrders totalSpent } }',
+    "aliased_users": "query { " + " ".join(
+        f'u{i}: userStatistics(userId: "user{i % 2 + 1}") {{ username totalOrders totalSpent }}' for i in range(50)
+    ) + " }",
+    "dashboard": """
+        query Dashboard {
+          salesReports { id period totalRevenue totalOrders averageOrderValue }
+          topProducts(limit: 10) { productId productName category totalSold totalRevenue conversionRate }
+          revenueByCategory { category revenue percentage }
+          userStatistics(userId: "user2") { userId username totalOrders totalSpent favoriteCategory }
+        }
+    """,
+}
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--repeat", type=int, default=2000)
+    parser.add_argument("--lines", type=int, default=0, help="synthetic order lines (0 keeps the sample data)")
+    args = parser.parse_args()
+
+    if args.lines:
+        main.sales_facts = build_facts(args.lines)
+    resolver_ttl = main.resolver_cache.ttl
+    document_cache_size = main.document_cache.max_entries
+
+    results = {}
+    rows = {}
+    for label, query in QUERIES.items():
+        main.resolver_cache.ttl = 0
+        main.document_cache.max_entries = 0
+        main.document_cache.clear()
+        rows[f"{label} uncached"] = measure(lambda i: main.execute_graphql(query, None), args.repeat)
+        main.document_cache.max_entries = document_cache_size
+        rows[f"{label} cached document"] = measure(lambda i: main.execute_graphql(query, None), args.repeat)
+        main.resolver_cache.ttl = resolver_ttl
+        rows[f"{label} cached resolvers"] = measure(lambda i: main.execute_graphql(query, None), args.repeat)
+    print_table(f"GraphQL execution, {len(main.sales_facts)} order lines", rows)
+    results[str(len(main.sales_facts))] = rows
+
+    print(f"\nResults written to {write_results('graphql', results)}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,59 @@
+"""Benchmark analytics-service order event ingestion.
+
+Random order events are applied to a synthetic fact table in batches of
+several sizes, and the per-event throughput is compared with recomputing
+every running total from the lines (what a batch recomputation after each
+batch would cost). The product, user and category views are timed too:
+they read the running totals, so they stay flat as lines accumulate.
+
+Usage:
+    python benchmarks/bench_ingestion.py [--lines 1000000] [--events 20000] [--batches 1 50 500]
+"""
+import argparse
+import random
+import time
+
+from bench_analytics import build_facts
+from harness import measure, print_table, summarize, use_service, write_results
+
+use_service("analytics-service")
+
+from ingestion import OrderIngestor, random_order  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=1000000, help="order lines before ingestion starts")
+    parser.add_argument("--events", type=int, default=20000, help="events applied per batch size")
+    parser.add_argument("--batches", type=int, nargs="+", default=[1, 50, 500])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    facts = build_facts(args.lines)
+    ingestor = OrderIngestor(lambda: facts)
+    rng = random.Random(7)
+
+    rows = {}
+    for batch_size in args.batches:
+        events = [random_order(facts, rng) for _ in range(args.events)]
+        timings = []
+        clock = time.perf_counter
+        for start in range(0, len(events), batch_size):
+            batch = events[start:start + batch_size]
+            began = clock()
+            ingestor.apply(batch)
+            timings.append((clock() - began) / len(batch))
+        rows[f"apply, batches of {batch_size} (per event)"] = summarize(timings)
+
+    rows["rebuild_totals (full recompute)"] = measure(lambda i: facts.rebuild_totals(), 5, warmup=1)
+    rows["top_products(10)"] = measure(lambda i: facts.product_stats(10), args.repeat)
+    rows["revenue_by_category"] = measure(lambda i: facts.revenue_by_category(), args.repeat)
+    rows["user_statistics(1)"] = measure(lambda i: facts.user_statistics([f"user{i}"]), args.repeat)
+
+    print_table(f"ingestion, {args.lines} initial order lines", rows)
+    print(f"\nIngestion stats: {ingestor.stats}")
+    print(f"Results written to {write_results('ingestion', {str(args.lines): rows})}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,90 @@
+"""Measure product-service memory per product: plain dicts vs compact records.
+
+The same synthetic catalog is held once as the dicts the memory store used
+to keep (datetime timestamps, and a category string per product, as
+decoded from each request body) and once as ProductRecords (slots, interned
+categories, integer timestamps). Bytes per product are the memory still
+allocated after building each, measured with tracemalloc; the full
+MemoryProductStore, records plus its secondary indexes, is measured too.
+
+Usage:
+    python benchmarks/bench_memory.py [--sizes 100000 1000000]
+
+tracemalloc slows allocation down a lot; a million products takes minutes.
+"""
+import argparse
+import gc
+import tracemalloc
+from typing import Callable, Iterator
+
+from harness import synthetic_products, use_service, write_results
+
+use_service("product-service")
+
+from records import ProductRecord  # noqa: E402
+from storage import MemoryProductStore  # noqa: E402
+
+
+def decoded_products(size: int) -> Iterator[dict]:
+    """Synthetic products whose category strings are separate objects, as JSON decoding makes them"""
+    for product in synthetic_products(size):
+        product["category"] = product["category"].encode().decode()
+        yield product
+
+
+def retained_bytes(build: Callable[[], object]) -> tuple:
+    """Bytes still allocated once build() returns, and what it built"""
+    gc.collect()
+    tracemalloc.start()
+    before = tracemalloc.get_traced_memory()[0]
+    built = build()
+    gc.collect()
+    after = tracemalloc.get_traced_memory()[0]
+    tracemalloc.stop()
+    return after - before, built
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000])
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        rows = {}
+        layouts = {
+            "dicts (before)": lambda: {product["id"]: product for product in decoded_products(size)},
+            "records (after)": lambda: {
+                product["id"]: ProductRecord.from_dict(product) for product in decoded_products(size)
+            },
+        }
+        for label, build in layouts.items():
+            total, built = retained_bytes(build)
+            rows[label] = {"bytes_per_product": round(total / size, 1), "total_mb": round(total / 2 ** 20, 1)}
+            del built
+
+        def build_store():
+            store = MemoryProductStore()
+            store.insert_many(decoded_products(size))
+            return store
+
+        total, store = retained_bytes(build_store)
+        rows["MemoryProductStore (records + indexes)"] = {
+            "bytes_per_product": round(total / size, 1), "total_mb": round(total / 2 ** 20, 1)
+        }
+        del store
+
+        before = rows["dicts (before)"]["bytes_per_product"]
+        after = rows["records (after)"]["bytes_per_product"]
+        print(f"\n{size} products")
+        print(f"  {'layout':<42}{'bytes/product':>16}{'total MB':>12}")
+        for label, row in rows.items():
+            print(f"  {label:<42}{row['bytes_per_product']:>16.1f}{row['total_mb']:>12.1f}")
+        print(f"  records use {after / before:.0%} of the dicts' memory ({before - after:.0f} bytes saved per product)")
+        results[str(size)] = rows
+
+    print(f"\nResults written to {write_results('memory', results)}")
+
+
+if __name__ == "__main__":
+    main()
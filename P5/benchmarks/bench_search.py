@@ -0,0 +1,53 @@
+"""Benchmark the product-service full-text search index.
+
+Usage:
+    python benchmarks/bench_search.py [--sizes 10000 100000 500000] [--repeat 200]
+"""
+import argparse
+import time
+
+from harness import measure, print_table, synthetic_products, use_service, write_results
+
+use_service("product-service")
+
+from search import SearchIndex  # noqa: E402
+
+QUERIES = {
+    "single_selective": "logitech",
+    "single_common": "wireless",
+    "two_terms": "sony headphones",
+    "three_terms": "premium gaming mouse",
+    "prefix": "ergo",
+    "prefix_two_terms": "canon cam",
+    "no_match": "submarine",
+}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 500000])
+    parser.add_argument("--repeat", type=int, default=200)
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        index = SearchIndex()
+        start = time.perf_counter()
+        index.build(synthetic_products(size))
+        build_seconds = time.perf_counter() - start
+
+        rows = {
+            label: measure(lambda i, query=query: index.search(query, 20), args.repeat, warmup=2)
+            for label, query in QUERIES.items()
+        }
+        products = list(synthetic_products(args.repeat, seed=size + 1))
+        rows["incremental_add"] = measure(lambda i: index.add(products[i]), args.repeat, warmup=0)
+
+        print_table(f"search, {size} products (built in {build_seconds:.2f}s)", rows)
+        results[str(size)] = {"build_seconds": round(build_seconds, 3), "operations": rows}
+
+    print(f"\nResults written to {write_results('search', results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,82 @@
+"""Benchmark product list serialization: the Product model vs orjson vs cached fragments.
+
+A page of `limit` products, read from the memory store as the list endpoint
+reads them, is serialized the ways JSON_SERIALIZER selects:
+
+    model          validate through List[Product], then dump (the previous path)
+    orjson         orjson over the stored product dicts
+    cached (cold)  orjson, storing every product's bytes (fragment cache empty)
+    cached (warm)  the same page again, every fragment reused
+
+Every mode's body decodes to the same JSON as the model's; that is checked
+before timing.
+
+Usage:
+    python benchmarks/bench_serialization.py [--limits 100 1000] [--catalog 100000] [--repeat 500]
+"""
+import argparse
+import json
+import random
+
+from harness import measure, print_table, synthetic_products, use_service, write_results
+
+use_service("product-service")
+
+from main import product_list_adapter  # noqa: E402
+from serialization import ProductEncoder  # noqa: E402
+from storage import MemoryProductStore  # noqa: E402
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--limits", type=int, nargs="+", default=[100, 1000])
+    parser.add_argument("--catalog", type=int, default=100000, help="products in the store")
+    parser.add_argument("--repeat", type=int, default=500)
+    args = parser.parse_args()
+
+    store = MemoryProductStore()
+    store.insert_many(synthetic_products(args.catalog))
+    rng = random.Random(7)
+
+    results = {}
+    for limit in args.limits:
+        pages = [store.page(rng.randrange(args.catalog - limit), limit) for _ in range(32)]
+        encoder = ProductEncoder(max_entries=args.catalog)
+
+        def model(i):
+            products = pages[i % len(pages)]
+            return product_list_adapter.dump_json(product_list_adapter.validate_python(products))
+
+        expected = json.loads(model(0))
+        for mode in ("orjson", "cached"):
+            assert json.loads(encoder.encode_list(pages[0], mode)) == expected, mode
+        encoder.clear()
+
+        cold_pages = [store.page(start, limit) for start in range(0, args.catalog - limit, limit)]
+
+        def cold(i):
+            if not i % len(cold_pages):
+                encoder.clear()
+            return encoder.encode_list(cold_pages[i % len(cold_pages)], "cached")
+
+        rows = {
+            "model": measure(model, args.repeat),
+            "orjson": measure(lambda i: encoder.encode_list(pages[i % len(pages)], "orjson"), args.repeat),
+            "cached (cold)": measure(cold, args.repeat, warmup=0),
+        }
+        encoder.clear()
+        for page in pages:
+            encoder.encode_list(page, "cached")
+        rows["cached (warm)"] = measure(lambda i: encoder.encode_list(pages[i % len(pages)], "cached"), args.repeat)
+
+        print_table(f"{limit} products per page ({args.catalog} in the store)", rows)
+        base = rows["model"]["mean_us"]
+        for label in ("orjson", "cached (warm)"):
+            print(f"  {label}: {base / rows[label]['mean_us']:.1f}x faster than model")
+        results[str(limit)] = rows
+
+    print(f"\nResults written to {write_results('serialization', results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,225 @@
+"""Benchmark how fast a fresh replica serves when it starts from a snapshot.
+
+For every size, a snapshot is written and a new service process is started
+on it (`python main.py` with PRODUCT_SNAPSHOT_PATH / ANALYTICS_SNAPSHOT_PATH).
+Timed from the moment the process is spawned, interpreter and imports
+included:
+
+    health        first answer from /health
+    first query   first answer to a real read (a product and a list page, or
+                  the dashboard GraphQL query), checked against the data
+    writes        product-service only: the snapshot is loaded into the
+                  memory store and writes are accepted (reads are served
+                  from the memory-mapped snapshot until then)
+    ready         product-service only: the search index is built too
+
+The same service started without a snapshot (seeding its sample data) gives
+the process's own startup cost, and rebuilding the same data in memory the
+way a replica without a snapshot would have to (bulk insert plus search
+index, or building the fact table) is timed in this process for comparison.
+The phases the service reports in startup_duration_seconds are included.
+
+Both services have a `main` and a `snapshots` module, so one run covers one
+service.
+
+Usage:
+    python benchmarks/bench_startup.py products [--sizes 100000 1000000] [--no-wait]
+    python benchmarks/bench_startup.py analytics [--sizes 100000 1000000]
+"""
+import argparse
+import os
+import random
+import re
+import shutil
+import subprocess
+import sys
+import tempfile
+import time
+
+import httpx
+
+from harness import P5_DIR, synthetic_products, use_service, write_results
+from load_graphql import free_port
+
+DASHBOARD_QUERY = """{
+  topProducts(limit: 10) { productId totalRevenue }
+  salesTrend(granularity: "month") { startDate totalRevenue }
+  revenueByCategory { category revenue }
+}"""
+METRIC_LINE = re.compile(r'^startup_duration_seconds\{phase="(\w+)"\} (\S+)$', re.MULTILINE)
+
+
+def spawn(service: str, env: dict) -> tuple:
+    """Start `python main.py` of a service; returns the process, its URL and when it was spawned"""
+    port = free_port()
+    env = dict(os.environ, HOST="127.0.0.1", PORT=str(port), ENVIRONMENT="benchmark",
+               SNAPSHOT_ON_SHUTDOWN="false", **env)
+    spawned = time.perf_counter()
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=os.path.join(P5_DIR, service), env=env,
+                               stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    return process, f"http://127.0.0.1:{port}", spawned
+
+
+def wait_until(check, timeout: float = 600) -> None:
+    deadline = time.monotonic() + timeout
+    while time.monotonic() < deadline:
+        try:
+            if check():
+                return
+        except httpx.HTTPError:
+            pass
+        time.sleep(0.005)
+    raise RuntimeError("service did not get there in time")
+
+
+def startup_phases(url: str) -> dict:
+    text = httpx.get(f"{url}/metrics").text
+    return {phase: round(float(seconds), 4) for phase, seconds in METRIC_LINE.findall(text)}
+
+
+def boot_seconds(service: str) -> float:
+    """Time to a /health answer without a snapshot (the sample data is seeded)"""
+    process, url, spawned = spawn(service, {})
+    try:
+        wait_until(lambda: httpx.get(f"{url}/health", timeout=1).status_code == 200)
+        return time.perf_counter() - spawned
+    finally:
+        process.terminate()
+        process.wait()
+
+
+def run_products(sizes, wait: bool) -> dict:
+    use_service("product-service")
+    from search import SearchIndex
+    from snapshots import write_snapshot
+    from storage import MemoryProductStore
+
+    results = {}
+    boot = boot_seconds("product-service")
+    print(f"🚀 product-service without a snapshot answers /health after {boot:.2f}s")
+    for size in sizes:
+        products = list(synthetic_products(size))
+        started = time.perf_counter()
+        store = MemoryProductStore()
+        store.insert_many(products)
+        insert_seconds = time.perf_counter() - started
+        SearchIndex().build(store.scan())
+        rebuild_seconds = time.perf_counter() - started
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "products.snapshot")
+        started = time.perf_counter()
+        write_snapshot(store, path)
+        write_seconds = time.perf_counter() - started
+        snapshot_mb = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2 ** 20
+        sample = random.Random(size).choice(products)
+        expected = store.get(sample["id"])
+        del store, products
+
+        process, url, spawned = spawn("product-service", {"PRODUCT_STORE": "memory", "PRODUCT_SNAPSHOT_PATH": path})
+        try:
+            wait_until(lambda: httpx.get(f"{url}/health", timeout=1).status_code == 200)
+            health = time.perf_counter() - spawned
+            product = httpx.get(f"{url}/api/products/{sample['id']}").json()
+            page = httpx.get(f"{url}/api/products", params={"skip": size // 2, "limit": 20}).json()
+            first_query = time.perf_counter() - spawned
+            if product["name"] != expected["name"] or len(page) != 20:
+                raise RuntimeError("the restored service answered with the wrong data")
+            row = {"health_seconds": round(health, 3), "first_query_seconds": round(first_query, 3)}
+            if wait:
+                wait_until(lambda: "hydrate" in startup_phases(url))
+                row["writes_seconds"] = round(time.perf_counter() - spawned, 2)
+                wait_until(lambda: "search_index" in startup_phases(url))
+                row["ready_seconds"] = round(time.perf_counter() - spawned, 2)
+            row["phases"] = startup_phases(url)
+        finally:
+            process.terminate()
+            process.wait()
+
+        row.update({
+            "boot_seconds": round(boot, 3),
+            "rebuild_insert_seconds": round(insert_seconds, 2),
+            "rebuild_seconds": round(rebuild_seconds, 2),
+            "snapshot_write_seconds": round(write_seconds, 2),
+            "snapshot_mb": round(snapshot_mb, 1),
+        })
+        results[str(size)] = row
+        print(f"\n{size} products (snapshot {snapshot_mb:.0f} MB, written in {write_seconds:.1f}s)")
+        print(f"  rebuilt in memory:   {insert_seconds:.1f}s insert, {rebuild_seconds:.1f}s with the search index")
+        print(f"  from the snapshot:   health {health:.2f}s, first query {first_query:.2f}s"
+              + (f", writes {row['writes_seconds']:.1f}s, ready {row['ready_seconds']:.1f}s" if wait else ""))
+        print(f"  reported phases:     {row['phases']}")
+        shutil.rmtree(directory)
+    return results
+
+
+def run_analytics(sizes) -> dict:
+    use_service("analytics-service")
+    from bench_analytics import build_facts
+    from snapshots import write_snapshot
+
+    results = {}
+    boot = boot_seconds("analytics-service")
+    print(f"🚀 analytics-service without a snapshot answers /health after {boot:.2f}s")
+    for lines in sizes:
+        started = time.perf_counter()
+        facts = build_facts(lines)
+        build_seconds = time.perf_counter() - started
+        expected = facts.product_stats(10)[0]
+
+        directory = tempfile.mkdtemp()
+        path = os.path.join(directory, "analytics.snapshot")
+        started = time.perf_counter()
+        write_snapshot(facts.state(), [], path)
+        write_seconds = time.perf_counter() - started
+        snapshot_mb = sum(os.path.getsize(os.path.join(path, name)) for name in os.listdir(path)) / 2 ** 20
+        del facts
+
+        process, url, spawned = spawn("analytics-service", {"ANALYTICS_SNAPSHOT_PATH": path})
+        try:
+            wait_until(lambda: httpx.get(f"{url}/health", timeout=1).status_code == 200)
+            health = time.perf_counter() - spawned
+            data = httpx.post(f"{url}/graphql", json={"query": DASHBOARD_QUERY}, timeout=60).json()["data"]
+            first_query = time.perf_counter() - spawned
+            if data["topProducts"][0]["productId"] != expected["product_id"]:
+                raise RuntimeError("the restored service answered with the wrong data")
+            phases = startup_phases(url)
+        finally:
+            process.terminate()
+            process.wait()
+
+        results[str(lines)] = {
+            "health_seconds": round(health, 3),
+            "first_query_seconds": round(first_query, 3),
+            "phases": phases,
+            "boot_seconds": round(boot, 3),
+            "rebuild_seconds": round(build_seconds, 2),
+            "snapshot_write_seconds": round(write_seconds, 2),
+            "snapshot_mb": round(snapshot_mb, 1),
+        }
+        print(f"\n{lines} order lines (snapshot {snapshot_mb:.0f} MB, written in {write_seconds:.1f}s)")
+        print(f"  rebuilt in memory:   {build_seconds:.1f}s")
+        print(f"  from the snapshot:   health {health:.2f}s, first query {first_query:.2f}s")
+        print(f"  reported phases:     {phases}")
+        shutil.rmtree(directory)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("service", choices=["products", "analytics"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[100000, 1000000],
+                        help="products, or order lines (analytics)")
+    parser.add_argument("--no-wait", action="store_true",
+                        help="do not wait for the snapshot to finish loading (products)")
+    args = parser.parse_args()
+
+    if args.service == "products":
+        results = run_products(args.sizes, wait=not args.no_wait)
+    else:
+        results = run_analytics(args.sizes)
+    print(f"\nResults written to {write_results(f'startup_{args.service}', results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,68 @@
+"""Compare the product-service storage backends (memory vs SQLite).
+
+Usage:
+    python benchmarks/bench_storage.py [--sizes 10000 100000] [--repeat 2000]
+"""
+import argparse
+import os
+import random
+import tempfile
+
+from harness import measure, print_table, synthetic_products, use_service, write_results
+
+use_service("product-service")
+
+from storage import MemoryProductStore, SQLiteProductStore  # noqa: E402
+
+
+def bench_store(store, size: int, repeat: int) -> dict:
+    products = list(synthetic_products(size))
+    store.insert_many(products)
+
+    rng = random.Random(7)
+    ids = [rng.choice(products)["id"] for _ in range(repeat)]
+    deep_skip = max(size - 200, 0)
+    _, deep_cursor = store.page_after(None, deep_skip) if deep_skip else (None, None)
+
+    extra = list(synthetic_products(repeat, seed=size + 1))
+
+    def update(i):
+        store.update(ids[i], {"price": 10.0 + i % 90})
+
+    return {
+        "get_by_id": measure(lambda i: store.get(ids[i]), repeat),
+        "page_first_100": measure(lambda i: store.page(0, 100), repeat // 10 or 1),
+        "page_deep_100": measure(lambda i: store.page(deep_skip, 100), repeat // 10 or 1),
+        "page_category_100": measure(lambda i: store.page(0, 100, "Books"), repeat // 10 or 1),
+        "cursor_deep_100": measure(lambda i: store.page_after(deep_cursor, 100), repeat // 10 or 1),
+        "insert": measure(lambda i: store.insert(extra[i]), repeat, warmup=0),
+        "update": measure(update, repeat),
+        "adjust_stock": measure(lambda i: store.adjust_stock(ids[i], 1), repeat),
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000])
+    parser.add_argument("--repeat", type=int, default=2000)
+    args = parser.parse_args()
+
+    results = {}
+    for size in args.sizes:
+        memory = MemoryProductStore()
+        results[f"memory/{size}"] = bench_store(memory, size, args.repeat)
+        print_table(f"memory backend, {size} products", results[f"memory/{size}"])
+
+        with tempfile.TemporaryDirectory() as tmp:
+            sqlite = SQLiteProductStore(os.path.join(tmp, "bench.db"))
+            try:
+                results[f"sqlite/{size}"] = bench_store(sqlite, size, args.repeat)
+            finally:
+                sqlite.close()
+        print_table(f"sqlite backend, {size} products", results[f"sqlite/{size}"])
+
+    print(f"\nResults written to {write_results('storage', results)}")
+
+
+if __name__ == "__main__":
+    main()
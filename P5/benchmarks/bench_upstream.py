@@ -0,0 +1,115 @@
+"""Benchmark analytics-service upstream fetches against local stub services.
+
+A stub of the user and product services runs in a background thread with a
+fixed response latency and counts the requests it gets. A GraphQL query
+then asks for the profile of N users and the catalog entry of N products,
+once with DataLoader batching (UPSTREAM_BATCH_SIZE=100) and once with one
+upstream request per key (UPSTREAM_BATCH_SIZE=1), and the latency and
+upstream request count per query are reported.
+
+Usage:
+    python benchmarks/bench_upstream.py [--keys 200] [--latency-ms 5] [--repeat 20]
+"""
+import argparse
+import asyncio
+import os
+import threading
+import time
+
+import uvicorn
+from fastapi import FastAPI
+
+from harness import print_table, summarize, use_service, write_results
+from load_graphql import free_port
+
+QUERY = """
+query Enriched($limit: Int) {
+  allUserStatistics { userId totalSpent profile { email role } }
+  topProducts(limit: $limit) { productId totalRevenue catalog { price stock } }
+}
+"""
+
+
+def stub_services(keys: int, latency: float) -> tuple:
+    """A user-service and product-service stand-in, plus its request counter"""
+    app = FastAPI()
+    requests = {"count": 0}
+    users = {f"user{i}": {"id": f"user{i}", "email": f"user{i}@example.com", "name": f"User {i}",
+                          "role": "customer", "createdAt": "2024-01-01T00:00:00"} for i in range(keys)}
+    products = {f"prod{i}": {"id": f"prod{i}", "name": f"Product {i}", "description": "", "price": 10.0 + i,
+                             "category": "Electronics", "stock": i, "created_at": "2024-01-01T00:00:00",
+                             "updated_at": "2024-01-01T00:00:00"} for i in range(keys)}
+
+    @app.get("/api/users")
+    async def get_users(ids: str = ""):
+        requests["count"] += 1
+        await asyncio.sleep(latency)
+        found = [users[user_id] for user_id in ids.split(",") if user_id in users]
+        return {"success": True, "count": len(found), "data": found}
+
+    @app.get("/api/products/batch")
+    async def get_products(ids: str):
+        requests["count"] += 1
+        await asyncio.sleep(latency)
+        return [products[product_id] for product_id in ids.split(",") if product_id in products]
+
+    return app, requests
+
+
+def start_stub(app: FastAPI) -> str:
+    port = free_port()
+    server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+    threading.Thread(target=server.run, daemon=True).start()
+    while not server.started:
+        time.sleep(0.05)
+    return f"http://127.0.0.1:{port}"
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--keys", type=int, default=200, help="users and products asked for per query")
+    parser.add_argument("--latency-ms", type=float, default=5, help="stub response latency")
+    parser.add_argument("--repeat", type=int, default=20)
+    args = parser.parse_args()
+
+    stub, requests = stub_services(args.keys, args.latency_ms / 1000)
+    url = start_stub(stub)
+    # The query fans out to every key on purpose: lift the cost budget and throttling
+    os.environ.update(USER_SERVICE_URL=url, PRODUCT_SERVICE_URL=url, GRAPHQL_MAX_COST="1000000", GRAPHQL_COST_RATE="0")
+    use_service("analytics-service")
+    from fastapi.testclient import TestClient
+    import main
+
+    for i in range(args.keys):
+        main.sales_facts.add_user(f"user{i}", f"user_{i}")
+        main.sales_facts.add_product(f"prod{i}", f"Product {i}", "Electronics")
+    main.sales_facts.record_many(
+        {"order_id": f"bench{i}", "user_id": f"user{i}", "product_id": f"prod{i}", "quantity": 1,
+         "revenue": 10.0 + i, "day": 19358}
+        for i in range(args.keys)
+    )
+    body = {"query": QUERY, "variables": {"limit": args.keys}}
+
+    rows = {}
+    with TestClient(main.app) as client:
+        for label, batch_size in (("batched", 100), ("one request per key", 1)):
+            main.upstream_clients.max_batch_size = batch_size
+            timings = []
+            counts = []
+            for _ in range(args.repeat):
+                before = requests["count"]
+                start = time.perf_counter()
+                payload = client.post("/graphql", json=body).json()
+                timings.append(time.perf_counter() - start)
+                counts.append(requests["count"] - before)
+                if "errors" in payload:
+                    raise RuntimeError(payload["errors"][0])
+            rows[label] = {**summarize(timings), "upstream_requests": max(counts)}
+            print(f"{label}: {max(counts)} upstream requests per query")
+
+    print_table(f"{args.keys} users + {args.keys} products, {args.latency_ms:g} ms upstream latency", rows)
+    print(f"\nResults written to {write_results('upstream', rows)}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,129 @@
+"""Shared helpers for the P5 benchmark scripts.
+
+Each script benchmarks one service in its own process (both Python services
+have a `main` module, so they cannot be imported side by side) and writes its
+results as JSON under benchmarks/results/ so runs can be compared.
+"""
+import json
+import os
+import platform
+import random
+import sys
+import time
+import uuid
+from datetime import datetime, timedelta
+from typing import Callable, Dict, Iterator, List
+
+BENCH_DIR = os.path.dirname(os.path.abspath(__file__))
+P5_DIR = os.path.dirname(BENCH_DIR)
+RESULTS_DIR = os.path.join(BENCH_DIR, "results")
+
+CATEGORIES = [
+    "Electronics", "Footwear", "Home Appliances", "Books", "Sports",
+    "Fashion", "Gaming", "Audio", "Toys", "Garden",
+]
+
+BRANDS = [
+    "Acme", "Dell", "Apple", "Samsung", "Nike", "Sony", "Logitech", "Bosch",
+    "Philips", "Lenovo", "Adidas", "Canon", "Razer", "Xiaomi", "Asus", "Puma",
+]
+
+NOUNS = [
+    "laptop", "phone", "headphones", "mouse", "keyboard", "monitor", "camera",
+    "speaker", "shoes", "jacket", "backpack", "blender", "kettle", "drill",
+    "lamp", "watch", "tablet", "router", "charger", "controller", "novel",
+    "racket", "helmet", "bicycle", "tent", "mug", "chair", "desk", "guitar",
+]
+
+ADJECTIVES = [
+    "wireless", "portable", "compact", "ergonomic", "premium", "smart",
+    "waterproof", "lightweight", "professional", "gaming", "vintage",
+    "rechargeable", "foldable", "ultra", "classic", "digital", "mechanical",
+]
+
+
+def use_service(name: str):
+    """Make a service directory importable (its main.py and sibling modules)"""
+    path = os.path.join(P5_DIR, name)
+    if path not in sys.path:
+        sys.path.insert(0, path)
+
+
+def synthetic_products(count: int, seed: int = 42) -> Iterator[dict]:
+    """Deterministic product records shaped like product-service's products_db"""
+    rng = random.Random(seed)
+    base = datetime(2024, 1, 1)
+    for i in range(count):
+        created = base + timedelta(seconds=i)
+        noun = rng.choice(NOUNS)
+        yield {
+            "id": str(uuid.UUID(int=rng.getrandbits(128), version=4)),
+            "name": f"{rng.choice(BRANDS)} {rng.choice(ADJECTIVES)} {noun} {i % 1000}",
+            "description": f"{rng.choice(ADJECTIVES).capitalize()} {rng.choice(ADJECTIVES)} {noun} "
+                           f"with {rng.choice(ADJECTIVES)} {rng.choice(NOUNS)} support",
+            "price": round(rng.uniform(1, 2000), 2),
+            "category": CATEGORIES[i % len(CATEGORIES)],
+            "stock": rng.randint(0, 500),
+            "created_at": created,
+            "updated_at": created,
+        }
+
+
+def percentile(sorted_values: List[float], q: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(q / 100 * (len(sorted_values) - 1))))
+    return sorted_values[index]
+
+
+def summarize(timings: List[float]) -> Dict[str, float]:
+    """Latency summary in microseconds for a list of per-call timings in seconds"""
+    ordered = sorted(timings)
+    total = sum(ordered)
+    return {
+        "calls": len(ordered),
+        "mean_us": round(total / len(ordered) * 1e6, 3) if ordered else 0.0,
+        "p50_us": round(percentile(ordered, 50) * 1e6, 3),
+        "p99_us": round(percentile(ordered, 99) * 1e6, 3),
+        "ops_per_sec": round(len(ordered) / total, 1) if total else 0.0,
+    }
+
+
+def measure(fn: Callable[[int], object], repeat: int = 1000, warmup: int = 10) -> Dict[str, float]:
+    """Time `fn(i)` for i in range(repeat) after a short warmup"""
+    for i in range(warmup):
+        fn(i)
+
+    timings = []
+    clock = time.perf_counter
+    for i in range(repeat):
+        start = clock()
+        fn(i)
+        timings.append(clock() - start)
+    return summarize(timings)
+
+
+def write_results(name: str, results: dict) -> str:
+    """Write results plus run metadata to benchmarks/results/<name>.json"""
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{name}.json")
+    payload = {
+        "benchmark": name,
+        "generated_at": datetime.now().isoformat(),
+        "python": platform.python_version(),
+        "platform": platform.platform(),
+        "results": results,
+    }
+    with open(path, "w") as handle:
+        json.dump(payload, handle, indent=2)
+    return path
+
+
+def print_table(title: str, rows: Dict[str, Dict[str, float]]):
+    print(f"\n{title}")
+    print(f"  {'operation':<32}{'mean µs':>12}{'p50 µs':>12}{'p99 µs':>12}{'ops/s':>14}")
+    for label, stats in rows.items():
+        print(
+            f"  {label:<32}{stats['mean_us']:>12.2f}{stats['p50_us']:>12.2f}"
+            f"{stats['p99_us']:>12.2f}{stats['ops_per_sec']:>14.0f}"
+        )
@@ -0,0 +1,264 @@
+"""In-process ASGI load tests of the product CRUD routes and analytics GraphQL queries.
+
+The service's FastAPI app is driven through httpx's ASGI transport, with no
+server or sockets in the way. For every catalog size, each route or query is
+first sent by a single client (per-request handler latency), then concurrent
+clients send a weighted mix of them for a fixed time (p50/p99 latency and
+requests per second). Middleware, validation and serialization are all
+included; network and uvicorn overhead are not, see load_graphql.py for that.
+
+Both services have a `main` module, so one run covers one service:
+
+    products  the memory store is filled with synthetic products; the mix is
+              get, list, create, update and delete. The search index is not
+              built (bench_search.py covers it).
+    graphql   a synthetic fact table with that many products; the mix is the
+              dashboard queries. Cost throttling is off, and --uncached turns
+              the resolver cache off too.
+
+Usage:
+    python benchmarks/load_asgi.py products [--sizes 10000 100000 1000000] [--clients 16] [--seconds 10]
+    python benchmarks/load_asgi.py graphql [--sizes 10000 100000 1000000] [--lines 1000000] [--uncached]
+"""
+import argparse
+import asyncio
+import os
+import random
+import time
+from collections import defaultdict
+from typing import Callable, Dict, List, Optional, Tuple
+
+import httpx
+
+from harness import (
+    CATEGORIES, percentile, print_table, summarize, synthetic_products, use_service, write_results
+)
+from load_graphql import print_load
+
+# (label, method, url, json body)
+Request = Tuple[str, str, str, object]
+# Picks the next request of a mix
+Scenario = Callable[[random.Random], Request]
+# Sees every response, by request label
+Observer = Callable[[str, httpx.Response], None]
+
+PRODUCT_MIX = {"get": 50, "list": 20, "update": 15, "create": 10, "delete": 5}
+
+GRAPHQL_QUERIES = {
+    "dashboard": """
+        query Dashboard {
+          salesReports { id period totalRevenue totalOrders averageOrderValue }
+          topProducts(limit: 10) { productId productName category totalSold totalRevenue conversionRate }
+          revenueByCategory { category revenue percentage }
+          userStatistics(userId: "user2") { userId username totalOrders totalSpent favoriteCategory }
+        }
+    """,
+    "top_products": "query { topProducts(limit: 50) { productId productName totalRevenue totalSold } }",
+    "user_statistics": 'query ($id: String!) { userStatistics(userId: $id) { username totalOrders totalSpent } }',
+    "sales_trend": 'query { salesTrend(granularity: "week") { startDate totalRevenue totalOrders } }',
+    "sales_report_range": 'query { salesReport(startDate: "2023-03-01", endDate: "2023-05-31") '
+                          '{ totalRevenue totalOrders } }',
+}
+GRAPHQL_MIX = {"dashboard": 30, "top_products": 20, "user_statistics": 30, "sales_trend": 10, "sales_report_range": 10}
+
+
+def weighted(mix: Dict[str, int]) -> List[str]:
+    return [label for label, weight in mix.items() for _ in range(weight)]
+
+
+def new_product(rng: random.Random) -> dict:
+    return {
+        "name": f"Load test product {rng.getrandbits(32)}",
+        "description": "Created by load_asgi.py",
+        "price": round(rng.uniform(1, 2000), 2),
+        "category": rng.choice(CATEGORIES),
+        "stock": rng.randint(0, 500),
+    }
+
+
+async def send(client: httpx.AsyncClient, request: Request) -> httpx.Response:
+    _, method, url, body = request
+    response = await client.request(method, url, json=body)
+    if response.status_code >= 400:
+        raise RuntimeError(f"{method} {url} failed with {response.status_code}: {response.text[:200]}")
+    return response
+
+
+async def sequential(client: httpx.AsyncClient, scenarios: Dict[str, Scenario], repeat: int,
+                     observe: Optional[Observer] = None) -> dict:
+    """Per-request latency of each route with a single client"""
+    rows = {}
+    rng = random.Random(1)
+    clock = time.perf_counter
+    for label, scenario in scenarios.items():
+        timings = []
+        for _ in range(repeat):
+            request = scenario(rng)
+            start = clock()
+            response = await send(client, request)
+            timings.append(clock() - start)
+            if observe is not None:
+                observe(request[0], response)
+        rows[label] = summarize(timings)
+    return rows
+
+
+async def concurrent(client: httpx.AsyncClient, scenarios: Dict[str, Scenario], mix: Dict[str, int],
+                     clients: int, seconds: float, observe: Optional[Observer] = None) -> dict:
+    """Latency and throughput of a weighted mix of requests from concurrent clients"""
+    labels = weighted(mix)
+    timings = defaultdict(list)
+    clock = time.perf_counter
+
+    async def client_loop(seed: int, deadline: float):
+        rng = random.Random(seed)
+        while clock() < deadline:
+            request = scenarios[rng.choice(labels)](rng)
+            start = clock()
+            response = await send(client, request)
+            timings[request[0]].append(clock() - start)
+            if observe is not None:
+                observe(request[0], response)
+
+    start = clock()
+    await asyncio.gather(*(client_loop(seed, start + seconds) for seed in range(clients)))
+    elapsed = clock() - start
+
+    kinds = {}
+    for label, values in sorted(timings.items()):
+        values.sort()
+        kinds[label] = {
+            "requests": len(values),
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(percentile(values, 50) * 1e3, 2),
+            "p99_ms": round(percentile(values, 99) * 1e3, 2),
+        }
+    total = sum(len(values) for values in timings.values())
+    return {"requests_per_sec": round(total / elapsed, 1), "kinds": kinds}
+
+
+def product_scenarios(main, size: int) -> Tuple[Dict[str, Scenario], Observer]:
+    """Fill the product store with `size` synthetic products; returns the CRUD requests
+    and an observer collecting the products they create, for deletes to remove"""
+    from storage import MemoryProductStore
+
+    store = MemoryProductStore()
+    products = list(synthetic_products(size))
+    store.insert_many(products)
+    # Swap the store in, wired to the same caches the service's own store feeds
+    store.subscribe(main.response_cache.on_product_change)
+    store.subscribe(main.sync_search_index)
+    store.subscribe(main.product_encoder.on_product_change)
+    main.products_db = store
+    main.reservation_manager.store = store
+    main.response_cache.clear()
+    main.product_encoder.clear()
+
+    ids = [product["id"] for product in products]
+    created: List[str] = []
+
+    def get(rng):
+        return "get", "GET", f"/api/products/{rng.choice(ids)}", None
+
+    def list_page(rng):
+        skip = rng.randrange(max(size - 100, 1))
+        return "list", "GET", f"/api/products?skip={skip}&limit=100", None
+
+    def update(rng):
+        return "update", "PUT", f"/api/products/{rng.choice(ids)}", {"price": round(rng.uniform(1, 2000), 2)}
+
+    def create(rng):
+        return "create", "POST", "/api/products", new_product(rng)
+
+    def delete(rng):
+        # Products created by the run are deleted, so the catalog keeps its size
+        if not created:
+            return create(rng)
+        return "delete", "DELETE", f"/api/products/{created.pop()}", None
+
+    def observe(label, response):
+        if label == "create":
+            created.append(response.json()["id"])
+
+    # Creates come before deletes, so a single client has something to delete
+    return {"get": get, "list": list_page, "update": update, "create": create, "delete": delete}, observe
+
+
+def graphql_scenarios() -> Dict[str, Scenario]:
+    from bench_analytics import USERS
+
+    def query(label: str) -> Scenario:
+        def scenario(rng):
+            variables = {"id": f"user{rng.randrange(USERS)}"} if label == "user_statistics" else None
+            return label, "POST", "/graphql", {"query": GRAPHQL_QUERIES[label], "variables": variables}
+        return scenario
+
+    return {label: query(label) for label in GRAPHQL_QUERIES}
+
+
+async def run_products(args) -> dict:
+    use_service("product-service")
+    import main
+
+    results = {}
+    for size in args.sizes:
+        start = time.perf_counter()
+        scenarios, observe = product_scenarios(main, size)
+        load_seconds = time.perf_counter() - start
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+            rows = await sequential(client, scenarios, args.repeat, observe)
+            load = await concurrent(client, scenarios, PRODUCT_MIX, args.clients, args.seconds, observe)
+
+        print_table(f"products, {size} in the catalog (loaded in {load_seconds:.1f}s), one client", rows)
+        print_load(f"products, {size} in the catalog, {args.clients} clients", load)
+        results[str(size)] = {"load_seconds": round(load_seconds, 2), "sequential": rows, "concurrent": load}
+    return results
+
+
+async def run_graphql(args) -> dict:
+    use_service("analytics-service")
+    # One load generator would otherwise be throttled as a single client
+    os.environ["GRAPHQL_COST_RATE"] = "0"
+    from bench_analytics import build_facts
+    import main
+
+    if args.uncached:
+        main.resolver_cache.max_entries = 0
+
+    results = {}
+    for size in args.sizes:
+        start = time.perf_counter()
+        main.sales_facts = build_facts(args.lines, product_count=size)
+        main.resolver_cache.clear()
+        load_seconds = time.perf_counter() - start
+        scenarios = graphql_scenarios()
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=main.app), base_url="http://bench") as client:
+            rows = await sequential(client, scenarios, args.repeat)
+            load = await concurrent(client, scenarios, GRAPHQL_MIX, args.clients, args.seconds)
+
+        title = f"graphql, {size} products, {args.lines} order lines"
+        print_table(f"{title} (built in {load_seconds:.1f}s), one client", rows)
+        print_load(f"{title}, {args.clients} clients", load)
+        results[str(size)] = {"load_seconds": round(load_seconds, 2), "sequential": rows, "concurrent": load}
+    return results
+
+
+def main_():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("service", choices=["products", "graphql"])
+    parser.add_argument("--sizes", type=int, nargs="+", default=[10000, 100000, 1000000],
+                        help="products in the catalog")
+    parser.add_argument("--lines", type=int, default=1000000, help="order lines (graphql)")
+    parser.add_argument("--clients", type=int, default=16)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--repeat", type=int, default=200, help="requests per route with one client")
+    parser.add_argument("--uncached", action="store_true", help="turn the resolver cache off (graphql)")
+    args = parser.parse_args()
+
+    runner = run_products if args.service == "products" else run_graphql
+    results = asyncio.run(runner(args))
+    print(f"\nResults written to {write_results(f'load_asgi_{args.service}', results)}")
+
+
+if __name__ == "__main__":
+    main_()
@@ -0,0 +1,136 @@
+"""Load test analytics-service /graphql under mixed slow and fast traffic.
+
+A uvicorn server is started in a child process with a large synthetic fact
+table, once with GraphQL executed inline on the event loop
+(GRAPHQL_WORKERS=0) and once offloaded to the worker pool. Concurrent
+clients then send a heavy aggregation query, a cheap query or a /health
+probe over real connections, and latency per request kind plus throughput
+are reported for each mode.
+
+Usage:
+    python benchmarks/load_graphql.py [--lines 2000000] [--clients 32] [--seconds 10]
+"""
+import argparse
+import asyncio
+import os
+import socket
+import subprocess
+import sys
+import time
+from collections import defaultdict
+
+import httpx
+
+from harness import BENCH_DIR, P5_DIR, percentile, write_results
+
+SLOW_QUERY = "{ topProducts(limit: 10) { productId totalRevenue } revenueByCategory { category revenue } }"
+FAST_QUERY = "{ salesReports { id period } }"
+# One in SLOW_EVERY clients sends the heavy query
+SLOW_EVERY = 4
+
+SERVER = """
+import sys
+sys.path[:0] = [{bench!r}, {service!r}]
+import uvicorn
+from bench_analytics import build_facts
+import main
+main.sales_facts = build_facts({lines})
+uvicorn.run(main.app, host="127.0.0.1", port={port}, log_level="warning")
+"""
+
+
+def free_port() -> int:
+    with socket.socket() as sock:
+        sock.bind(("127.0.0.1", 0))
+        return sock.getsockname()[1]
+
+
+def start_server(lines: int, workers: int) -> tuple:
+    port = free_port()
+    code = SERVER.format(bench=BENCH_DIR, service=os.path.join(P5_DIR, "analytics-service"),
+                         lines=lines, port=port)
+    # All clients share one address, so cost throttling would treat them as one
+    env = dict(os.environ, GRAPHQL_WORKERS=str(workers), GRAPHQL_COST_RATE="0")
+    process = subprocess.Popen([sys.executable, "-c", code], env=env, stdout=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/health", timeout=1).raise_for_status()
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("analytics-service did not start")
+
+
+async def client_loop(client: httpx.AsyncClient, kind: str, deadline: float, timings: dict):
+    clock = time.perf_counter
+    while clock() < deadline:
+        start = clock()
+        if kind == "health":
+            response = await client.get("/health")
+        else:
+            query = SLOW_QUERY if kind == "graphql_slow" else FAST_QUERY
+            response = await client.post("/graphql", json={"query": query})
+        response.raise_for_status()
+        timings[kind].append(clock() - start)
+
+
+async def run_load(url: str, clients: int, seconds: float) -> dict:
+    timings = defaultdict(list)
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        kinds = [
+            "graphql_slow" if i % SLOW_EVERY == 0 else ("health" if i % 2 else "graphql_fast")
+            for i in range(clients)
+        ]
+        start = time.perf_counter()
+        deadline = start + seconds
+        await asyncio.gather(*(client_loop(client, kind, deadline, timings) for kind in kinds))
+        elapsed = time.perf_counter() - start
+
+    kinds = {}
+    for kind, values in sorted(timings.items()):
+        values.sort()
+        kinds[kind] = {
+            "requests": len(values),
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(percentile(values, 50) * 1e3, 2),
+            "p99_ms": round(percentile(values, 99) * 1e3, 2),
+        }
+    total = sum(len(values) for values in timings.values())
+    return {"requests_per_sec": round(total / elapsed, 1), "kinds": kinds}
+
+
+def print_load(title: str, result: dict):
+    print(f"\n{title}: {result['requests_per_sec']:.0f} requests/s")
+    print(f"  {'request':<16}{'requests':>10}{'rps':>10}{'p50 ms':>10}{'p99 ms':>10}")
+    for kind, stats in result["kinds"].items():
+        print(f"  {kind:<16}{stats['requests']:>10}{stats['rps']:>10.1f}{stats['p50_ms']:>10.2f}{stats['p99_ms']:>10.2f}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--lines", type=int, default=2000000, help="order lines in the fact table")
+    parser.add_argument("--clients", type=int, default=32)
+    parser.add_argument("--seconds", type=float, default=10)
+    parser.add_argument("--workers", type=int, default=4, help="GraphQL worker threads when offloading")
+    args = parser.parse_args()
+
+    results = {}
+    for mode, workers in (("inline", 0), ("offloaded", args.workers)):
+        process, url = start_server(args.lines, workers)
+        try:
+            result = asyncio.run(run_load(url, args.clients, args.seconds))
+        finally:
+            process.terminate()
+            process.wait()
+        print_load(f"{mode} (GRAPHQL_WORKERS={workers}), {args.clients} clients", result)
+        results[mode] = result
+
+    print(f"\nResults written to {write_results('load_graphql', results)}")
+
+
+if __name__ == "__main__":
+    main()
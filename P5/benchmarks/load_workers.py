@@ -0,0 +1,150 @@
+"""Load test product-service with 1, 2, 4... worker processes sharing one SQLite database.
+
+A catalog of synthetic products is written to a temporary SQLite file, then
+the service is started with `python main.py` and WORKERS set to each count
+in turn (PRODUCT_STORE=sqlite). Load generator processes, each running
+concurrent keep-alive clients, send a read-heavy mix of product gets, list
+pages and updates over real connections, and throughput plus latency are
+reported for every worker count, with the speedup over a single worker.
+Updates go through whichever worker receives them, so the other workers'
+caches are invalidated by the shared change log during the run.
+
+Scaling is bounded by the cores left over after the load generators; run it
+on a machine with cores to spare, and keep --generators below the core count.
+
+Usage:
+    python benchmarks/load_workers.py [--workers 1 2 4] [--catalog 100000] [--generators 2] [--clients 32]
+"""
+import argparse
+import asyncio
+import multiprocessing
+import os
+import random
+import subprocess
+import sys
+import tempfile
+import time
+from collections import defaultdict
+
+import httpx
+
+from harness import P5_DIR, percentile, synthetic_products, use_service, write_results
+from load_graphql import free_port, print_load
+
+MIX = {"get": 80, "list": 15, "update": 5}
+
+
+def build_database(path: str, size: int) -> list:
+    use_service("product-service")
+    from storage import SQLiteProductStore
+
+    store = SQLiteProductStore(path)
+    products = list(synthetic_products(size))
+    store.insert_many(products)
+    store.close()
+    return [product["id"] for product in products]
+
+
+def start_service(path: str, workers: int) -> tuple:
+    port = free_port()
+    env = dict(os.environ, WORKERS=str(workers), PRODUCT_STORE="sqlite", PRODUCT_DB_PATH=path,
+               HOST="127.0.0.1", PORT=str(port), ENVIRONMENT="benchmark")
+    process = subprocess.Popen([sys.executable, "main.py"], cwd=os.path.join(P5_DIR, "product-service"),
+                               env=env, stdout=subprocess.DEVNULL, stderr=subprocess.DEVNULL)
+    url = f"http://127.0.0.1:{port}"
+    deadline = time.monotonic() + 120
+    while time.monotonic() < deadline:
+        try:
+            httpx.get(f"{url}/health", timeout=1).raise_for_status()
+            return process, url
+        except httpx.HTTPError:
+            time.sleep(0.2)
+    process.kill()
+    raise RuntimeError("product-service did not start")
+
+
+async def generate(url: str, ids: list, clients: int, seconds: float, seed: int) -> dict:
+    labels = [label for label, weight in MIX.items() for _ in range(weight)]
+    timings = defaultdict(list)
+    clock = time.perf_counter
+
+    async def client_loop(client: httpx.AsyncClient, rng: random.Random, deadline: float):
+        while clock() < deadline:
+            label = rng.choice(labels)
+            product_id = rng.choice(ids)
+            start = clock()
+            if label == "get":
+                response = await client.get(f"/api/products/{product_id}")
+            elif label == "list":
+                response = await client.get("/api/products", params={"skip": rng.randrange(len(ids)), "limit": 20})
+            else:
+                response = await client.put(f"/api/products/{product_id}", json={"price": round(rng.uniform(1, 2000), 2)})
+            response.raise_for_status()
+            timings[label].append(clock() - start)
+
+    limits = httpx.Limits(max_connections=clients, max_keepalive_connections=clients)
+    async with httpx.AsyncClient(base_url=url, limits=limits, timeout=60) as client:
+        deadline = clock() + seconds
+        await asyncio.gather(*(client_loop(client, random.Random(seed * 1000 + i), deadline) for i in range(clients)))
+    return dict(timings)
+
+
+def generator_process(args: tuple) -> dict:
+    return asyncio.run(generate(*args))
+
+
+def run_load(url: str, ids: list, generators: int, clients: int, seconds: float) -> dict:
+    per_generator = max(clients // generators, 1)
+    with multiprocessing.Pool(generators) as pool:
+        start = time.perf_counter()
+        parts = pool.map(generator_process, [(url, ids, per_generator, seconds, seed) for seed in range(generators)])
+        elapsed = time.perf_counter() - start
+
+    timings = defaultdict(list)
+    for part in parts:
+        for label, values in part.items():
+            timings[label].extend(values)
+    kinds = {}
+    for label, values in sorted(timings.items()):
+        values.sort()
+        kinds[label] = {
+            "requests": len(values),
+            "rps": round(len(values) / elapsed, 1),
+            "p50_ms": round(percentile(values, 50) * 1e3, 2),
+            "p99_ms": round(percentile(values, 99) * 1e3, 2),
+        }
+    total = sum(len(values) for values in timings.values())
+    return {"requests_per_sec": round(total / elapsed, 1), "kinds": kinds}
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--workers", type=int, nargs="+", default=[1, 2, 4])
+    parser.add_argument("--catalog", type=int, default=100000, help="products in the database")
+    parser.add_argument("--generators", type=int, default=2, help="load generator processes")
+    parser.add_argument("--clients", type=int, default=32, help="concurrent clients over all generators")
+    parser.add_argument("--seconds", type=float, default=10)
+    args = parser.parse_args()
+
+    print(f"🖥️  {os.cpu_count()} cores, {args.generators} of them busy generating load")
+    results = {}
+    with tempfile.TemporaryDirectory() as directory:
+        path = os.path.join(directory, "products.db")
+        ids = build_database(path, args.catalog)
+        for workers in args.workers:
+            process, url = start_service(path, workers)
+            try:
+                result = run_load(url, ids, args.generators, args.clients, args.seconds)
+            finally:
+                process.terminate()
+                process.wait()
+            baseline = results.get("1", result)["requests_per_sec"]
+            result["speedup"] = round(result["requests_per_sec"] / baseline, 2) if baseline else 0.0
+            print_load(f"WORKERS={workers}, {args.clients} clients (x{result['speedup']} over one worker)", result)
+            results[str(workers)] = result
+
+    print(f"\nResults written to {write_results('load_workers', results)}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,156 @@
+"""Run the whole benchmark suite and bundle one run's results into a single JSON file.
+
+Each script runs in its own process and writes benchmarks/results/<name>.json
+as usual; the bundle, results/run-<commit>-<timestamp>.json, gathers them
+with the commit they were measured on. --quick runs every script with small
+sizes, as a smoke test or for a fast before/after check. Two bundles can be
+compared metric by metric (latencies, ops/s, requests/s).
+
+Usage:
+    python benchmarks/run_all.py [--quick] [--only storage load_asgi_products ...]
+    python benchmarks/run_all.py --compare results/run-A.json results/run-B.json [--threshold 5]
+"""
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+from datetime import datetime
+from typing import Dict, Iterator, Tuple
+
+from harness import BENCH_DIR, P5_DIR, RESULTS_DIR
+
+# name: (script and positional arguments, options for a full run, options for --quick);
+# the name is also the results file the script writes
+SUITE = {
+    "storage": (["bench_storage.py"], ["--sizes", "10000", "100000"], ["--sizes", "10000", "--repeat", "200"]),
+    "search": (["bench_search.py"], [], ["--sizes", "10000", "--repeat", "50"]),
+    "memory": (["bench_memory.py"], [], ["--sizes", "10000"]),
+    "serialization": (["bench_serialization.py"], [], ["--catalog", "10000", "--repeat", "100"]),
+    "export": (["bench_export.py"], [], ["--sizes", "10000"]),
+    "startup_products": (["bench_startup.py", "products"], [], ["--sizes", "10000"]),
+    "startup_analytics": (["bench_startup.py", "analytics"], [], ["--sizes", "100000"]),
+    "analytics": (["bench_analytics.py"], [], ["--sizes", "100000", "--repeat", "5"]),
+    "graphql": (["bench_graphql.py"], ["--lines", "1000000"], ["--lines", "100000", "--repeat", "200"]),
+    "ingestion": (["bench_ingestion.py"], [], ["--lines", "100000", "--events", "2000", "--repeat", "50"]),
+    "upstream": (["bench_upstream.py"], [], ["--keys", "50", "--repeat", "5"]),
+    "stress_reservations": (["stress_reservations.py"], [], ["--threads", "8", "--ops", "200", "--processes", "2"]),
+    "load_graphql": (["load_graphql.py"], [], ["--lines", "200000", "--clients", "8", "--seconds", "3"]),
+    "load_workers": (["load_workers.py"], [], ["--catalog", "10000", "--workers", "1", "2", "--seconds", "3"]),
+    "load_asgi_products": (["load_asgi.py", "products"], [], ["--sizes", "10000", "--seconds", "3", "--repeat", "50"]),
+    "load_asgi_graphql": (
+        ["load_asgi.py", "graphql"], [], ["--sizes", "10000", "--lines", "200000", "--seconds", "3", "--repeat", "30"]
+    ),
+}
+
+# Metrics compared between runs, and whether a higher value is better
+COMPARED = {
+    "mean_us": False, "p50_us": False, "p99_us": False, "ops_per_sec": True,
+    "p50_ms": False, "p99_ms": False, "rps": True, "requests_per_sec": True,
+    "products_per_sec": True, "peak_mb": False,
+}
+
+
+def git_commit() -> str:
+    try:
+        commit = subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=P5_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+        dirty = subprocess.run(["git", "status", "--porcelain", "--", "."], cwd=P5_DIR,
+                               capture_output=True, text=True).stdout.strip()
+        return f"{commit}-dirty" if dirty else commit
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+
+def run_suite(names, quick: bool) -> Tuple[dict, bool]:
+    """Run the named benchmarks; returns their results and whether all of them succeeded"""
+    results = {}
+    succeeded = True
+    for name in names:
+        (script, *positional), full_options, quick_options = SUITE[name]
+        command = [sys.executable, os.path.join(BENCH_DIR, script), *positional,
+                   *(quick_options if quick else full_options)]
+        print(f"\n🚀 {name}: {' '.join(command[1:])}", flush=True)
+        started = time.perf_counter()
+        completed = subprocess.run(command, cwd=P5_DIR)
+        seconds = round(time.perf_counter() - started, 1)
+        if completed.returncode != 0:
+            print(f"❌ {name} failed with exit code {completed.returncode}")
+            results[name] = {"error": f"exit code {completed.returncode}", "seconds": seconds}
+            succeeded = False
+            continue
+        with open(os.path.join(RESULTS_DIR, f"{name}.json")) as handle:
+            results[name] = {**json.load(handle), "seconds": seconds}
+        print(f"✅ {name} finished in {seconds}s")
+    return results, succeeded
+
+
+def flatten(value, path: str = "") -> Iterator[Tuple[str, float]]:
+    """(path, value) of every compared metric in a results tree"""
+    if isinstance(value, dict):
+        for key, child in value.items():
+            child_path = f"{path}/{key}" if path else str(key)
+            if key in COMPARED and isinstance(child, (int, float)):
+                yield child_path, child
+            else:
+                yield from flatten(child, child_path)
+
+
+def compare(old_path: str, new_path: str, threshold: float):
+    bundles = []
+    for path in (old_path, new_path):
+        with open(path) as handle:
+            bundles.append(json.load(handle))
+    old, new = (dict(flatten(bundle["results"])) for bundle in bundles)
+
+    rows = []
+    for path in sorted(old.keys() & new.keys()):
+        before, after = old[path], new[path]
+        if not before:
+            continue
+        change = (after - before) / before * 100
+        if abs(change) < threshold:
+            continue
+        better = (change > 0) == COMPARED[path.rsplit("/", 1)[1]]
+        rows.append((path, before, after, change, better))
+
+    print(f"{bundles[0].get('commit')} -> {bundles[1].get('commit')}: "
+          f"{len(rows)} of {len(old.keys() & new.keys())} metrics changed by {threshold:g}% or more")
+    for path, before, after, change, better in sorted(rows, key=lambda row: -abs(row[3])):
+        print(f"  {'✅' if better else '❌'} {path:<72}{before:>12.2f}{after:>12.2f}{change:>+9.1f}%")
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--quick", action="store_true", help="small sizes, for a smoke run")
+    parser.add_argument("--only", nargs="+", choices=list(SUITE), help="run only these benchmarks")
+    parser.add_argument("--compare", nargs=2, metavar=("OLD", "NEW"), help="compare two run bundles")
+    parser.add_argument("--threshold", type=float, default=5, help="smallest change shown by --compare, in %%")
+    args = parser.parse_args()
+
+    if args.compare:
+        compare(*args.compare, args.threshold)
+        return
+
+    commit = git_commit()
+    started = datetime.now()
+    results, succeeded = run_suite(args.only or list(SUITE), args.quick)
+
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"run-{commit}-{started:%Y%m%d-%H%M%S}.json")
+    bundle: Dict[str, object] = {
+        "commit": commit,
+        "started_at": started.isoformat(),
+        "quick": args.quick,
+        "results": results,
+    }
+    with open(path, "w") as handle:
+        json.dump(bundle, handle, indent=2)
+    print(f"\nRun written to {path}")
+    sys.exit(0 if succeeded else 1)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,186 @@
+"""Concurrency stress check for product-service stock reservations.
+
+Many workers race to reserve, commit, release and directly decrement stock
+on a handful of hot SKUs. At the end every SKU must satisfy
+
+    final stock == initial stock - committed - direct decrements >= 0
+
+with no reservation left open. Threads exercise both backends; with
+--processes the SQLite backend is also hammered from separate processes
+sharing one database file, as uvicorn workers would, once with product
+updates (PUT /api/products/{id} renames and reprices) mixed into the
+reservation traffic; an update must never write back a stock it read
+earlier. Exits non-zero if any stock was oversold or lost.
+
+Usage:
+    python benchmarks/stress_reservations.py [--threads 32] [--ops 2000] [--processes 4]
+"""
+import argparse
+import multiprocessing
+import os
+import random
+import sys
+import tempfile
+import threading
+import time
+from collections import Counter
+
+from harness import synthetic_products, use_service, write_results
+
+use_service("product-service")
+
+from reservations import ReservationManager  # noqa: E402
+from storage import InsufficientStock, MemoryProductStore, SQLiteProductStore  # noqa: E402
+
+HOT_SKUS = 4
+INITIAL_STOCK = 1000
+
+
+def hammer(store, product_ids, ops: int, seed: int, updates: bool = False) -> Counter:
+    """Run random reservation traffic, with product updates if asked; returns units sold per product"""
+    manager = ReservationManager(store)
+    rng = random.Random(seed)
+    sold = Counter()
+    for _ in range(ops):
+        product_id = rng.choice(product_ids)
+        if updates and rng.random() < 0.2:
+            # What a PUT without stock in its body applies
+            store.update(product_id, {"name": f"Product {seed}-{rng.randint(0, 999)}",
+                                      "price": round(rng.uniform(1, 100), 2)})
+            continue
+        quantity = rng.randint(1, 3)
+        action = rng.random()
+        try:
+            if action < 0.15:
+                store.adjust_stock(product_id, -quantity)
+                sold[product_id] += quantity
+                continue
+            reservation = manager.reserve(product_id, quantity, ttl=60)
+        except InsufficientStock:
+            continue
+
+        if action < 0.75:
+            manager.commit(reservation["id"])
+            sold[product_id] += quantity
+        else:
+            manager.release(reservation["id"])
+    return sold
+
+
+def seed_store(store):
+    products = list(synthetic_products(HOT_SKUS))
+    for product in products:
+        product["stock"] = INITIAL_STOCK
+    store.insert_many(products)
+    return [product["id"] for product in products]
+
+
+def verify(label: str, store, product_ids, sold: Counter, elapsed: float, ops: int) -> dict:
+    violations = []
+    for product_id in product_ids:
+        stock = store.get(product_id)["stock"]
+        expected = INITIAL_STOCK - sold[product_id]
+        if stock != expected or stock < 0:
+            violations.append(f"{product_id}: stock={stock} expected={expected}")
+    leftover = len(store.expired_reservations(float("inf")))
+    if leftover:
+        violations.append(f"{leftover} reservations left open")
+
+    status = "OK" if not violations else "FAILED"
+    print(f"{label:<28} {ops:>7} ops in {elapsed:6.2f}s ({ops / elapsed:>9.0f} ops/s)  "
+          f"sold={sum(sold.values()):>5}  {status}")
+    for violation in violations:
+        print(f"    {violation}")
+    return {
+        "ops": ops,
+        "seconds": round(elapsed, 3),
+        "ops_per_sec": round(ops / elapsed, 1),
+        "units_sold": sum(sold.values()),
+        "violations": violations,
+    }
+
+
+def run_threads(label: str, store, threads: int, ops: int) -> dict:
+    product_ids = seed_store(store)
+    totals = Counter()
+    totals_lock = threading.Lock()
+
+    def worker(seed):
+        sold = hammer(store, product_ids, ops, seed)
+        with totals_lock:
+            totals.update(sold)
+
+    workers = [threading.Thread(target=worker, args=(seed,)) for seed in range(threads)]
+    start = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    return verify(label, store, product_ids, totals, time.perf_counter() - start, threads * ops)
+
+
+def process_worker(path, product_ids, ops, seed, updates, results):
+    store = SQLiteProductStore(path, pool_size=1)
+    try:
+        results.put(dict(hammer(store, product_ids, ops, seed, updates)))
+    finally:
+        store.close()
+
+
+def run_processes(label: str, path: str, processes: int, ops: int, updates: bool = False) -> dict:
+    store = SQLiteProductStore(path)
+    product_ids = seed_store(store)
+    results = multiprocessing.Queue()
+    workers = [
+        multiprocessing.Process(target=process_worker, args=(path, product_ids, ops, seed, updates, results))
+        for seed in range(processes)
+    ]
+    start = time.perf_counter()
+    for process in workers:
+        process.start()
+    totals = Counter()
+    for _ in workers:
+        totals.update(results.get())
+    for process in workers:
+        process.join()
+    try:
+        return verify(label, store, product_ids, totals,
+                      time.perf_counter() - start, processes * ops)
+    finally:
+        store.close()
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--threads", type=int, default=32)
+    parser.add_argument("--ops", type=int, default=2000, help="operations per worker")
+    parser.add_argument("--processes", type=int, default=4)
+    args = parser.parse_args()
+
+    # Switch threads as often as possible to provoke interleavings
+    sys.setswitchinterval(1e-6)
+
+    results = {"memory/threads": run_threads(f"memory/{args.threads} threads", MemoryProductStore(),
+                                             args.threads, args.ops)}
+    with tempfile.TemporaryDirectory() as tmp:
+        sqlite = SQLiteProductStore(os.path.join(tmp, "threads.db"), pool_size=8)
+        try:
+            results["sqlite/threads"] = run_threads(f"sqlite/{args.threads} threads", sqlite,
+                                                    args.threads, args.ops // 4)
+        finally:
+            sqlite.close()
+        if args.processes > 0:
+            results["sqlite/processes"] = run_processes(f"sqlite/{args.processes} processes",
+                                                        os.path.join(tmp, "processes.db"),
+                                                        args.processes, args.ops)
+            results["sqlite/processes+updates"] = run_processes(f"sqlite/{args.processes} proc+updates",
+                                                                os.path.join(tmp, "updates.db"),
+                                                                args.processes, args.ops, updates=True)
+
+    write_results("stress_reservations", results)
+    if any(result["violations"] for result in results.values()):
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
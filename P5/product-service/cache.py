@@ -0,0 +1,97 @@
+import hashlib
+from collections import OrderedDict
+from typing import Hashable, Iterable, NamedTuple, Optional
+
+
+class CachedResponse(NamedTuple):
+    body: bytes
+    etag: str
+
+
+def product_etag(product: dict) -> str:
+    """Strong ETag for a single product, derived from its id and updated_at"""
+    digest = hashlib.blake2b(
+        f"{product['id']}:{product['updated_at'].isoformat()}".encode(),
+        digest_size=12
+    )
+    return f'"{digest.hexdigest()}"'
+
+
+def list_etag(products: Iterable[dict], *extra) -> str:
+    """ETag for a list response: changes when any item or the membership changes"""
+    digest = hashlib.blake2b(digest_size=12)
+    for product in products:
+        digest.update(f"{product['id']}:{product['updated_at'].isoformat()};".encode())
+    for value in extra:
+        digest.update(f"|{value}".encode())
+    return f'"{digest.hexdigest()}"'
+
+
+def etag_matches(if_none_match: Optional[str], etag: str) -> bool:
+    """Evaluate an If-None-Match header against the current ETag"""
+    if not if_none_match:
+        return False
+    candidates = [candidate.strip() for candidate in if_none_match.split(",")]
+    # Weak comparison, as RFC 9110 requires for If-None-Match
+    return "*" in candidates or etag in (candidate.removeprefix("W/") for candidate in candidates)
+
+
+class ResponseCache:
+    """Bounded LRU of serialized product responses.
+
+    Single products are cached under their id and dropped when that product
+    changes. List pages depend on many products, so their keys embed a
+    generation number that every write bumps; stale pages simply stop being
+    reachable and age out of the LRU.
+    """
+
+    def __init__(self, max_entries: int = 2048):
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[Hashable, CachedResponse]" = OrderedDict()
+        self._list_generation = 0
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._entries)
+
+    @staticmethod
+    def product_key(product_id: str) -> Hashable:
+        return ("product", product_id)
+
+    def list_key(self, *params) -> Hashable:
+        return ("list", self._list_generation) + params
+
+    def get(self, key: Hashable) -> Optional[CachedResponse]:
+        entry = self._entries.get(key)
+        if entry is None:
+            self.misses += 1
+            return None
+        self._entries.move_to_end(key)
+        self.hits += 1
+        return entry
+
+    def put(self, key: Hashable, body: bytes, etag: str) -> CachedResponse:
+        entry = CachedResponse(body, etag)
+        if self.max_entries <= 0:
+            return entry
+        self._entries[key] = entry
+        self._entries.move_to_end(key)
+        while len(self._entries) > self.max_entries:
+            self._entries.popitem(last=False)
+        return entry
+
+    def invalidate_product(self, product_id: str):
+        self._entries.pop(self.product_key(product_id), None)
+        self._list_generation += 1
+
+    def on_product_change(self, event: str, product_id: Optional[str]):
+        """ProductStore listener"""
+        if event == "reset":
+            self.clear()
+        else:
+            self.invalidate_product(product_id)
+
+    def clear(self):
+        self._entries.clear()
+        self._list_generation += 1
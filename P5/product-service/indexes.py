@@ -0,0 +1,313 @@
+import base64
+import binascii
+import math
+from collections import defaultdict
+from itertools import count
+from typing import Dict, Iterable, List, Optional, Tuple
+from sortedcontainers import SortedList
+
+
+def encode_cursor(seq: int) -> str:
+    """Opaque pagination token for the product with the given sequence number"""
+    return base64.urlsafe_b64encode(f"p:{seq}".encode()).decode().rstrip("=")
+
+
+def decode_cursor(cursor: str) -> int:
+    """Inverse of encode_cursor; raises ValueError for malformed tokens"""
+    try:
+        padded = cursor + "=" * (-len(cursor) % 4)
+        prefix, _, seq = base64.urlsafe_b64decode(padded).decode().partition(":")
+        if prefix != "p":
+            raise ValueError
+        return int(seq)
+    except (binascii.Error, UnicodeDecodeError, ValueError):
+        raise ValueError("Invalid pagination cursor")
+
+
+SORTABLE_FIELDS = ("price", "stock", "updated_at")
+
+
+def sort_value(product: dict, field: str):
+    """Comparable value of a sortable field (timestamps for updated_at)"""
+    value = product[field]
+    return value.timestamp() if field == "updated_at" else value
+
+
+class ProductIndex:
+    """Secondary indexes over the product catalog.
+
+    Every product gets a monotonically increasing sequence number the first
+    time it is indexed. The global ordering and the per-category orderings are
+    kept as sorted lists of those numbers, so a page at any offset costs
+    O(log N + page size) instead of a scan over the whole catalog.
+
+    Price, stock and updated_at are also kept in sorted lists of
+    (value, seq) pairs, which serve range filters and sorted listings with a
+    bisect instead of a full scan and sort. The indexed values of each
+    product are snapshotted, so `update` only touches the lists whose value
+    actually changed.
+    """
+
+    # A range this many times smaller than the catalog is collected on its own
+    NARROW_RANGE_RATIO = 8
+
+    def __init__(self):
+        self._sequence = count()
+        self._seq_by_id: Dict[str, int] = {}
+        self._id_by_seq: Dict[int, str] = {}
+        self._category_by_id: Dict[str, Optional[str]] = {}
+        self._values_by_id: Dict[str, Tuple] = {}
+        self._ordered = SortedList()
+        self._by_category: Dict[str, SortedList] = defaultdict(SortedList)
+        self._sorted: Dict[str, SortedList] = {field: SortedList() for field in SORTABLE_FIELDS}
+
+    def __len__(self):
+        return len(self._ordered)
+
+    def __contains__(self, product_id):
+        return product_id in self._seq_by_id
+
+    def add(self, product: dict):
+        """Index a product, or re-index it if it is already known"""
+        product_id = product["id"]
+        if product_id in self._seq_by_id:
+            self.update(product)
+            return
+
+        seq = next(self._sequence)
+        self._seq_by_id[product_id] = seq
+        self._id_by_seq[seq] = product_id
+        self._ordered.add(seq)
+
+        category = product.get("category")
+        self._category_by_id[product_id] = category
+        if category is not None:
+            self._by_category[category].add(seq)
+
+        values = tuple(sort_value(product, field) for field in SORTABLE_FIELDS)
+        self._values_by_id[product_id] = values
+        for field, value in zip(SORTABLE_FIELDS, values):
+            self._sorted[field].add((value, seq))
+
+    def add_many(self, products: Iterable[dict]):
+        """Index many products at once.
+
+        New products go into the sorted lists with one sort per list instead
+        of a bisect per product, which is what makes loading a whole catalog
+        fast; products that are already known are re-indexed one by one.
+        """
+        ordered = []
+        by_category: Dict[str, list] = defaultdict(list)
+        sorted_values: Dict[str, list] = {field: [] for field in SORTABLE_FIELDS}
+        known = []
+        for product in products:
+            product_id = product["id"]
+            if product_id in self._seq_by_id:
+                known.append(product)
+                continue
+
+            seq = next(self._sequence)
+            self._seq_by_id[product_id] = seq
+            self._id_by_seq[seq] = product_id
+            ordered.append(seq)
+
+            category = product.get("category")
+            self._category_by_id[product_id] = category
+            if category is not None:
+                by_category[category].append(seq)
+
+            values = tuple(sort_value(product, field) for field in SORTABLE_FIELDS)
+            self._values_by_id[product_id] = values
+            for field, value in zip(SORTABLE_FIELDS, values):
+                sorted_values[field].append((value, seq))
+
+        self._ordered.update(ordered)
+        for category, seqs in by_category.items():
+            self._by_category[category].update(seqs)
+        for field, values in sorted_values.items():
+            self._sorted[field].update(values)
+        # Includes products repeated within the batch, which are indexed by now
+        for product in known:
+            self.update(product)
+
+    def update(self, product: dict):
+        """Re-sync the indexes with a product that was changed in place"""
+        product_id = product["id"]
+        seq = self._seq_by_id[product_id]
+        previous = self._category_by_id[product_id]
+        category = product.get("category")
+        if previous != category:
+            if previous is not None:
+                self._discard_from_category(previous, seq)
+            if category is not None:
+                self._by_category[category].add(seq)
+            self._category_by_id[product_id] = category
+
+        old_values = self._values_by_id[product_id]
+        values = tuple(sort_value(product, field) for field in SORTABLE_FIELDS)
+        if values == old_values:
+            return
+        for field, old, new in zip(SORTABLE_FIELDS, old_values, values):
+            if old != new:
+                self._sorted[field].remove((old, seq))
+                self._sorted[field].add((new, seq))
+        self._values_by_id[product_id] = values
+
+    def remove(self, product_id: str):
+        """Drop a product from every index"""
+        seq = self._seq_by_id.pop(product_id, None)
+        if seq is None:
+            return
+
+        del self._id_by_seq[seq]
+        self._ordered.remove(seq)
+        category = self._category_by_id.pop(product_id)
+        if category is not None:
+            self._discard_from_category(category, seq)
+        for field, value in zip(SORTABLE_FIELDS, self._values_by_id.pop(product_id)):
+            self._sorted[field].remove((value, seq))
+
+    def clear(self):
+        self._seq_by_id.clear()
+        self._id_by_seq.clear()
+        self._category_by_id.clear()
+        self._values_by_id.clear()
+        self._ordered.clear()
+        self._by_category.clear()
+        for values in self._sorted.values():
+            values.clear()
+
+    def count(self, category: Optional[str] = None) -> int:
+        """Number of indexed products, optionally restricted to a category"""
+        if category is None:
+            return len(self._ordered)
+        bucket = self._by_category.get(category)
+        return len(bucket) if bucket else 0
+
+    def page(self, skip: int = 0, limit: int = 100, category: Optional[str] = None) -> List[str]:
+        """Product ids for an offset page in insertion order"""
+        seqs = self._ordered if category is None else self._by_category.get(category)
+        if not seqs or limit <= 0:
+            return []
+
+        skip = max(skip, 0)
+        return [self._id_by_seq[seq] for seq in seqs.islice(skip, skip + limit)]
+
+    def _bounds(self, field: str, low, high) -> Tuple[int, int]:
+        """Positions of the [low, high] value range in a sorted field list"""
+        values = self._sorted[field]
+        start = 0 if low is None else values.bisect_left((low,))
+        stop = len(values) if high is None else values.bisect_right((high, math.inf))
+        return start, max(start, stop)
+
+    def _width(self, field: str, bounds: Tuple) -> int:
+        start, stop = self._bounds(field, *bounds)
+        return stop - start
+
+    def query(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        category: Optional[str] = None,
+        ranges: Optional[Dict[str, Tuple]] = None,
+        sort_by: Optional[str] = None,
+        descending: bool = False
+    ) -> List[str]:
+        """Product ids matching inclusive value ranges, optionally sorted.
+
+        `ranges` maps a sortable field to a (low, high) pair where either
+        bound may be None. A sort walks the sort field's sorted list, and
+        without other filters the page is sliced straight out of it. Unsorted
+        results keep insertion order. The remaining filters are checked on the
+        snapshotted values.
+        """
+        ranges = {
+            field: bounds for field, bounds in (ranges or {}).items()
+            if bounds[0] is not None or bounds[1] is not None
+        }
+        if limit <= 0:
+            return []
+        if sort_by is None and not ranges and not descending:
+            return self.page(skip, limit, category)
+        skip = max(skip, 0)
+
+        if sort_by is not None:
+            driver = sort_by
+            values = self._sorted[driver]
+            start, stop = self._bounds(driver, *ranges.get(driver, (None, None)))
+            if category is None and all(field == driver for field in ranges):
+                # Nothing left to check: slice the page straight out
+                if descending:
+                    window = values.islice(max(start, stop - skip - limit), max(start, stop - skip), reverse=True)
+                else:
+                    window = values.islice(min(stop, start + skip), min(stop, start + skip + limit))
+                return [self._id_by_seq[seq] for _, seq in window]
+            seqs = (seq for _, seq in values.islice(start, stop, reverse=descending))
+            residual_category = category
+        else:
+            # Results stay in insertion order. A narrow range is cheaper to
+            # collect from its sorted list and re-sort by sequence than to
+            # find by walking the catalog in order.
+            base = self._ordered if category is None else self._by_category.get(category, SortedList())
+            widths = {field: self._width(field, ranges[field]) for field in ranges}
+            driver = min(widths, key=widths.get, default=None)
+            if driver is not None and widths[driver] * self.NARROW_RANGE_RATIO < len(base):
+                start, stop = self._bounds(driver, *ranges[driver])
+                seqs = iter(sorted((seq for _, seq in self._sorted[driver].islice(start, stop)),
+                                   reverse=descending))
+                residual_category = category
+            else:
+                driver = None
+                seqs = reversed(base) if descending else iter(base)
+                residual_category = None
+
+        checks = [
+            (SORTABLE_FIELDS.index(field), low, high)
+            for field, (low, high) in ranges.items() if field != driver
+        ]
+        product_ids = []
+        for seq in seqs:
+            product_id = self._id_by_seq[seq]
+            if residual_category is not None and self._category_by_id[product_id] != residual_category:
+                continue
+            snapshot = self._values_by_id[product_id]
+            if any((low is not None and snapshot[position] < low) or (high is not None and snapshot[position] > high)
+                   for position, low, high in checks):
+                continue
+            if skip:
+                skip -= 1
+                continue
+            product_ids.append(product_id)
+            if len(product_ids) >= limit:
+                break
+        return product_ids
+
+    def page_after(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        category: Optional[str] = None
+    ) -> Tuple[List[str], Optional[str]]:
+        """Keyset page of product ids following the given cursor.
+
+        Returns the ids and the cursor for the next page (None on the last
+        page). Positioning uses a bisect on the sequence numbers, so a deep
+        page costs the same as the first one and concurrent inserts never
+        shift items between pages.
+        """
+        seqs = self._ordered if category is None else self._by_category.get(category)
+        if not seqs or limit <= 0:
+            return [], None
+
+        start = 0 if not cursor else seqs.bisect_right(decode_cursor(cursor))
+        page = list(seqs.islice(start, start + limit))
+        next_cursor = None
+        if page and start + len(page) < len(seqs):
+            next_cursor = encode_cursor(page[-1])
+        return [self._id_by_seq[seq] for seq in page], next_cursor
+
+    def _discard_from_category(self, category: str, seq: int):
+        bucket = self._by_category[category]
+        bucket.discard(seq)
+        if not bucket:
+            del self._by_category[category]
@@ -1,16 +1,44 @@
-from fastapi import FastAPI, HTTPException, Depends, status
+from fastapi import FastAPI, HTTPException, Depends, Query, Request, Response, status
+from fastapi.responses import JSONResponse, StreamingResponse
 from fastapi.middleware.cors import CORSMiddleware
 from fastapi.middleware.trustedhost import TrustedHostMiddleware
-from pydantic import BaseModel, Field
-from typing import List, Optional
+from pydantic import BaseModel, Field, TypeAdapter, ValidationError, field_validator
+from typing import Any, Dict, List, Literal, Optional, Union
 import uvicorn
 import os
 from datetime import datetime
+import asyncio
+import threading
+import time
 import uuid
+from storage import InsufficientStock, InvalidProductUpdate, ProductNotFound, StockAdjustmentError, StoreWarmingUp, create_product_store
+from reservations import ReservationManager, ReservationNotFound
+from cache import CachedResponse, ResponseCache, etag_matches, list_etag, product_etag
+from search import SearchIndex
+from metrics import CONTENT_TYPE, MetricsMiddleware, Registry, hit_ratio
+from serialization import ProductEncoder, gzip_chunks, parse_serializers
+from snapshots import write_snapshot
 
 # Environment variables
 PORT = int(os.getenv("PORT", 8001))
 HOST = os.getenv("HOST", "0.0.0.0")
+BULK_MAX_ITEMS = int(os.getenv("BULK_MAX_ITEMS", 10000))
+RESERVATION_TTL_SECONDS = float(os.getenv("RESERVATION_TTL_SECONDS", 900))
+RESERVATION_SWEEP_SECONDS = float(os.getenv("RESERVATION_SWEEP_SECONDS", 30))
+RESPONSE_CACHE_SIZE = int(os.getenv("RESPONSE_CACHE_SIZE", 2048))
+# JSON serialization of product responses: model, orjson or cached (see serialization.py),
+# overridable per route with e.g. JSON_SERIALIZERS="list=model,item=orjson"
+JSON_SERIALIZER = os.getenv("JSON_SERIALIZER", "cached")
+JSON_SERIALIZERS = parse_serializers(
+    os.getenv("JSON_SERIALIZERS", ""), ("list", "item", "batch", "category"), JSON_SERIALIZER
+)
+JSON_FRAGMENT_CACHE_SIZE = int(os.getenv("JSON_FRAGMENT_CACHE_SIZE", 100000))
+EXPORT_BATCH_SIZE = int(os.getenv("EXPORT_BATCH_SIZE", 1000))
+# Worker processes; more than one needs a store they can share (PRODUCT_STORE=sqlite)
+WORKERS = int(os.getenv("WORKERS", 1))
+# Snapshot directory the memory store starts from instead of seeding ("" disables snapshots)
+PRODUCT_SNAPSHOT_PATH = os.getenv("PRODUCT_SNAPSHOT_PATH", "")
+SNAPSHOT_ON_SHUTDOWN = os.getenv("SNAPSHOT_ON_SHUTDOWN", "true").lower() == "true"
 
 # FastAPI app initialization
 app = FastAPI(
@@ -36,6 +64,10 @@ app.add_middleware(
     allowed_hosts=["*"]  # Configure appropriately for production
 )
 
+# Request metrics, served by /metrics
+metrics = Registry()
+app.add_middleware(MetricsMiddleware, registry=metrics)
+
 # Pydantic models
 class ProductBase(BaseModel):
     name: str = Field(..., min_length=1, max_length=100)
@@ -54,6 +86,14 @@ class ProductUpdate(BaseModel):
     category: Optional[str] = Field(None, max_length=50)
     stock: Optional[int] = Field(None, ge=0)
 
+    @field_validator("name", "price", "stock")
+    @classmethod
+    def not_null(cls, value):
+        # May be left out, but a product always has them
+        if value is None:
+            raise ValueError("may not be null")
+        return value
+
 class Product(ProductBase):
     id: str
     created_at: datetime
@@ -62,18 +102,179 @@ class Product(ProductBase):
     class Config:
         from_attributes = True
 
+class ProductPage(BaseModel):
+    items: List[Product]
+    next_cursor: Optional[str] = None
+
+class ProductSearchHit(Product):
+    score: float
+
+class ProductSearchResponse(BaseModel):
+    query: str
+    total: int
+    items: List[ProductSearchHit]
+
+class BulkItemResult(BaseModel):
+    index: int
+    success: bool
+    id: Optional[str] = None
+    new_stock: Optional[int] = None
+    error: Optional[str] = None
+
+class BulkResponse(BaseModel):
+    succeeded: int
+    failed: int
+    results: List[BulkItemResult]
+
+class StockAdjustment(BaseModel):
+    product_id: str
+    quantity: int
+
+class BulkStockRequest(BaseModel):
+    adjustments: List[StockAdjustment]
+    atomic: bool = False
+
+class ReservationCreate(BaseModel):
+    quantity: int = Field(..., gt=0)
+    ttl_seconds: Optional[float] = Field(None, gt=0, le=86400)
+
+class Reservation(BaseModel):
+    id: str
+    product_id: str
+    quantity: int
+    expires_at: datetime
+    remaining_stock: Optional[int] = None
+
 class HealthResponse(BaseModel):
     service: str
     status: str
     timestamp: datetime
     version: str
 
-# In-memory storage (replace with database in production)
-products_db = {}
+# Seconds spent in each startup phase, exported by /metrics
+startup_timings = {}
+
+# Product storage backend, selected with PRODUCT_STORE (memory or sqlite)
+store_opened = time.perf_counter()
+products_db = create_product_store(shared=WORKERS > 1, snapshot_path=PRODUCT_SNAPSHOT_PATH)
+if not products_db.ready:
+    startup_timings["restore"] = time.perf_counter() - store_opened
+    print(f"⚡ Serving {len(products_db)} products from {PRODUCT_SNAPSHOT_PATH} "
+          f"(opened in {startup_timings['restore'] * 1e3:.1f} ms, loading into memory in the background)")
+
+class StoreSyncMiddleware:
+    """Bring this worker's caches and indexes up to date with the other workers' writes
+    before each request, so no worker serves data another has already changed"""
+
+    def __init__(self, app, store):
+        self.app = app
+        self.store = store
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] == "http":
+            self.store.sync()
+        await self.app(scope, receive, send)
+
+if WORKERS > 1:
+    app.add_middleware(StoreSyncMiddleware, store=products_db)
+
+# Serialized read responses, invalidated by every storage write
+response_cache = ResponseCache(max_entries=RESPONSE_CACHE_SIZE)
+products_db.subscribe(response_cache.on_product_change)
+
+# Serialized products, reused across list pages
+product_encoder = ProductEncoder(max_entries=JSON_FRAGMENT_CACHE_SIZE)
+products_db.subscribe(product_encoder.on_product_change)
+
+product_list_adapter = TypeAdapter(List[Product])
+
+# Full-text index over name, description and category
+search_index = SearchIndex()
+# While the index of a restored snapshot is built in the background, the
+# products changed meanwhile, to re-index once it is done (None when ready)
+search_index_backlog = None if products_db.ready else set()
+
+def sync_search_index(event: str, product_id: Optional[str]):
+    """ProductStore listener keeping the search index incremental"""
+    if search_index_backlog is not None:
+        search_index_backlog.add(product_id)
+    elif event == "reset":
+        search_index.build(products_db.scan())
+    elif event == "delete":
+        search_index.remove(product_id)
+    elif event in ("insert", "update"):
+        product = products_db.get(product_id)
+        if product is not None:
+            search_index.add(product)
+
+products_db.subscribe(sync_search_index)
+
+# Two-phase stock holds used by the order service
+reservation_manager = ReservationManager(products_db, default_ttl=RESERVATION_TTL_SECONDS)
+
+# Sizes and cache counters, read when /metrics is scraped
+metrics.callback("product_store_size", "Products in storage", lambda: len(products_db))
+metrics.callback("product_search_index_size", "Products in the search index", lambda: len(search_index))
+metrics.callback("response_cache_entries", "Serialized responses cached", lambda: len(response_cache))
+metrics.callback(
+    "response_cache_requests_total", "Response cache lookups", kind="counter", labelnames=("result",),
+    callback=lambda: {("hit",): response_cache.hits, ("miss",): response_cache.misses}
+)
+metrics.callback("json_fragment_cache_entries", "Serialized products cached", lambda: len(product_encoder))
+metrics.callback(
+    "json_fragment_cache_requests_total", "Serialized product lookups", kind="counter", labelnames=("result",),
+    callback=lambda: {("hit",): product_encoder.hits, ("miss",): product_encoder.misses}
+)
+metrics.callback(
+    "response_cache_hit_ratio", "Share of response cache lookups that hit",
+    lambda: hit_ratio(response_cache.hits, response_cache.misses)
+)
+metrics.callback(
+    "startup_duration_seconds", "Time spent loading data at startup", labelnames=("phase",),
+    callback=lambda: {(phase,): seconds for phase, seconds in startup_timings.items()}
+)
+metrics.callback(
+    "product_store_ready", "1 once the store takes writes and search works, 0 while a snapshot loads",
+    lambda: int(products_db.ready and search_index_backlog is None)
+)
+
+# Loading a restored snapshot
+def warm_up(loop: asyncio.AbstractEventLoop):
+    """Load the snapshot into memory, then build the search index (on a background thread)"""
+    try:
+        started = time.perf_counter()
+        products_db.hydrate()
+        startup_timings["hydrate"] = time.perf_counter() - started
+        print(f"✅ Loaded {len(products_db)} products into memory in {startup_timings['hydrate']:.1f}s, "
+              f"writes enabled")
+
+        started = time.perf_counter()
+        index = SearchIndex()
+        index.build(products_db.scan())
+        loop.call_soon_threadsafe(publish_search_index, index, started)
+    except Exception as exc:
+        print(f"❌ Loading the snapshot failed: {exc}")
+
+def publish_search_index(index: SearchIndex, started: float):
+    """Swap in a search index built in the background (on the event loop, between writes)"""
+    global search_index, search_index_backlog
+    for product_id in search_index_backlog:
+        product = products_db.get(product_id)
+        if product is None:
+            index.remove(product_id)
+        else:
+            index.add(product)
+    search_index, search_index_backlog = index, None
+    startup_timings["search_index"] = time.perf_counter() - started
+    print(f"🔎 Search index of {len(index)} products built in {startup_timings['search_index']:.1f}s")
 
 # Seed initial products
 def seed_products():
     """Initialize database with sample products"""
+    if len(products_db) > 0:
+        print(f"✅ Loaded {len(products_db)} products from storage")
+        return
+
     initial_products = [
         {
             "id": str(uuid.uuid4()),
@@ -128,10 +329,90 @@ def seed_products():
     ]
 
     for product in initial_products:
-        products_db[product["id"]] = product
+        products_db.insert(product)
 
     print(f"✅ Seeded {len(initial_products)} products")
 
+# Product helpers shared by the single-item and bulk endpoints
+def build_product(product_data: ProductCreate) -> dict:
+    """Turn a validated ProductCreate into a stored product record"""
+    now = datetime.now()
+    return {
+        "id": str(uuid.uuid4()),
+        "name": product_data.name,
+        "description": product_data.description,
+        "price": product_data.price,
+        "category": product_data.category,
+        "stock": product_data.stock,
+        "created_at": now,
+        "updated_at": now
+    }
+
+def insert_product(product_data: ProductCreate) -> dict:
+    """Store a validated product"""
+    product = build_product(product_data)
+    products_db.insert(product)
+    return product
+
+def apply_product_update(product_id: str, product_data: ProductUpdate) -> Optional[dict]:
+    """Apply the fields set on a ProductUpdate to a stored product; None if it does not exist
+
+    Only those fields are written, so stock taken by a concurrent order or
+    reservation (in this worker or another) is never put back.
+    """
+    return products_db.update(product_id, product_data.dict(exclude_unset=True))
+
+def apply_stock_delta(product_id: str, quantity: int) -> int:
+    """Add quantity (negative to decrement) to a product's stock"""
+    try:
+        return products_db.adjust_stock(product_id, quantity)
+    except ProductNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Product not found"
+        )
+    except InsufficientStock:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Insufficient stock"
+        )
+
+def check_bulk_size(items: list):
+    if len(items) > BULK_MAX_ITEMS:
+        raise HTTPException(
+            status_code=status.HTTP_413_REQUEST_ENTITY_TOO_LARGE,
+            detail=f"Bulk requests are limited to {BULK_MAX_ITEMS} items"
+        )
+
+def validation_message(exc: ValidationError) -> str:
+    return "; ".join(
+        f"{'.'.join(str(part) for part in error['loc'])}: {error['msg']}"
+        for error in exc.errors()
+    )
+
+def bulk_response(results: List[BulkItemResult]) -> BulkResponse:
+    succeeded = sum(1 for result in results if result.success)
+    return BulkResponse(succeeded=succeeded, failed=len(results) - succeeded, results=results)
+
+def cached_json_response(request: Request, cached: CachedResponse) -> Response:
+    """Send a cached body, or 304 Not Modified if the client already has it"""
+    headers = {"ETag": cached.etag, "Cache-Control": "no-cache"}
+    if etag_matches(request.headers.get("if-none-match"), cached.etag):
+        return Response(status_code=status.HTTP_304_NOT_MODIFIED, headers=headers)
+    return Response(cached.body, media_type="application/json", headers=headers)
+
+def products_json(products: List[dict], mode: str) -> bytes:
+    """A JSON array of products, serialized the way the route is configured to"""
+    if mode == "model":
+        return product_list_adapter.dump_json(product_list_adapter.validate_python(products))
+    return product_encoder.encode_list(products, mode)
+
+def local_time(moment: Optional[datetime]) -> Optional[datetime]:
+    """Naive local time, the form timestamps are stored in"""
+    if moment is None or moment.tzinfo is None:
+        return moment
+    return moment.astimezone().replace(tzinfo=None)
+
 # Health check endpoint
 @app.get("/health", response_model=HealthResponse)
 async def health_check():
@@ -142,111 +423,372 @@ async def health_check():
         version="1.0.0"
     )
 
+# Prometheus metrics
+@app.get("/metrics", include_in_schema=False)
+async def get_metrics():
+    return Response(metrics.render(), media_type=CONTENT_TYPE)
+
 # Product endpoints
-@app.get("/api/products", response_model=List[Product])
+@app.get("/api/products", response_model=Union[List[Product], ProductPage])
 async def get_products(
+    request: Request,
     skip: int = 0,
     limit: int = 100,
-    category: Optional[str] = None
+    category: Optional[str] = None,
+    after: Optional[str] = None,
+    min_price: Optional[float] = None,
+    max_price: Optional[float] = None,
+    min_stock: Optional[int] = None,
+    max_stock: Optional[int] = None,
+    in_stock: Optional[bool] = None,
+    updated_after: Optional[datetime] = None,
+    updated_before: Optional[datetime] = None,
+    sort_by: Optional[Literal["price", "stock", "updated_at"]] = None,
+    order: Literal["asc", "desc"] = "asc"
 ):
-    """Get all products with optional pagination and filtering"""
-    products = list(products_db.values())
+    """Get all products with optional pagination and filtering
+
+    Passing `after` (empty for the first page) switches to cursor pagination:
+    the response becomes a page object whose `next_cursor` is the `after`
+    value for the following page.
+
+    Price, stock and updated_at ranges are inclusive and can be combined with
+    `sort_by`/`order`; they are served from sorted indexes rather than a scan.
+    """
+    category = category or None
+    if in_stock is not None:
+        if in_stock:
+            min_stock = max(min_stock or 0, 1)
+        else:
+            max_stock = 0 if max_stock is None else min(max_stock, 0)
+    ranges = {
+        "price": (min_price, max_price),
+        "stock": (min_stock, max_stock),
+        "updated_at": (local_time(updated_after), local_time(updated_before)),
+    }
+    ranges = {field: bounds for field, bounds in ranges.items() if bounds != (None, None)}
+    descending = order == "desc"
+    if after is not None and (ranges or sort_by or descending):
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail="Cursor pagination does not support range filters or sorting; use skip and limit"
+        )
 
-    if category:
-        products = [p for p in products if p.get("category") == category]
+    key = response_cache.list_key(skip, limit, category, after, tuple(sorted(ranges.items())), sort_by, descending)
+    cached = response_cache.get(key)
+    if cached is not None:
+        return cached_json_response(request, cached)
+
+    if after is not None:
+        try:
+            products, next_cursor = products_db.page_after(after, limit, category)
+        except ValueError as exc:
+            raise HTTPException(
+                status_code=status.HTTP_400_BAD_REQUEST,
+                detail=str(exc)
+            )
+        if JSON_SERIALIZERS["list"] == "model":
+            body = ProductPage(items=products, next_cursor=next_cursor).model_dump_json().encode()
+        else:
+            body = product_encoder.encode_page(products, next_cursor, JSON_SERIALIZERS["list"])
+        etag = list_etag(products, "page", next_cursor)
+    else:
+        if ranges or sort_by or descending:
+            products = products_db.query(skip, limit, category, ranges, sort_by, descending)
+        else:
+            products = products_db.page(skip, limit, category)
+        body = products_json(products, JSON_SERIALIZERS["list"])
+        etag = list_etag(products)
+
+    return cached_json_response(request, response_cache.put(key, body, etag))
+
+@app.get("/api/products/search", response_model=ProductSearchResponse)
+async def search_products(
+    q: str = Query(..., min_length=1, max_length=200),
+    limit: int = Query(20, ge=1, le=100),
+    category: Optional[str] = None
+):
+    """Full-text search over name, description and category, best match first
 
-    return products[skip: skip + limit]
+    Every word of the query must match; the last characters typed may be a
+    prefix ("lap" finds "laptop").
+    """
+    if search_index_backlog is not None:
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Search index is still loading, retry later",
+            headers={"Retry-After": "5"}
+        )
+    total, hits = search_index.search(q, limit, category or None)
+    items = []
+    for product_id, score in hits:
+        product = products_db.get(product_id)
+        if product is not None:
+            items.append(ProductSearchHit(**product, score=score))
+    return ProductSearchResponse(query=q, total=total, items=items)
+
+@app.get("/api/products/batch", response_model=List[Product])
+async def get_products_batch(ids: str = Query(..., min_length=1)):
+    """Get several products by ID in one call
+
+    `ids` is comma-separated; unknown ids are left out of the response.
+    """
+    product_ids = list(dict.fromkeys(product_id for product_id in ids.split(",") if product_id))
+    check_bulk_size(product_ids)
+    products = (products_db.get(product_id) for product_id in product_ids)
+    found = [product for product in products if product is not None]
+    if JSON_SERIALIZERS["batch"] == "model":
+        return found
+    return Response(products_json(found, JSON_SERIALIZERS["batch"]), media_type="application/json")
+
+@app.get("/api/products/export")
+async def export_products(updated_since: Optional[datetime] = None, gzip: bool = False):
+    """Stream the whole catalog as NDJSON, one product per line
+
+    Products are read and written `EXPORT_BATCH_SIZE` at a time, so memory
+    use does not grow with the catalog. `updated_since` limits the export to
+    products updated at or after it, for delta syncs: the `X-Export-Started-At`
+    header is the value to pass on the next sync. `gzip=true` compresses the
+    stream on the fly (`Content-Encoding: gzip`).
+    """
+    started_at = datetime.now()
+    products = products_db.scan(EXPORT_BATCH_SIZE, local_time(updated_since))
+    chunks = product_encoder.encode_ndjson(products, EXPORT_BATCH_SIZE)
+    headers = {"X-Export-Started-At": started_at.isoformat()}
+    if gzip:
+        chunks = gzip_chunks(chunks)
+        headers["Content-Encoding"] = "gzip"
+    return StreamingResponse(chunks, media_type="application/x-ndjson", headers=headers)
 
 @app.get("/api/products/{product_id}", response_model=Product)
-async def get_product(product_id: str):
+async def get_product(product_id: str, request: Request):
     """Get a specific product by ID"""
-    if product_id not in products_db:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="Product not found"
-        )
-    return products_db[product_id]
+    key = response_cache.product_key(product_id)
+    cached = response_cache.get(key)
+    if cached is None:
+        product = products_db.get(product_id)
+        if product is None:
+            raise HTTPException(
+                status_code=status.HTTP_404_NOT_FOUND,
+                detail="Product not found"
+            )
+        if JSON_SERIALIZERS["item"] == "model":
+            body = Product.model_validate(product).model_dump_json().encode()
+        else:
+            body = product_encoder.encoder(JSON_SERIALIZERS["item"])(product)
+        cached = response_cache.put(key, body, product_etag(product))
+    return cached_json_response(request, cached)
 
 @app.post("/api/products", response_model=Product, status_code=status.HTTP_201_CREATED)
 async def create_product(product_data: ProductCreate):
     """Create a new product"""
-    product_id = str(uuid.uuid4())
-    now = datetime.now()
-
-    product = {
-        "id": product_id,
-        "name": product_data.name,
-        "description": product_data.description,
-        "price": product_data.price,
-        "category": product_data.category,
-        "stock": product_data.stock,
-        "created_at": now,
-        "updated_at": now
-    }
-
-    products_db[product_id] = product
-    return product
+    return insert_product(product_data)
+
+@app.post("/api/products/bulk", response_model=BulkResponse)
+async def bulk_create_products(items: List[Dict[str, Any]]):
+    """Create many products in one request, reporting a result per item"""
+    check_bulk_size(items)
+    results = []
+    products = []
+    for index, item in enumerate(items):
+        try:
+            product = build_product(ProductCreate.model_validate(item))
+        except ValidationError as exc:
+            results.append(BulkItemResult(index=index, success=False, error=validation_message(exc)))
+            continue
+        products.append(product)
+        results.append(BulkItemResult(index=index, success=True, id=product["id"]))
+
+    # One storage write for the whole batch (a single transaction on SQLite)
+    products_db.insert_many(products)
+    return bulk_response(results)
+
+@app.put("/api/products/bulk", response_model=BulkResponse)
+async def bulk_update_products(items: List[Dict[str, Any]]):
+    """Update many products in one request; each item carries its `id`"""
+    check_bulk_size(items)
+    results = []
+    for index, item in enumerate(items):
+        product_id = item.get("id")
+        if not isinstance(product_id, str) or product_id not in products_db:
+            results.append(BulkItemResult(index=index, success=False, id=product_id, error="Product not found"))
+            continue
+        try:
+            product_data = ProductUpdate.model_validate({k: v for k, v in item.items() if k != "id"})
+        except ValidationError as exc:
+            results.append(BulkItemResult(index=index, success=False, id=product_id, error=validation_message(exc)))
+            continue
+        try:
+            product = apply_product_update(product_id, product_data)
+        except InvalidProductUpdate as exc:
+            results.append(BulkItemResult(index=index, success=False, id=product_id, error=str(exc)))
+            continue
+        if product is None:
+            # Deleted since it was checked
+            results.append(BulkItemResult(index=index, success=False, id=product_id, error="Product not found"))
+            continue
+        results.append(BulkItemResult(index=index, success=True, id=product_id))
+    return bulk_response(results)
 
 @app.put("/api/products/{product_id}", response_model=Product)
 async def update_product(product_id: str, product_data: ProductUpdate):
     """Update an existing product"""
-    if product_id not in products_db:
+    try:
+        product = apply_product_update(product_id, product_data)
+    except InvalidProductUpdate as exc:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=str(exc)
+        )
+    if product is None:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
 
-    product = products_db[product_id]
-    update_data = product_data.dict(exclude_unset=True)
-
-    for field, value in update_data.items():
-        product[field] = value
-
-    product["updated_at"] = datetime.now()
-    products_db[product_id] = product
-
     return product
 
 @app.delete("/api/products/{product_id}", status_code=status.HTTP_204_NO_CONTENT)
 async def delete_product(product_id: str):
     """Delete a product"""
-    if product_id not in products_db:
+    if not products_db.delete(product_id):
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
 
-    del products_db[product_id]
-
 @app.get("/api/products/category/{category}", response_model=List[Product])
 async def get_products_by_category(category: str):
     """Get products by category"""
-    products = [p for p in products_db.values() if p.get("category") == category]
-    return products
+    products = products_db.page(0, products_db.count(category), category)
+    if JSON_SERIALIZERS["category"] == "model":
+        return products
+    return Response(products_json(products, JSON_SERIALIZERS["category"]), media_type="application/json")
+
+@app.patch("/api/products/bulk/stock", response_model=BulkResponse)
+async def bulk_update_product_stock(request_data: BulkStockRequest, response: Response):
+    """Apply many stock adjustments in one request
+
+    With `atomic` set, every adjustment is checked first and nothing is
+    applied unless all of them succeed (409 Conflict otherwise).
+    """
+    check_bulk_size(request_data.adjustments)
+    adjustments = request_data.adjustments
+
+    if request_data.atomic:
+        try:
+            new_stocks = products_db.adjust_stock_atomic(
+                [(adjustment.product_id, adjustment.quantity) for adjustment in adjustments]
+            )
+        except StockAdjustmentError as exc:
+            response.status_code = status.HTTP_409_CONFLICT
+            return bulk_response([
+                BulkItemResult(
+                    index=index,
+                    success=False,
+                    id=adjustment.product_id,
+                    error=exc.errors.get(index, "Not applied: batch rolled back")
+                )
+                for index, adjustment in enumerate(adjustments)
+            ])
+        return bulk_response([
+            BulkItemResult(index=index, success=True, id=adjustment.product_id, new_stock=new_stock)
+            for index, (adjustment, new_stock) in enumerate(zip(adjustments, new_stocks))
+        ])
+
+    results = []
+    for index, adjustment in enumerate(adjustments):
+        try:
+            new_stock = apply_stock_delta(adjustment.product_id, adjustment.quantity)
+            results.append(BulkItemResult(index=index, success=True, id=adjustment.product_id, new_stock=new_stock))
+        except HTTPException as exc:
+            results.append(BulkItemResult(index=index, success=False, id=adjustment.product_id, error=exc.detail))
+    return bulk_response(results)
 
 @app.patch("/api/products/{product_id}/stock")
 async def update_product_stock(product_id: str, quantity: int):
     """Update product stock (for inventory management)"""
-    if product_id not in products_db:
+    new_stock = apply_stock_delta(product_id, quantity)
+    return {"message": "Stock updated successfully", "new_stock": new_stock}
+
+# Stock reservation endpoints
+def reservation_response(reservation: dict) -> Reservation:
+    return Reservation(
+        id=reservation["id"],
+        product_id=reservation["product_id"],
+        quantity=reservation["quantity"],
+        expires_at=datetime.fromtimestamp(reservation["expires_at"]),
+        remaining_stock=reservation.get("remaining_stock")
+    )
+
+@app.post(
+    "/api/products/{product_id}/reservations",
+    response_model=Reservation,
+    status_code=status.HTTP_201_CREATED
+)
+async def reserve_product_stock(product_id: str, reservation_data: ReservationCreate):
+    """Hold stock for an order until it is committed, released or expires"""
+    try:
+        reservation = reservation_manager.reserve(
+            product_id,
+            reservation_data.quantity,
+            reservation_data.ttl_seconds
+        )
+    except ProductNotFound:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="Product not found"
         )
-
-    product = products_db[product_id]
-    new_stock = product["stock"] + quantity
-
-    if new_stock < 0:
+    except InsufficientStock:
         raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
+            status_code=status.HTTP_409_CONFLICT,
             detail="Insufficient stock"
         )
+    return reservation_response(reservation)
+
+@app.post("/api/products/reservations/{reservation_id}/commit", response_model=Reservation)
+async def commit_reservation(reservation_id: str):
+    """Make a stock hold permanent (the order was placed)"""
+    try:
+        return reservation_response(reservation_manager.commit(reservation_id))
+    except ReservationNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reservation not found or expired"
+        )
 
-    product["stock"] = new_stock
-    product["updated_at"] = datetime.now()
-    products_db[product_id] = product
+@app.delete("/api/products/reservations/{reservation_id}", response_model=Reservation)
+async def release_reservation(reservation_id: str):
+    """Cancel a stock hold and give the quantity back"""
+    try:
+        return reservation_response(reservation_manager.release(reservation_id))
+    except ReservationNotFound:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="Reservation not found or expired"
+        )
 
-    return {"message": "Stock updated successfully", "new_stock": new_stock}
+# Snapshots
+snapshot_lock = asyncio.Lock()
+
+@app.post("/api/products/snapshot")
+async def create_snapshot():
+    """Write a snapshot of the catalog and open reservations for the next startup to restore"""
+    if not PRODUCT_SNAPSHOT_PATH:
+        raise HTTPException(
+            status_code=status.HTTP_409_CONFLICT,
+            detail="Snapshots are disabled, set PRODUCT_SNAPSHOT_PATH"
+        )
+    async with snapshot_lock:
+        started = time.perf_counter()
+        manifest = await asyncio.to_thread(write_snapshot, products_db, PRODUCT_SNAPSHOT_PATH)
+    return {
+        "path": PRODUCT_SNAPSHOT_PATH,
+        "created_at": manifest["created_at"],
+        "products": manifest["count"],
+        "reservations": len(manifest["reservations"]),
+        "seconds": round(time.perf_counter() - started, 3)
+    }
 
 # Exception handlers
 @app.exception_handler(ValueError)
@@ -256,19 +798,54 @@ async def value_error_handler(request, exc):
         detail=str(exc)
     )
 
+@app.exception_handler(StoreWarmingUp)
+async def store_warming_up_handler(request, exc):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": "5"}
+    )
+
 @app.on_event("startup")
 async def startup_event():
     """Initialize data on startup"""
-    seed_products()
+    if products_db.ready:
+        started = time.perf_counter()
+        seed_products()
+        search_index.build(products_db.scan())
+        startup_timings["seed"] = time.perf_counter() - started
+    else:
+        # Restored from a snapshot: served from it while the rest loads
+        threading.Thread(
+            target=warm_up, args=(asyncio.get_running_loop(),), name="snapshot-warm-up", daemon=True
+        ).start()
+    app.state.reservation_sweeper = asyncio.create_task(
+        reservation_manager.sweep_forever(RESERVATION_SWEEP_SECONDS)
+    )
+
+@app.on_event("shutdown")
+async def shutdown_event():
+    """Release storage resources"""
+    app.state.reservation_sweeper.cancel()
+    if PRODUCT_SNAPSHOT_PATH and SNAPSHOT_ON_SHUTDOWN and products_db.ready:
+        manifest = write_snapshot(products_db, PRODUCT_SNAPSHOT_PATH)
+        print(f"💾 Snapshot of {manifest['count']} products written to {PRODUCT_SNAPSHOT_PATH}")
+    products_db.close()
 
 if __name__ == "__main__":
     print(f"🚀 Starting Product Service on {HOST}:{PORT}")
     print(f"📍 Health check: http://localhost:{PORT}/health")
     print(f"📍 API Base: http://localhost:{PORT}/api/products")
     print(f"📚 API documentation: http://localhost:{PORT}/docs")
+    if WORKERS > 1:
+        # Seed once here rather than racing to do it in every worker
+        print(f"👥 Starting {WORKERS} workers sharing {products_db.path}")
+        seed_products()
+        products_db.close()
     uvicorn.run(
         "main:app",
         host=HOST,
         port=PORT,
-        reload=True if os.getenv("ENVIRONMENT") == "development" else False
+        workers=WORKERS,
+        reload=True if os.getenv("ENVIRONMENT") == "development" and WORKERS == 1 else False
     )
\ No newline at end of file
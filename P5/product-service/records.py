@@ -0,0 +1,89 @@
+import sys
+from datetime import datetime, timedelta
+from typing import Any, Optional
+
+EPOCH = datetime(1970, 1, 1)
+MICROSECOND = timedelta(microseconds=1)
+
+TIMESTAMP_FIELDS = ("created_at", "updated_at")
+
+
+def to_micros(moment: datetime) -> int:
+    """Microseconds since 1970-01-01 of a naive local time (aware times are converted first)"""
+    if moment.tzinfo is not None:
+        moment = moment.astimezone().replace(tzinfo=None)
+    return (moment - EPOCH) // MICROSECOND
+
+
+def from_micros(micros: int) -> datetime:
+    return EPOCH + timedelta(microseconds=micros)
+
+
+def intern_category(category: Optional[str]) -> Optional[str]:
+    return sys.intern(category) if category is not None else None
+
+
+class ProductRecord:
+    """A product as the memory store keeps it.
+
+    Slots instead of a per-product dict, the category interned so that all
+    products of a category share one string, and timestamps as integer
+    microseconds instead of datetime objects. `to_dict` turns a record back
+    into the plain product dict the endpoints work with; item access reads a
+    single field in that form (datetimes for timestamps) without building the
+    dict, which is all the indexes need.
+    """
+
+    __slots__ = ("id", "name", "description", "price", "category", "stock", "created_at", "updated_at")
+
+    def __init__(self, id: str, name: str, description: Optional[str], price: float, category: Optional[str],
+                 stock: int, created_at: int, updated_at: int):
+        self.id = id
+        self.name = name
+        self.description = description
+        self.price = price
+        self.category = intern_category(category)
+        self.stock = stock
+        self.created_at = created_at
+        self.updated_at = updated_at
+
+    @classmethod
+    def from_dict(cls, product: dict) -> "ProductRecord":
+        created_at = to_micros(product["created_at"])
+        # Never-updated products share one int object for both timestamps
+        updated_at = product["updated_at"]
+        updated_at = created_at if updated_at == product["created_at"] else to_micros(updated_at)
+        return cls(
+            product["id"],
+            product["name"],
+            product.get("description"),
+            product["price"],
+            product.get("category"),
+            product["stock"],
+            created_at,
+            updated_at,
+        )
+
+    def to_dict(self) -> dict:
+        return {
+            "id": self.id,
+            "name": self.name,
+            "description": self.description,
+            "price": self.price,
+            "category": self.category,
+            "stock": self.stock,
+            "created_at": from_micros(self.created_at),
+            "updated_at": from_micros(self.updated_at),
+        }
+
+    def __getitem__(self, field: str) -> Any:
+        if field not in self.__slots__:
+            raise KeyError(field)
+        value = getattr(self, field)
+        return from_micros(value) if field in TIMESTAMP_FIELDS else value
+
+    def get(self, field: str, default: Any = None) -> Any:
+        try:
+            return self[field]
+        except KeyError:
+            return default
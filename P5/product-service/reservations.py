@@ -0,0 +1,68 @@
+import asyncio
+import time
+import uuid
+from typing import Optional
+from storage import ProductStore
+
+
+class ReservationNotFound(KeyError):
+    pass
+
+
+class ReservationManager:
+    """Two-phase stock holds for order placement.
+
+    `reserve` takes the quantity out of stock immediately and records a hold
+    that expires after a TTL. The order service then either `commit`s the hold
+    (the stock stays sold) or `release`s it (the stock goes back). Holds that
+    are never finished are released by `release_expired`, which the service
+    runs periodically. All stock changes go through the storage backend's
+    atomic operations, so concurrent holds on a hot SKU can never oversell.
+    """
+
+    def __init__(self, store: ProductStore, default_ttl: float = 900):
+        self.store = store
+        self.default_ttl = default_ttl
+
+    def reserve(self, product_id: str, quantity: int, ttl: Optional[float] = None) -> dict:
+        if quantity <= 0:
+            raise ValueError("Reservation quantity must be positive")
+
+        reservation_id = str(uuid.uuid4())
+        expires_at = time.time() + (ttl if ttl is not None else self.default_ttl)
+        remaining = self.store.create_reservation(reservation_id, product_id, quantity, expires_at)
+        return {
+            "id": reservation_id,
+            "product_id": product_id,
+            "quantity": quantity,
+            "expires_at": expires_at,
+            "remaining_stock": remaining,
+        }
+
+    def commit(self, reservation_id: str) -> dict:
+        reservation = self.store.finish_reservation(reservation_id, restore=False)
+        if reservation is None:
+            raise ReservationNotFound(reservation_id)
+        return reservation
+
+    def release(self, reservation_id: str) -> dict:
+        reservation = self.store.finish_reservation(reservation_id, restore=True)
+        if reservation is None:
+            raise ReservationNotFound(reservation_id)
+        return reservation
+
+    def release_expired(self, now: Optional[float] = None) -> int:
+        """Give back the stock of every expired hold; returns how many were released"""
+        released = 0
+        for reservation_id in self.store.expired_reservations(now if now is not None else time.time()):
+            if self.store.finish_reservation(reservation_id, restore=True) is not None:
+                released += 1
+        return released
+
+    async def sweep_forever(self, interval: float):
+        """Background task that releases expired holds every `interval` seconds"""
+        while True:
+            await asyncio.sleep(interval)
+            released = self.release_expired()
+            if released:
+                print(f"♻️ Released {released} expired stock reservations")
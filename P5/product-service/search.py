@@ -0,0 +1,286 @@
+import heapq
+import math
+import re
+import unicodedata
+from collections import Counter, defaultdict
+from typing import Dict, Iterable, Iterator, List, Optional, Set, Tuple
+from sortedcontainers import SortedList
+
+TOKEN_PATTERN = re.compile(r"\w+")
+
+# How much a term occurrence counts depending on the field it appears in
+FIELD_WEIGHTS = {"name": 3.0, "category": 2.0, "description": 1.0}
+
+
+def tokenize(text: Optional[str]) -> List[str]:
+    """Lowercase, accent-folded word tokens ("Cámara" and "camara" match)"""
+    if not text:
+        return []
+    folded = unicodedata.normalize("NFKD", text.lower())
+    folded = "".join(char for char in folded if not unicodedata.combining(char))
+    return TOKEN_PATTERN.findall(folded)
+
+
+class SearchIndex:
+    """In-process inverted index over product name, description and category.
+
+    Each posting stores the BM25 impact of a term in a product (field-weighted
+    term frequency with length normalization); the idf part is applied at
+    query time, so adding a product never rewrites other postings. The
+    vocabulary is kept sorted, so a query token also matches every term that
+    starts with it (as-you-type search) via a bisect, at a lower weight than
+    an exact match.
+
+    A query intersects the matching posting sets (every token must match).
+    Small result sets are scored exhaustively. Large ones are ranked with the
+    threshold algorithm over impact-ordered postings, which stops as soon as
+    no unseen product can enter the top `limit`. Impact-ordered lists are only
+    maintained for terms with many postings.
+    """
+
+    K1 = 1.2
+    B = 0.75
+    PREFIX_PENALTY = 0.5
+    MAX_PREFIX_EXPANSIONS = 64
+    RANKED_MIN_POSTINGS = 512
+    EXHAUSTIVE_LIMIT = 2000
+
+    def __init__(self):
+        self._postings: Dict[str, Dict[str, float]] = defaultdict(dict)
+        self._ranked: Dict[str, SortedList] = {}
+        self._vocabulary = SortedList()
+        self._doc_terms: Dict[str, Dict[str, float]] = {}
+        self._doc_categories: Dict[str, Optional[str]] = {}
+        self._category_docs: Dict[Optional[str], Set[str]] = defaultdict(set)
+        self._average_length = 0.0
+        self._building = False
+
+    def __len__(self):
+        return len(self._doc_terms)
+
+    def _weights(self, product: dict) -> Counter:
+        weights: Counter = Counter()
+        for field, weight in FIELD_WEIGHTS.items():
+            for token in tokenize(product.get(field)):
+                weights[token] += weight
+        return weights
+
+    def add(self, product: dict):
+        """Index a product, replacing any previous version of it"""
+        product_id = product["id"]
+        self.remove(product_id)
+
+        weights = self._weights(product)
+        if not weights:
+            return
+
+        length = sum(weights.values())
+        if not self._average_length:
+            self._average_length = length
+        norm = self.K1 * (1 - self.B + self.B * length / self._average_length)
+
+        impacts = {}
+        for term, frequency in weights.items():
+            impact = frequency * (self.K1 + 1) / (frequency + norm)
+            impacts[term] = impact
+            postings = self._postings[term]
+            if not postings:
+                self._vocabulary.add(term)
+            postings[product_id] = impact
+
+            if self._building:
+                continue
+            ranked = self._ranked.get(term)
+            if ranked is not None:
+                ranked.add((-impact, product_id))
+            elif len(postings) >= self.RANKED_MIN_POSTINGS:
+                self._ranked[term] = SortedList((-value, doc) for doc, value in postings.items())
+
+        category = product.get("category")
+        self._doc_terms[product_id] = impacts
+        self._doc_categories[product_id] = category
+        self._category_docs[category].add(product_id)
+
+    def remove(self, product_id: str):
+        impacts = self._doc_terms.pop(product_id, None)
+        if impacts is None:
+            return
+
+        for term, impact in impacts.items():
+            postings = self._postings[term]
+            del postings[product_id]
+            ranked = self._ranked.get(term)
+            if ranked is not None:
+                ranked.discard((-impact, product_id))
+            if not postings:
+                del self._postings[term]
+                self._ranked.pop(term, None)
+                self._vocabulary.remove(term)
+
+        category = self._doc_categories.pop(product_id)
+        members = self._category_docs[category]
+        members.discard(product_id)
+        if not members:
+            del self._category_docs[category]
+
+    def clear(self):
+        self._postings.clear()
+        self._ranked.clear()
+        self._vocabulary.clear()
+        self._doc_terms.clear()
+        self._doc_categories.clear()
+        self._category_docs.clear()
+        self._average_length = 0.0
+
+    def build(self, products: Iterable[dict]):
+        """Rebuild from scratch, normalizing lengths against the whole catalog"""
+        products = list(products)
+        self.clear()
+        lengths = [sum(self._weights(product).values()) for product in products]
+        lengths = [length for length in lengths if length]
+        if lengths:
+            self._average_length = sum(lengths) / len(lengths)
+
+        # Impact-ordered lists are sorted once at the end instead of per insert
+        self._building = True
+        try:
+            for product in products:
+                self.add(product)
+        finally:
+            self._building = False
+        for term, postings in self._postings.items():
+            if len(postings) >= self.RANKED_MIN_POSTINGS:
+                self._ranked[term] = SortedList((-impact, doc) for doc, impact in postings.items())
+
+    def _expand(self, token: str) -> Dict[str, float]:
+        """Terms matched by a query token, weighted by idf and match type"""
+        documents = len(self._doc_terms)
+        matches = {}
+        start = self._vocabulary.bisect_left(token)
+        for term in self._vocabulary.islice(start, start + self.MAX_PREFIX_EXPANSIONS + 1):
+            if not term.startswith(token):
+                break
+            postings = len(self._postings[term])
+            idf = math.log(1 + (documents - postings + 0.5) / (postings + 0.5))
+            matches[term] = idf if term == token else idf * self.PREFIX_PENALTY
+        return matches
+
+    def _matching(self, terms: Dict[str, float]):
+        """Products matching any of the terms (a dict is used without copying)"""
+        if len(terms) == 1:
+            return self._postings[next(iter(terms))]
+        return set().union(*(self._postings[term] for term in terms))
+
+    def _score(self, product_id: str, token_terms: List[Dict[str, float]]) -> float:
+        impacts = self._doc_terms[product_id]
+        total = 0.0
+        for terms in token_terms:
+            total += max(weight * impacts[term] for term, weight in terms.items() if term in impacts)
+        return total
+
+    def _score_all(self, candidates, token_terms: List[Dict[str, float]]) -> Dict[str, float]:
+        """Scores for every candidate, one token at a time"""
+        scores = dict.fromkeys(candidates, 0.0)
+        for terms in token_terms:
+            if len(terms) == 1:
+                # Exact-only token: straight posting lookups, no per-term max
+                term, weight = next(iter(terms.items()))
+                postings = self._postings[term]
+                for product_id in scores:
+                    scores[product_id] += weight * postings[product_id]
+            else:
+                for product_id in scores:
+                    impacts = self._doc_terms[product_id]
+                    scores[product_id] += max(
+                        weight * impacts[term] for term, weight in terms.items() if term in impacts
+                    )
+        return scores
+
+    def _stream(self, terms: Dict[str, float]) -> Iterator[Tuple[float, str]]:
+        """(score, product_id) for one query token, best first"""
+        streams = []
+        for term, weight in terms.items():
+            ranked = self._ranked.get(term)
+            if ranked is not None:
+                streams.append(((-negative * weight, doc) for negative, doc in ranked))
+            else:
+                postings = self._postings[term]
+                streams.append(sorted(((impact * weight, doc) for doc, impact in postings.items()), reverse=True))
+        if len(streams) == 1:
+            return iter(streams[0])
+        return heapq.merge(*streams, key=lambda item: -item[0])
+
+    def _threshold_top(
+        self,
+        candidates,
+        token_terms: List[Dict[str, float]],
+        limit: int
+    ) -> List[Tuple[float, str]]:
+        streams = [self._stream(terms) for terms in token_terms]
+        frontier = [math.inf] * len(streams)
+        top: List[Tuple[float, str]] = []
+        seen: Set[str] = set()
+
+        while True:
+            for position, stream in enumerate(streams):
+                item = next(stream, None)
+                if item is None:
+                    # Every candidate matches this token, so all have been seen
+                    return top
+                score, product_id = item
+                frontier[position] = score
+                if product_id in seen or product_id not in candidates:
+                    continue
+                seen.add(product_id)
+                entry = (self._score(product_id, token_terms), product_id)
+                if len(top) < limit:
+                    heapq.heappush(top, entry)
+                elif entry > top[0]:
+                    heapq.heapreplace(top, entry)
+
+            if len(top) >= limit and top[0][0] >= sum(frontier):
+                return top
+
+    def search(
+        self,
+        query: str,
+        limit: int = 20,
+        category: Optional[str] = None
+    ) -> Tuple[int, List[Tuple[str, float]]]:
+        """Best matches for every token of the query (AND semantics).
+
+        Returns the total number of matches and the top `limit` of them as
+        (product_id, score) pairs, best first.
+        """
+        tokens = list(dict.fromkeys(tokenize(query)))
+        if not tokens or limit <= 0:
+            return 0, []
+
+        token_terms = [self._expand(token) for token in tokens]
+        if not all(token_terms):
+            return 0, []
+
+        sets = sorted((self._matching(terms) for terms in token_terms), key=len)
+        if category is not None:
+            sets.append(self._category_docs.get(category, set()))
+            sets.sort(key=len)
+
+        # Intersect from the smallest set. set.intersection walks its argument
+        # in C, which beats a Python-level walk of the smaller candidate set
+        # unless the argument is a lot larger.
+        candidates = sets[0]
+        for other in sets[1:]:
+            if len(other) > 2 * len(candidates):
+                candidates = {product_id for product_id in candidates if product_id in other}
+            else:
+                candidates = set(candidates).intersection(other)
+            if not candidates:
+                return 0, []
+
+        if len(candidates) <= self.EXHAUSTIVE_LIMIT:
+            top = heapq.nlargest(limit, ((score, product_id) for product_id, score in
+                                         self._score_all(candidates, token_terms).items()))
+        else:
+            top = sorted(self._threshold_top(candidates, token_terms, limit), reverse=True)
+
+        return len(candidates), [(product_id, round(score, 4)) for score, product_id in top]
@@ -0,0 +1,115 @@
+import zlib
+from collections import OrderedDict
+from itertools import islice
+from typing import Callable, Dict, Hashable, Iterable, Iterator, Optional, Tuple
+import orjson
+
+# How a route turns stored products into JSON:
+#   model   validate through the Product model, then serialize (pydantic)
+#   orjson  encode the stored product dicts directly; every write path validates them
+#   cached  orjson, reusing each product's encoded bytes until it changes
+SERIALIZER_MODES = ("model", "orjson", "cached")
+
+
+class ProductEncoder:
+    """Fast JSON encoding of stored product dicts.
+
+    No validation happens here: the stored dicts are trusted to be valid
+    Products. That holds because products are only created from validated
+    ProductCreate bodies, and changed through `ProductStore.update`, which
+    writes just the UPDATABLE_FIELDS and refuses to clear a required one,
+    with the values a validated ProductUpdate allows. The dicts can
+    therefore be handed to orjson as they are; the output is the same JSON
+    the model produces (datetimes in ISO 8601), with the keys in storage
+    order. `encode_cached` also keeps
+    each product's bytes in an LRU of `max_entries`, so a list page is
+    mostly a join of ready-made fragments. A fragment is dropped when its
+    product changes, and is only reused while the product's updated_at
+    still matches.
+    """
+
+    def __init__(self, max_entries: int = 100000):
+        self.max_entries = max_entries
+        self._fragments: "OrderedDict[Hashable, Tuple[object, bytes]]" = OrderedDict()
+        self.hits = 0
+        self.misses = 0
+
+    def __len__(self):
+        return len(self._fragments)
+
+    @staticmethod
+    def encode(product: dict) -> bytes:
+        return orjson.dumps(product)
+
+    def encode_cached(self, product: dict) -> bytes:
+        product_id = product["id"]
+        entry = self._fragments.get(product_id)
+        if entry is not None and entry[0] == product["updated_at"]:
+            self._fragments.move_to_end(product_id)
+            self.hits += 1
+            return entry[1]
+        self.misses += 1
+        fragment = orjson.dumps(product)
+        if self.max_entries > 0:
+            self._fragments[product_id] = (product["updated_at"], fragment)
+            self._fragments.move_to_end(product_id)
+            while len(self._fragments) > self.max_entries:
+                self._fragments.popitem(last=False)
+        return fragment
+
+    def encoder(self, mode: str) -> Callable[[dict], bytes]:
+        return self.encode_cached if mode == "cached" else self.encode
+
+    def encode_list(self, products: Iterable[dict], mode: str) -> bytes:
+        encode = self.encoder(mode)
+        return b"[" + b",".join(encode(product) for product in products) + b"]"
+
+    def encode_page(self, products: Iterable[dict], next_cursor: Optional[str], mode: str) -> bytes:
+        """A ProductPage body"""
+        return b'{"items":' + self.encode_list(products, mode) + b',"next_cursor":' + orjson.dumps(next_cursor) + b"}"
+
+    def encode_ndjson(self, products: Iterable[dict], batch_size: int = 1000) -> Iterator[bytes]:
+        """Newline-delimited JSON, one chunk per `batch_size` products.
+
+        Fragments are neither read from nor added to the cache: an export
+        touches every product once, and would only evict the ones that are
+        being read over and over.
+        """
+        products = iter(products)
+        while True:
+            batch = list(islice(products, batch_size))
+            if not batch:
+                return
+            yield b"".join(orjson.dumps(product, option=orjson.OPT_APPEND_NEWLINE) for product in batch)
+
+    def on_product_change(self, event: str, product_id: Optional[str]):
+        """ProductStore listener"""
+        if event == "reset":
+            self.clear()
+        else:
+            self._fragments.pop(product_id, None)
+
+    def clear(self):
+        self._fragments.clear()
+
+
+def parse_serializers(spec: str, routes: Iterable[str], default: str) -> Dict[str, str]:
+    """Serializer mode per route from "route=mode,..." (unlisted routes get the default)"""
+    modes = dict.fromkeys(routes, default)
+    for item in filter(None, (part.strip() for part in spec.split(","))):
+        route, _, mode = item.partition("=")
+        if route not in modes or mode not in SERIALIZER_MODES:
+            raise ValueError(f"Invalid serializer setting: {item!r} (routes: {', '.join(modes)}; "
+                             f"modes: {', '.join(SERIALIZER_MODES)})")
+        modes[route] = mode
+    return modes
+
+
+def gzip_chunks(chunks: Iterable[bytes], level: int = 6) -> Iterator[bytes]:
+    """Gzip a stream of chunks incrementally, never holding more than one chunk"""
+    compressor = zlib.compressobj(level, zlib.DEFLATED, 16 + zlib.MAX_WBITS)
+    for chunk in chunks:
+        compressed = compressor.compress(chunk)
+        if compressed:
+            yield compressed
+    yield compressor.flush()
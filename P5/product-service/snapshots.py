@@ -0,0 +1,355 @@
+import json
+import mmap
+import os
+import shutil
+from bisect import bisect_left
+from datetime import datetime
+from typing import Dict, Iterable, List, Optional, Tuple
+import numpy as np
+from indexes import decode_cursor, encode_cursor
+from records import ProductRecord, from_micros, to_micros
+from storage import MemoryProductStore, ProductStore, StoreWarmingUp
+
+# Layout of a snapshot directory, one row per product in insertion order:
+#   manifest.json                  format, creation time, count, categories, open reservations
+#   {id,name,description}.bin      the texts, UTF-8, back to back
+#   {id,name,description}.offsets.npy  int64 start of every text, plus the end
+#   description.present.npy        False where the description is None
+#   category.npy                   int32 index into the manifest's categories, -1 for None
+#   price.npy, stock.npy           float64, int64
+#   created_at.npy, updated_at.npy int64 microseconds (see records.to_micros)
+#   id_order.npy                   rows ordered by id, for lookups by bisection
+SNAPSHOT_FORMAT = 1
+MANIFEST = "manifest.json"
+TEXT_FIELDS = ("id", "name", "description")
+
+
+def _write_texts(directory: str, field: str, texts: List[str]):
+    encoded = [text.encode() for text in texts]
+    offsets = np.zeros(len(encoded) + 1, dtype=np.int64)
+    np.cumsum([len(text) for text in encoded], out=offsets[1:])
+    with open(os.path.join(directory, f"{field}.bin"), "wb") as handle:
+        handle.write(b"".join(encoded))
+    np.save(os.path.join(directory, f"{field}.offsets.npy"), offsets)
+
+
+def write_snapshot(store: ProductStore, path: str, batch_size: int = 10000) -> dict:
+    """Write every product and open reservation of a memory store to the directory `path`.
+
+    The store keeps taking writes meanwhile: each product is saved as it is
+    when the scan reaches it. Reservations are read first, so a hold taken
+    during the write can only leave its stock out of the snapshot, never
+    count it twice. The snapshot is written next to `path` and swapped in
+    once complete. Returns the manifest.
+    """
+    reservations = store.reservations()
+    columns: Dict[str, list] = {
+        field: [] for field in ("id", "name", "description", "category", "price", "stock", "created_at", "updated_at")
+    }
+    categories: Dict[str, int] = {}
+    for product in store.scan(batch_size):
+        columns["id"].append(product["id"])
+        columns["name"].append(product["name"])
+        columns["description"].append(product.get("description"))
+        category = product.get("category")
+        columns["category"].append(-1 if category is None else categories.setdefault(category, len(categories)))
+        columns["price"].append(product["price"])
+        columns["stock"].append(product["stock"])
+        columns["created_at"].append(to_micros(product["created_at"]))
+        columns["updated_at"].append(to_micros(product["updated_at"]))
+
+    staging = f"{path}.tmp"
+    shutil.rmtree(staging, ignore_errors=True)
+    os.makedirs(staging)
+    descriptions = columns["description"]
+    np.save(os.path.join(staging, "description.present.npy"),
+            np.fromiter((text is not None for text in descriptions), dtype=bool, count=len(descriptions)))
+    columns["description"] = [text or "" for text in descriptions]
+    for field in TEXT_FIELDS:
+        _write_texts(staging, field, columns[field])
+    for field, dtype in (("category", np.int32), ("price", np.float64), ("stock", np.int64),
+                         ("created_at", np.int64), ("updated_at", np.int64)):
+        np.save(os.path.join(staging, f"{field}.npy"), np.array(columns[field], dtype=dtype))
+    ids = np.array(columns["id"], dtype=str)
+    np.save(os.path.join(staging, "id_order.npy"), np.argsort(ids, kind="stable").astype(np.int64))
+
+    manifest = {
+        "format": SNAPSHOT_FORMAT,
+        "created_at": datetime.now().isoformat(),
+        "count": len(ids),
+        "categories": list(categories),
+        "reservations": reservations,
+    }
+    with open(os.path.join(staging, MANIFEST), "w") as handle:
+        json.dump(manifest, handle)
+
+    # Swap it in; the previous snapshot may still be memory-mapped by a
+    # store that is warming up, which removing its files does not disturb
+    previous = f"{path}.old"
+    shutil.rmtree(previous, ignore_errors=True)
+    if os.path.exists(path):
+        os.rename(path, previous)
+    os.rename(staging, path)
+    shutil.rmtree(previous, ignore_errors=True)
+    return manifest
+
+
+class _Texts:
+    """The memory-mapped texts of one field, decoded one at a time"""
+
+    def __init__(self, directory: str, field: str):
+        self._offsets = np.load(os.path.join(directory, f"{field}.offsets.npy"), mmap_mode="r")
+        with open(os.path.join(directory, f"{field}.bin"), "rb") as handle:
+            # mmap cannot map an empty file
+            self._data = mmap.mmap(handle.fileno(), 0, access=mmap.ACCESS_READ) if self._offsets[-1] else b""
+
+    def __getitem__(self, row) -> str:
+        return self._data[self._offsets[row]:self._offsets[row + 1]].decode()
+
+    def tolist(self) -> List[str]:
+        """Every text, decoded in one pass"""
+        offsets = self._offsets.tolist()
+        data = self._data[:]
+        return [data[start:end].decode() for start, end in zip(offsets, offsets[1:])]
+
+
+class ProductSnapshot:
+    """Read-only product store over a snapshot directory.
+
+    Opening one maps the files instead of reading them, so it takes the same
+    few milliseconds at any catalog size; pages are read from disk as
+    products are first touched. Rows are in insertion order and a row's
+    number is its sequence number, so cursors match the ones a
+    MemoryProductStore loaded from the same snapshot hands out. Range
+    queries and sorts are NumPy scans over the columns: slower than the
+    memory store's sorted indexes, but only used while it loads.
+    """
+
+    def __init__(self, path: str):
+        with open(os.path.join(path, MANIFEST)) as handle:
+            manifest = json.load(handle)
+        if manifest.get("format") != SNAPSHOT_FORMAT:
+            raise ValueError(f"Unsupported snapshot format: {manifest.get('format')!r}")
+        self.path = path
+        self.created_at = manifest["created_at"]
+        self.categories: List[str] = manifest["categories"]
+        self.reservations: List[dict] = manifest["reservations"]
+        self._size = manifest["count"]
+        self._texts = {field: _Texts(path, field) for field in TEXT_FIELDS}
+        self._columns = {
+            field: np.load(os.path.join(path, f"{field}.npy"), mmap_mode="r")
+            for field in ("description.present", "category", "price", "stock", "created_at", "updated_at", "id_order")
+        }
+        self._category_codes = {category: code for code, category in enumerate(self.categories)}
+        self._category_rows: Dict[int, np.ndarray] = {}
+
+    def __len__(self):
+        return self._size
+
+    def __contains__(self, product_id):
+        return self.find(product_id) is not None
+
+    def find(self, product_id: str) -> Optional[int]:
+        """Row of a product, or None"""
+        ids = self._texts["id"]
+        order = self._columns["id_order"]
+        position = bisect_left(order, product_id, key=ids.__getitem__)
+        if position < self._size and ids[order[position]] == product_id:
+            return int(order[position])
+        return None
+
+    def product(self, row: int) -> dict:
+        columns = self._columns
+        category = int(columns["category"][row])
+        return {
+            "id": self._texts["id"][row],
+            "name": self._texts["name"][row],
+            "description": self._texts["description"][row] if columns["description.present"][row] else None,
+            "price": float(columns["price"][row]),
+            "category": self.categories[category] if category >= 0 else None,
+            "stock": int(columns["stock"][row]),
+            "created_at": from_micros(int(columns["created_at"][row])),
+            "updated_at": from_micros(int(columns["updated_at"][row])),
+        }
+
+    def records(self) -> Iterable[ProductRecord]:
+        """Every product as a ProductRecord, in insertion order"""
+        columns = self._columns
+        categories = [None, *self.categories]
+        rows = zip(
+            *(self._texts[field].tolist() for field in TEXT_FIELDS),
+            columns["description.present"].tolist(),
+            columns["category"].tolist(),
+            columns["price"].tolist(),
+            columns["stock"].tolist(),
+            columns["created_at"].tolist(),
+            columns["updated_at"].tolist(),
+        )
+        for product_id, name, description, present, category, price, stock, created_at, updated_at in rows:
+            yield ProductRecord(product_id, name, description if present else None, price,
+                                categories[category + 1], stock, created_at, updated_at)
+
+    def _rows(self, category: Optional[str]) -> np.ndarray:
+        """Rows of a category (or of the whole catalog), in insertion order"""
+        if category is None:
+            return np.arange(self._size)
+        code = self._category_codes.get(category)
+        if code is None:
+            return np.zeros(0, dtype=np.int64)
+        rows = self._category_rows.get(code)
+        if rows is None:
+            rows = self._category_rows[code] = np.flatnonzero(self._columns["category"] == code)
+        return rows
+
+    def get(self, product_id: str) -> Optional[dict]:
+        row = self.find(product_id)
+        return self.product(row) if row is not None else None
+
+    def count(self, category: Optional[str] = None) -> int:
+        return len(self._rows(category))
+
+    def page(self, skip: int = 0, limit: int = 100, category: Optional[str] = None) -> List[dict]:
+        if limit <= 0:
+            return []
+        skip = max(skip, 0)
+        return [self.product(row) for row in self._rows(category)[skip:skip + limit].tolist()]
+
+    def page_after(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        category: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]:
+        rows = self._rows(category)
+        if not len(rows) or limit <= 0:
+            return [], None
+        start = 0 if not cursor else int(np.searchsorted(rows, decode_cursor(cursor), side="right"))
+        page = rows[start:start + limit].tolist()
+        next_cursor = None
+        if page and start + len(page) < len(rows):
+            next_cursor = encode_cursor(page[-1])
+        return [self.product(row) for row in page], next_cursor
+
+    def query(self, skip=0, limit=100, category=None, ranges=None, sort_by=None, descending=False):
+        if limit <= 0:
+            return []
+        rows = self._rows(category)
+        for field, (low, high) in (ranges or {}).items():
+            if field == "updated_at":
+                low, high = (to_micros(bound) if bound is not None else None for bound in (low, high))
+            values = self._columns[field][rows]
+            if low is not None:
+                rows = rows[values >= low]
+                values = values[values >= low]
+            if high is not None:
+                rows = rows[values <= high]
+        if sort_by is not None:
+            # Stable, so ties keep insertion order; descending reverses the whole ordering
+            rows = rows[np.argsort(self._columns[sort_by][rows], kind="stable")]
+        if descending:
+            rows = rows[::-1]
+        skip = max(skip, 0)
+        return [self.product(row) for row in rows[skip:skip + limit].tolist()]
+
+    def scan(self, batch_size: int = 1000, updated_since: Optional[datetime] = None):
+        rows = np.arange(self._size)
+        if updated_since is not None:
+            rows = np.flatnonzero(self._columns["updated_at"] >= to_micros(updated_since))
+        for row in rows.tolist():
+            yield self.product(row)
+
+
+class SnapshotProductStore(ProductStore):
+    """Memory store that serves a snapshot from the moment it is opened.
+
+    Until `hydrate` has loaded the snapshot into a MemoryProductStore, reads
+    are answered by the memory-mapped ProductSnapshot and writes raise
+    StoreWarmingUp (a 503 for the client to retry). `hydrate` runs on a
+    background thread; afterwards every call goes to the memory store, and
+    its change notifications are passed on to this store's listeners.
+    Nothing changes in between, so nothing derived from the snapshot's
+    answers needs to be invalidated.
+    """
+
+    def __init__(self, path: str):
+        super().__init__()
+        self.snapshot = ProductSnapshot(path)
+        self._store: Optional[MemoryProductStore] = None
+
+    @property
+    def ready(self):
+        return self._store is not None
+
+    def hydrate(self) -> MemoryProductStore:
+        """Load the snapshot into a memory store and switch over to it"""
+        store = MemoryProductStore()
+        store.insert_records(list(self.snapshot.records()))
+        store.restore_reservations(self.snapshot.reservations)
+        store.subscribe(self._notify)
+        self._store = store
+        return store
+
+    def _reader(self):
+        return self._store if self._store is not None else self.snapshot
+
+    def _writer(self) -> MemoryProductStore:
+        if self._store is None:
+            raise StoreWarmingUp("The product store is still loading its snapshot")
+        return self._store
+
+    def __len__(self):
+        return len(self._reader())
+
+    def __contains__(self, product_id):
+        return product_id in self._reader()
+
+    def get(self, product_id):
+        return self._reader().get(product_id)
+
+    def count(self, category=None):
+        return self._reader().count(category)
+
+    def page(self, skip=0, limit=100, category=None):
+        return self._reader().page(skip, limit, category)
+
+    def page_after(self, cursor=None, limit=100, category=None):
+        return self._reader().page_after(cursor, limit, category)
+
+    def query(self, skip=0, limit=100, category=None, ranges=None, sort_by=None, descending=False):
+        return self._reader().query(skip, limit, category, ranges, sort_by, descending)
+
+    def scan(self, batch_size=1000, updated_since=None):
+        return self._reader().scan(batch_size, updated_since)
+
+    def insert(self, product):
+        self._writer().insert(product)
+
+    def insert_many(self, products):
+        self._writer().insert_many(products)
+
+    def update(self, product_id, changes):
+        return self._writer().update(product_id, changes)
+
+    def delete(self, product_id):
+        return self._writer().delete(product_id)
+
+    def adjust_stock(self, product_id, quantity):
+        return self._writer().adjust_stock(product_id, quantity)
+
+    def adjust_stock_atomic(self, adjustments):
+        return self._writer().adjust_stock_atomic(adjustments)
+
+    def create_reservation(self, reservation_id, product_id, quantity, expires_at):
+        return self._writer().create_reservation(reservation_id, product_id, quantity, expires_at)
+
+    def finish_reservation(self, reservation_id, restore):
+        return self._writer().finish_reservation(reservation_id, restore)
+
+    def expired_reservations(self, now):
+        # The sweeper simply finds nothing to do until the holds are loaded
+        return self._store.expired_reservations(now) if self._store is not None else []
+
+    def reservations(self) -> List[dict]:
+        if self._store is not None:
+            return self._store.reservations()
+        return [dict(reservation) for reservation in self.snapshot.reservations]
@@ -0,0 +1,853 @@
+import os
+import queue
+import sqlite3
+import threading
+import time
+import uuid
+from abc import ABC, abstractmethod
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Callable, Dict, Iterable, Iterator, List, Optional, Tuple
+from indexes import SORTABLE_FIELDS, ProductIndex, decode_cursor, encode_cursor
+from records import ProductRecord, to_micros
+
+
+# Fields a product update may set; created_at and updated_at are the store's
+UPDATABLE_FIELDS = ("name", "description", "price", "category", "stock")
+# ...and those of them a product always has
+REQUIRED_FIELDS = ("name", "price", "stock")
+
+
+class ProductNotFound(KeyError):
+    pass
+
+
+class InsufficientStock(ValueError):
+    pass
+
+
+class InvalidProductUpdate(ValueError):
+    """Raised by `update` for changes that would clear a required field"""
+
+
+def check_changes(changes: Dict[str, object]):
+    """Reject changes that set a required field to None, before anything is written"""
+    cleared = [field for field in REQUIRED_FIELDS if field in changes and changes[field] is None]
+    if cleared:
+        raise InvalidProductUpdate(f"Fields may not be null: {', '.join(cleared)}")
+
+
+class StoreWarmingUp(Exception):
+    """Raised by writes to a store that is still loading its snapshot"""
+
+
+class StockAdjustmentError(Exception):
+    """Raised by an all-or-nothing stock batch; maps item index to the error"""
+
+    def __init__(self, errors: Dict[int, str]):
+        super().__init__("Stock adjustment batch rejected")
+        self.errors = errors
+
+
+class ProductStore(ABC):
+    """Storage backend behind the product endpoints.
+
+    Products are plain dicts with the fields of the `Product` model. Reads
+    return copies; changes are made with `update` and the stock methods,
+    which each change a product atomically.
+
+    Every write is announced to the subscribed listeners as
+    `listener(event, product_id)`, with event one of "insert", "update",
+    "stock" or "delete", so caches and derived indexes stay in sync no matter
+    which endpoint made the change. A store shared between processes also
+    announces the writes of the other processes when `sync` is called, and
+    sends "reset" (product_id None) when it can no longer tell what changed,
+    after which listeners must drop everything they derived.
+    """
+
+    def __init__(self):
+        self._listeners: List[Callable[[str, Optional[str]], None]] = []
+
+    def subscribe(self, listener: Callable[[str, Optional[str]], None]):
+        self._listeners.append(listener)
+
+    def _notify(self, event: str, product_id: Optional[str]):
+        for listener in self._listeners:
+            listener(event, product_id)
+
+    @property
+    def ready(self) -> bool:
+        """False while the store is still loading: it serves reads but writes raise StoreWarmingUp"""
+        return True
+
+    def sync(self) -> int:
+        """Announce the writes other processes made since the last sync; returns how many.
+
+        Only stores shared between processes have anything to do.
+        """
+        return 0
+
+    @abstractmethod
+    def __len__(self) -> int: ...
+
+    @abstractmethod
+    def __contains__(self, product_id) -> bool: ...
+
+    @abstractmethod
+    def get(self, product_id: str) -> Optional[dict]: ...
+
+    @abstractmethod
+    def insert(self, product: dict): ...
+
+    def insert_many(self, products: Iterable[dict]):
+        for product in products:
+            self.insert(product)
+
+    @abstractmethod
+    def update(self, product_id: str, changes: Dict[str, object]) -> Optional[dict]:
+        """Set the given UPDATABLE_FIELDS of a product and bump its updated_at, atomically.
+
+        Returns the updated product, or None if there is none. Fields not in
+        `changes` keep their stored value, so a stock change made since the
+        caller read the product is never written back over. Raises
+        InvalidProductUpdate, writing nothing, if a required field is None.
+        """
+
+    @abstractmethod
+    def delete(self, product_id: str) -> bool: ...
+
+    @abstractmethod
+    def count(self, category: Optional[str] = None) -> int: ...
+
+    @abstractmethod
+    def page(self, skip: int = 0, limit: int = 100, category: Optional[str] = None) -> List[dict]: ...
+
+    @abstractmethod
+    def page_after(
+        self,
+        cursor: Optional[str] = None,
+        limit: int = 100,
+        category: Optional[str] = None
+    ) -> Tuple[List[dict], Optional[str]]: ...
+
+    @abstractmethod
+    def query(
+        self,
+        skip: int = 0,
+        limit: int = 100,
+        category: Optional[str] = None,
+        ranges: Optional[Dict[str, Tuple]] = None,
+        sort_by: Optional[str] = None,
+        descending: bool = False
+    ) -> List[dict]:
+        """Offset page filtered by inclusive (low, high) ranges on SORTABLE_FIELDS.
+
+        Either bound of a range may be None. Results are ordered by sort_by,
+        or by insertion order when it is None; ties keep insertion order, and
+        descending reverses the whole ordering.
+        """
+
+    def scan(self, batch_size: int = 1000, updated_since: Optional[datetime] = None) -> Iterator[dict]:
+        """Every product in insertion order, fetched one keyset page at a time.
+
+        With updated_since (naive local time), only products updated at or
+        after it. Only one page is held at a time, so a scan of the whole
+        catalog runs in constant memory.
+        """
+        cursor = None
+        while True:
+            products, cursor = self.page_after(cursor, batch_size)
+            for product in products:
+                if updated_since is None or product["updated_at"] >= updated_since:
+                    yield product
+            if cursor is None:
+                return
+
+    @abstractmethod
+    def adjust_stock(self, product_id: str, quantity: int) -> int:
+        """Atomically add quantity to the stock and return the new value"""
+
+    @abstractmethod
+    def adjust_stock_atomic(self, adjustments: List[Tuple[str, int]]) -> List[int]:
+        """Apply every adjustment or none of them (StockAdjustmentError)"""
+
+    @abstractmethod
+    def create_reservation(self, reservation_id: str, product_id: str, quantity: int, expires_at: float) -> int:
+        """Take quantity out of stock and record the hold; returns the remaining stock"""
+
+    @abstractmethod
+    def finish_reservation(self, reservation_id: str, restore: bool) -> Optional[dict]:
+        """Remove a hold, giving its stock back if restore is set.
+
+        Returns the reservation, or None if it was already committed, released
+        or expired, so a hold is finished exactly once even under races.
+        """
+
+    @abstractmethod
+    def expired_reservations(self, now: float) -> List[str]: ...
+
+    def close(self):
+        pass
+
+
+class MemoryProductStore(ProductStore):
+    """The original process-local dict, with secondary indexes.
+
+    Products are held as compact ProductRecords and turned back into dicts
+    on the way out, so every read returns a fresh dict.
+
+    Stock changes take a per-product lock from a fixed stripe of locks, so
+    writers on different SKUs never wait for each other and there is no
+    global lock on the order path. The sorted indexes are shared by every
+    product, so they have a short lock of their own.
+    """
+
+    LOCK_STRIPES = 64
+
+    def __init__(self):
+        super().__init__()
+        self._products: Dict[str, ProductRecord] = {}
+        self._index = ProductIndex()
+        self._index_lock = threading.Lock()
+        self._locks = [threading.Lock() for _ in range(self.LOCK_STRIPES)]
+        self._reservations: Dict[str, dict] = {}
+
+    def _lock_for(self, product_id: str) -> threading.Lock:
+        return self._locks[hash(product_id) % self.LOCK_STRIPES]
+
+    def __len__(self):
+        return len(self._products)
+
+    def __contains__(self, product_id):
+        return product_id in self._products
+
+    def get(self, product_id):
+        record = self._products.get(product_id)
+        return record.to_dict() if record is not None else None
+
+    def insert(self, product):
+        self._products[product["id"]] = ProductRecord.from_dict(product)
+        with self._index_lock:
+            self._index.add(product)
+        self._notify("insert", product["id"])
+
+    def insert_many(self, products):
+        self.insert_records([ProductRecord.from_dict(product) for product in products])
+
+    def insert_records(self, records: List[ProductRecord]):
+        """Insert ready-made records, indexing them in one bulk pass"""
+        for record in records:
+            self._products[record.id] = record
+        with self._index_lock:
+            self._index.add_many(records)
+        for record in records:
+            self._notify("insert", record.id)
+
+    def update(self, product_id, changes):
+        check_changes(changes)
+        with self._lock_for(product_id):
+            record = self._products.get(product_id)
+            if record is None:
+                return None
+            # Indexed before it replaces the stored record, so a failure leaves the product as it was
+            product = record.to_dict()
+            product.update((field, changes[field]) for field in UPDATABLE_FIELDS if field in changes)
+            product["updated_at"] = datetime.now()
+            updated = ProductRecord.from_dict(product)
+            with self._index_lock:
+                self._index.update(updated)
+            self._products[product_id] = updated
+        self._notify("update", product_id)
+        return product
+
+    def delete(self, product_id):
+        if self._products.pop(product_id, None) is None:
+            return False
+        with self._index_lock:
+            self._index.remove(product_id)
+        self._notify("delete", product_id)
+        return True
+
+    def count(self, category=None):
+        return self._index.count(category)
+
+    def page(self, skip=0, limit=100, category=None):
+        with self._index_lock:
+            product_ids = self._index.page(skip, limit, category)
+        return [self._products[product_id].to_dict() for product_id in product_ids]
+
+    def page_after(self, cursor=None, limit=100, category=None):
+        with self._index_lock:
+            product_ids, next_cursor = self._index.page_after(cursor, limit, category)
+        return [self._products[product_id].to_dict() for product_id in product_ids], next_cursor
+
+    def scan(self, batch_size=1000, updated_since=None):
+        # Filter on the records' integer timestamps, building dicts only for matches
+        since = to_micros(updated_since) if updated_since is not None else None
+        cursor = None
+        while True:
+            with self._index_lock:
+                product_ids, cursor = self._index.page_after(cursor, batch_size)
+            for product_id in product_ids:
+                record = self._products.get(product_id)
+                # Deleted since the page was read
+                if record is not None and (since is None or record.updated_at >= since):
+                    yield record.to_dict()
+            if cursor is None:
+                return
+
+    def query(self, skip=0, limit=100, category=None, ranges=None, sort_by=None, descending=False):
+        ranges = {
+            field: tuple(bound.timestamp() if isinstance(bound, datetime) else bound for bound in bounds)
+            for field, bounds in (ranges or {}).items()
+        }
+        with self._index_lock:
+            product_ids = self._index.query(skip, limit, category, ranges, sort_by, descending)
+        return [self._products[product_id].to_dict() for product_id in product_ids]
+
+    def _adjust(self, product_id, quantity):
+        # Caller holds the product's lock
+        record = self._products.get(product_id)
+        if record is None:
+            raise ProductNotFound(product_id)
+
+        new_stock = record.stock + quantity
+        if new_stock < 0:
+            raise InsufficientStock(product_id)
+
+        record.stock = new_stock
+        record.updated_at = to_micros(datetime.now())
+        with self._index_lock:
+            self._index.update(record)
+        return new_stock
+
+    def adjust_stock(self, product_id, quantity):
+        with self._lock_for(product_id):
+            new_stock = self._adjust(product_id, quantity)
+        self._notify("stock", product_id)
+        return new_stock
+
+    def adjust_stock_atomic(self, adjustments):
+        # Take every involved stripe in a fixed order to avoid deadlocks
+        stripes = sorted({hash(product_id) % self.LOCK_STRIPES for product_id, _ in adjustments})
+        for stripe in stripes:
+            self._locks[stripe].acquire()
+        try:
+            errors = {}
+            pending = {}
+            for index, (product_id, quantity) in enumerate(adjustments):
+                record = self._products.get(product_id)
+                if record is None:
+                    errors[index] = "Product not found"
+                    continue
+                new_stock = pending.get(product_id, record.stock) + quantity
+                if new_stock < 0:
+                    errors[index] = "Insufficient stock"
+                    continue
+                pending[product_id] = new_stock
+
+            if errors:
+                raise StockAdjustmentError(errors)
+            new_stocks = [self._adjust(product_id, quantity) for product_id, quantity in adjustments]
+        finally:
+            for stripe in reversed(stripes):
+                self._locks[stripe].release()
+
+        for product_id in dict.fromkeys(product_id for product_id, _ in adjustments):
+            self._notify("stock", product_id)
+        return new_stocks
+
+    def create_reservation(self, reservation_id, product_id, quantity, expires_at):
+        with self._lock_for(product_id):
+            remaining = self._adjust(product_id, -quantity)
+            self._reservations[reservation_id] = {
+                "id": reservation_id,
+                "product_id": product_id,
+                "quantity": quantity,
+                "expires_at": expires_at,
+            }
+        self._notify("stock", product_id)
+        return remaining
+
+    def finish_reservation(self, reservation_id, restore):
+        # dict.pop is atomic, so only one caller ever gets the reservation
+        reservation = self._reservations.pop(reservation_id, None)
+        if reservation is None or not restore:
+            return reservation
+
+        with self._lock_for(reservation["product_id"]):
+            try:
+                self._adjust(reservation["product_id"], reservation["quantity"])
+            except ProductNotFound:
+                return reservation
+        self._notify("stock", reservation["product_id"])
+        return reservation
+
+    def expired_reservations(self, now):
+        return [
+            reservation["id"]
+            for reservation in list(self._reservations.values())
+            if reservation["expires_at"] <= now
+        ]
+
+    def reservations(self) -> List[dict]:
+        """Every open reservation (for snapshots)"""
+        return [dict(reservation) for reservation in list(self._reservations.values())]
+
+    def restore_reservations(self, reservations: Iterable[dict]):
+        """Re-register holds whose stock is already taken out, as saved by a snapshot"""
+        for reservation in reservations:
+            self._reservations[reservation["id"]] = dict(reservation)
+
+
+class SQLiteProductStore(ProductStore):
+    """Embedded, durable store backed by a SQLite database in WAL mode.
+
+    Connections come from a small pool and every statement is a constant
+    string, so sqlite3's per-connection statement cache serves them as
+    prepared statements after the first use.
+
+    With `shared` set, several processes (the workers of one service) use the
+    same database. Temporary triggers on each connection record every write
+    in `product_changes` together with the process it came from, and `sync`
+    replays the other processes' entries to this process's listeners. It
+    first checks `PRAGMA data_version`, which only moves when another
+    connection has committed, so a sync with nothing new costs a single
+    pragma. Entries older than `change_retention` seconds are pruned; a
+    process that has fallen further behind than that gets a "reset".
+    """
+
+    COLUMNS = "id, name, description, price, category, stock, created_at, updated_at"
+
+    SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS products (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            id TEXT NOT NULL UNIQUE,
+            name TEXT NOT NULL,
+            description TEXT,
+            price REAL NOT NULL,
+            category TEXT,
+            stock INTEGER NOT NULL,
+            created_at TEXT NOT NULL,
+            updated_at TEXT NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_products_category ON products (category, seq)",
+        "CREATE INDEX IF NOT EXISTS idx_products_updated_at ON products (updated_at)",
+        "CREATE INDEX IF NOT EXISTS idx_products_price ON products (price)",
+        "CREATE INDEX IF NOT EXISTS idx_products_stock ON products (stock)",
+        """
+        CREATE TABLE IF NOT EXISTS reservations (
+            id TEXT PRIMARY KEY,
+            product_id TEXT NOT NULL,
+            quantity INTEGER NOT NULL,
+            expires_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_reservations_expires_at ON reservations (expires_at)",
+    ]
+
+    SELECT_ONE = f"SELECT {COLUMNS} FROM products WHERE id = ?"
+    EXISTS = "SELECT 1 FROM products WHERE id = ?"
+    COUNT_ALL = "SELECT COUNT(*) FROM products"
+    COUNT_CATEGORY = "SELECT COUNT(*) FROM products WHERE category = ?"
+    INSERT = f"INSERT INTO products ({COLUMNS}) VALUES (?, ?, ?, ?, ?, ?, ?, ?)"
+    DELETE = "DELETE FROM products WHERE id = ?"
+    PAGE_ALL = f"SELECT {COLUMNS} FROM products ORDER BY seq LIMIT ? OFFSET ?"
+    PAGE_CATEGORY = f"SELECT {COLUMNS} FROM products WHERE category = ? ORDER BY seq LIMIT ? OFFSET ?"
+    AFTER_ALL = f"SELECT seq, {COLUMNS} FROM products WHERE seq > ? ORDER BY seq LIMIT ?"
+    AFTER_CATEGORY = (
+        f"SELECT seq, {COLUMNS} FROM products WHERE category = ? AND seq > ? ORDER BY seq LIMIT ?"
+    )
+    AFTER_UPDATED = (
+        f"SELECT seq, {COLUMNS} FROM products WHERE seq > ? AND updated_at >= ? ORDER BY seq LIMIT ?"
+    )
+    # Filters and sort orders for query(); only these fragments ever reach the SQL
+    RANGE_FILTERS = {field: (f"{field} >= ?", f"{field} <= ?") for field in SORTABLE_FIELDS}
+    ORDERINGS = {
+        (field, descending): f"ORDER BY {field} {direction}, seq {direction}"
+        for field in (*SORTABLE_FIELDS, "seq")
+        for descending, direction in ((False, "ASC"), (True, "DESC"))
+    }
+
+    ADJUST_STOCK = (
+        "UPDATE products SET stock = stock + ?, updated_at = ? "
+        "WHERE id = ? AND stock + ? >= 0 RETURNING stock"
+    )
+    INSERT_RESERVATION = "INSERT INTO reservations (id, product_id, quantity, expires_at) VALUES (?, ?, ?, ?)"
+    DELETE_RESERVATION = "DELETE FROM reservations WHERE id = ? RETURNING product_id, quantity, expires_at"
+    EXPIRED_RESERVATIONS = "SELECT id FROM reservations WHERE expires_at <= ?"
+
+    CHANGE_LOG_SCHEMA = [
+        """
+        CREATE TABLE IF NOT EXISTS product_changes (
+            seq INTEGER PRIMARY KEY AUTOINCREMENT,
+            origin TEXT NOT NULL,
+            event TEXT NOT NULL,
+            product_id TEXT NOT NULL,
+            changed_at REAL NOT NULL
+        )
+        """,
+        "CREATE INDEX IF NOT EXISTS idx_product_changes_changed_at ON product_changes (changed_at)",
+    ]
+    # Per-connection triggers, so each process logs its writes under its own origin;
+    # an update that leaves every descriptive field alone is a stock change
+    CHANGE_TRIGGERS = {
+        "insert": ("AFTER INSERT", "'insert'", "NEW.id"),
+        "update": (
+            "AFTER UPDATE",
+            "CASE WHEN OLD.name IS NEW.name AND OLD.description IS NEW.description AND OLD.price IS NEW.price "
+            "AND OLD.category IS NEW.category THEN 'stock' ELSE 'update' END",
+            "NEW.id",
+        ),
+        "delete": ("AFTER DELETE", "'delete'", "OLD.id"),
+    }
+    UNIX_NOW = "(julianday('now') - 2440587.5) * 86400.0"
+    # From sqlite_sequence rather than the log, which pruning may have emptied
+    LAST_CHANGE = "SELECT COALESCE(MAX(seq), 0) FROM sqlite_sequence WHERE name = 'product_changes'"
+    CHANGES_AFTER = "SELECT seq, origin, event, product_id FROM product_changes WHERE seq > ? ORDER BY seq"
+    PRUNE_CHANGES = "DELETE FROM product_changes WHERE changed_at < ?"
+
+    def __init__(self, path: str, pool_size: int = 4, shared: bool = False, change_retention: float = 3600):
+        super().__init__()
+        self.path = path
+        self.shared = shared
+        self.change_retention = change_retention
+        # Identifies this process's entries in the change log
+        self._origin = f"{os.getpid()}-{uuid.uuid4().hex[:8]}"
+        self._pool: "queue.LifoQueue[sqlite3.Connection]" = queue.LifoQueue()
+        self._connections: List[sqlite3.Connection] = []
+        for _ in range(max(pool_size, 1)):
+            connection = self._connect()
+            self._connections.append(connection)
+            self._pool.put(connection)
+
+        with self._connection() as connection:
+            for statement in self.SCHEMA + (self.CHANGE_LOG_SCHEMA if shared else []):
+                connection.execute(statement)
+
+        self._sync_connection: Optional[sqlite3.Connection] = None
+        if shared:
+            for connection in self._connections:
+                self._log_changes(connection)
+            # data_version is per connection, so syncing keeps one of its own
+            self._sync_connection = self._connect()
+            self._connections.append(self._sync_connection)
+            self._sync_lock = threading.Lock()
+            self._data_version = self._sync_connection.execute("PRAGMA data_version").fetchone()[0]
+            self._change_seq = self._sync_connection.execute(self.LAST_CHANGE).fetchone()[0]
+            self._pruned_at = time.monotonic()
+
+    def _connect(self) -> sqlite3.Connection:
+        connection = sqlite3.connect(
+            self.path,
+            timeout=30,
+            isolation_level=None,
+            check_same_thread=False,
+            cached_statements=64
+        )
+        connection.execute("PRAGMA journal_mode=WAL")
+        connection.execute("PRAGMA synchronous=NORMAL")
+        connection.execute("PRAGMA temp_store=MEMORY")
+        return connection
+
+    def _log_changes(self, connection: sqlite3.Connection):
+        for name, (timing, event, product_id) in self.CHANGE_TRIGGERS.items():
+            connection.execute(
+                f"CREATE TEMP TRIGGER IF NOT EXISTS log_product_{name} {timing} ON main.products BEGIN "
+                f"INSERT INTO product_changes (origin, event, product_id, changed_at) "
+                f"VALUES ('{self._origin}', {event}, {product_id}, {self.UNIX_NOW}); END"
+            )
+
+    @contextmanager
+    def _connection(self):
+        connection = self._pool.get()
+        try:
+            yield connection
+        finally:
+            self._pool.put(connection)
+
+    @contextmanager
+    def _transaction(self):
+        with self._connection() as connection:
+            connection.execute("BEGIN IMMEDIATE")
+            try:
+                yield connection
+            except BaseException:
+                connection.execute("ROLLBACK")
+                raise
+            connection.execute("COMMIT")
+
+    @staticmethod
+    def _to_row(product: dict) -> tuple:
+        return (
+            product["id"],
+            product["name"],
+            product.get("description"),
+            product["price"],
+            product.get("category"),
+            product["stock"],
+            product["created_at"].isoformat(),
+            product["updated_at"].isoformat(),
+        )
+
+    @staticmethod
+    def _from_row(row: Iterable) -> dict:
+        product_id, name, description, price, category, stock, created_at, updated_at = row
+        return {
+            "id": product_id,
+            "name": name,
+            "description": description,
+            "price": price,
+            "category": category,
+            "stock": stock,
+            "created_at": datetime.fromisoformat(created_at),
+            "updated_at": datetime.fromisoformat(updated_at),
+        }
+
+    def __len__(self):
+        return self.count()
+
+    def __contains__(self, product_id):
+        with self._connection() as connection:
+            return connection.execute(self.EXISTS, (product_id,)).fetchone() is not None
+
+    def get(self, product_id):
+        with self._connection() as connection:
+            row = connection.execute(self.SELECT_ONE, (product_id,)).fetchone()
+        return self._from_row(row) if row else None
+
+    def insert(self, product):
+        with self._connection() as connection:
+            connection.execute(self.INSERT, self._to_row(product))
+        self._notify("insert", product["id"])
+
+    def insert_many(self, products: Iterable[dict]):
+        """Insert many products in a single transaction"""
+        products = list(products)
+        with self._transaction() as connection:
+            connection.executemany(self.INSERT, (self._to_row(product) for product in products))
+        for product in products:
+            self._notify("insert", product["id"])
+
+    def update(self, product_id, changes):
+        check_changes(changes)
+        # One statement setting only the given columns, so a stock change
+        # made by another worker in between is kept
+        fields = [field for field in UPDATABLE_FIELDS if field in changes]
+        assignments = "".join(f"{field} = ?, " for field in fields)
+        with self._connection() as connection:
+            row = connection.execute(
+                f"UPDATE products SET {assignments}updated_at = ? WHERE id = ? RETURNING {self.COLUMNS}",
+                (*(changes[field] for field in fields), datetime.now().isoformat(), product_id)
+            ).fetchone()
+        if row is None:
+            return None
+        self._notify("update", product_id)
+        return self._from_row(row)
+
+    def delete(self, product_id):
+        with self._connection() as connection:
+            deleted = connection.execute(self.DELETE, (product_id,)).rowcount > 0
+        if deleted:
+            self._notify("delete", product_id)
+        return deleted
+
+    def count(self, category=None):
+        with self._connection() as connection:
+            if category is None:
+                return connection.execute(self.COUNT_ALL).fetchone()[0]
+            return connection.execute(self.COUNT_CATEGORY, (category,)).fetchone()[0]
+
+    def page(self, skip=0, limit=100, category=None):
+        if limit <= 0:
+            return []
+        skip = max(skip, 0)
+        with self._connection() as connection:
+            if category is None:
+                rows = connection.execute(self.PAGE_ALL, (limit, skip)).fetchall()
+            else:
+                rows = connection.execute(self.PAGE_CATEGORY, (category, limit, skip)).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def page_after(self, cursor=None, limit=100, category=None):
+        if limit <= 0:
+            return [], None
+        after = decode_cursor(cursor) if cursor else 0
+        with self._connection() as connection:
+            # Fetch one extra row to know whether another page exists
+            if category is None:
+                rows = connection.execute(self.AFTER_ALL, (after, limit + 1)).fetchall()
+            else:
+                rows = connection.execute(self.AFTER_CATEGORY, (category, after, limit + 1)).fetchall()
+
+        page = rows[:limit]
+        next_cursor = encode_cursor(page[-1][0]) if len(rows) > limit else None
+        return [self._from_row(row[1:]) for row in page], next_cursor
+
+    def scan(self, batch_size=1000, updated_since=None):
+        if updated_since is None:
+            yield from super().scan(batch_size)
+            return
+        # Filter in SQL, so pages hold only the changed products
+        after = 0
+        since = updated_since.isoformat()
+        while True:
+            with self._connection() as connection:
+                rows = connection.execute(self.AFTER_UPDATED, (after, since, batch_size)).fetchall()
+            for row in rows:
+                yield self._from_row(row[1:])
+            if len(rows) < batch_size:
+                return
+            after = rows[-1][0]
+
+    def query(self, skip=0, limit=100, category=None, ranges=None, sort_by=None, descending=False):
+        if limit <= 0:
+            return []
+        clauses = []
+        params: list = []
+        if category is not None:
+            clauses.append("category = ?")
+            params.append(category)
+        for field, bounds in (ranges or {}).items():
+            for clause, bound in zip(self.RANGE_FILTERS[field], bounds):
+                if bound is not None:
+                    clauses.append(clause)
+                    params.append(bound.isoformat() if isinstance(bound, datetime) else bound)
+
+        where = f"WHERE {' AND '.join(clauses)} " if clauses else ""
+        sql = f"SELECT {self.COLUMNS} FROM products {where}{self.ORDERINGS[sort_by or 'seq', descending]} LIMIT ? OFFSET ?"
+        with self._connection() as connection:
+            rows = connection.execute(sql, (*params, limit, max(skip, 0))).fetchall()
+        return [self._from_row(row) for row in rows]
+
+    def _adjust(self, connection, product_id, quantity):
+        row = connection.execute(
+            self.ADJUST_STOCK,
+            (quantity, datetime.now().isoformat(), product_id, quantity)
+        ).fetchone()
+        if row is not None:
+            return row[0]
+        if connection.execute(self.EXISTS, (product_id,)).fetchone() is None:
+            raise ProductNotFound(product_id)
+        raise InsufficientStock(product_id)
+
+    def adjust_stock(self, product_id, quantity):
+        with self._connection() as connection:
+            new_stock = self._adjust(connection, product_id, quantity)
+        self._notify("stock", product_id)
+        return new_stock
+
+    def adjust_stock_atomic(self, adjustments):
+        errors = {}
+        results = []
+        with self._transaction() as connection:
+            for index, (product_id, quantity) in enumerate(adjustments):
+                try:
+                    results.append(self._adjust(connection, product_id, quantity))
+                except ProductNotFound:
+                    errors[index] = "Product not found"
+                except InsufficientStock:
+                    errors[index] = "Insufficient stock"
+            if errors:
+                # Raising inside the transaction rolls back the applied items
+                raise StockAdjustmentError(errors)
+        for product_id in dict.fromkeys(product_id for product_id, _ in adjustments):
+            self._notify("stock", product_id)
+        return results
+
+    def create_reservation(self, reservation_id, product_id, quantity, expires_at):
+        with self._transaction() as connection:
+            remaining = self._adjust(connection, product_id, -quantity)
+            connection.execute(self.INSERT_RESERVATION, (reservation_id, product_id, quantity, expires_at))
+        self._notify("stock", product_id)
+        return remaining
+
+    def finish_reservation(self, reservation_id, restore):
+        with self._transaction() as connection:
+            row = connection.execute(self.DELETE_RESERVATION, (reservation_id,)).fetchone()
+            if row is None:
+                return None
+            product_id, quantity, expires_at = row
+            restored = False
+            if restore:
+                try:
+                    self._adjust(connection, product_id, quantity)
+                    restored = True
+                except ProductNotFound:
+                    pass
+        if restored:
+            self._notify("stock", product_id)
+        return {"id": reservation_id, "product_id": product_id, "quantity": quantity, "expires_at": expires_at}
+
+    def expired_reservations(self, now):
+        with self._connection() as connection:
+            return [row[0] for row in connection.execute(self.EXPIRED_RESERVATIONS, (now,))]
+
+    def sync(self):
+        if self._sync_connection is None or not self._sync_lock.acquire(blocking=False):
+            # Not shared, or another thread is already syncing
+            return 0
+        try:
+            connection = self._sync_connection
+            version = connection.execute("PRAGMA data_version").fetchone()[0]
+            if version == self._data_version:
+                return 0
+            self._data_version = version
+            rows = connection.execute(self.CHANGES_AFTER, (self._change_seq,)).fetchall()
+            if not rows:
+                return 0
+            # Sequence numbers are never reused, so a hole means entries were pruned unseen
+            missed = rows[0][0] > self._change_seq + 1
+            self._change_seq = rows[-1][0]
+            if missed:
+                self._notify("reset", None)
+                return len(rows)
+
+            replayed = 0
+            for _, origin, event, product_id in rows:
+                if origin != self._origin:
+                    self._notify(event, product_id)
+                    replayed += 1
+
+            if time.monotonic() - self._pruned_at > min(self.change_retention, 60):
+                self._pruned_at = time.monotonic()
+                connection.execute(self.PRUNE_CHANGES, (time.time() - self.change_retention,))
+            return replayed
+        finally:
+            self._sync_lock.release()
+
+    def close(self):
+        for connection in self._connections:
+            connection.close()
+        self._connections.clear()
+
+
+def create_product_store(shared: bool = False, snapshot_path: str = "") -> ProductStore:
+    """Build the backend selected by PRODUCT_STORE (memory or sqlite).
+
+    A shared store is used by several worker processes at once, which only
+    the sqlite backend supports. The memory backend starts from the snapshot
+    at snapshot_path when there is one (see snapshots.py); the sqlite
+    backend is durable on its own and takes no snapshots.
+    """
+    backend = os.getenv("PRODUCT_STORE", "memory").lower()
+    if backend == "memory":
+        if shared:
+            raise ValueError("PRODUCT_STORE=memory cannot be shared between workers; use PRODUCT_STORE=sqlite")
+        if snapshot_path and os.path.exists(snapshot_path):
+            # Imported here: snapshots builds on this module
+            from snapshots import SnapshotProductStore
+            return SnapshotProductStore(snapshot_path)
+        return MemoryProductStore()
+    if snapshot_path:
+        raise ValueError("Snapshots are only taken of PRODUCT_STORE=memory")
+    if backend == "sqlite":
+        return SQLiteProductStore(
+            os.getenv("PRODUCT_DB_PATH", "products.db"),
+            pool_size=int(os.getenv("SQLITE_POOL_SIZE", 4)),
+            shared=shared,
+            change_retention=float(os.getenv("CHANGE_LOG_RETENTION_SECONDS", 3600))
+        )
+    raise ValueError(f"Unknown PRODUCT_STORE backend: {backend}")
@@ -36,9 +36,11 @@ app.get('/health', (req, res) => {
   });
 });
 
-// GET all users
+// GET all users, or only those in ?ids=a,b,c (unknown ids are left out)
 app.get('/api/users', (req, res) => {
-  const userList = Array.from(users.values()).map(user => ({
+  const ids = req.query.ids ? String(req.query.ids).split(',').filter(Boolean) : null;
+  const source = ids ? ids.map(id => users.get(id)).filter(Boolean) : Array.from(users.values());
+  const userList = source.map(user => ({
     id: user.id,
     email: user.email,
     name: user.name,